@@ -1,60 +1,126 @@
-from langchain_openai import ChatOpenAI
-from langchain.agents import create_agent
-from langchain.tools import tool
+import threading
+from functools import lru_cache
 
 from backend.config import (
+    DIRECT_ANSWER_MIN_SCORE,
     LLM_MODEL,
     OPENAI_API_KEY,
     OPENAI_API_BASE,
+    OUTPUT_STREAM_FILTER,
 )
+from backend.agent.extractive import NO_ANSWER, TIMEOUT_ANSWER, answering_rows, extractive_answer, structured_answer
 from backend.agent.prompts import SYSTEM_PROMPT
+from backend.rag.pinecone_client import get_query_index
 from backend.rag.retriever import retrieve_chunks
-from backend.utils.citation import extract_sources
-from backend.safety.output_filter import is_safe_output
-
-
-llm = ChatOpenAI(
-    model=LLM_MODEL,
-    api_key=OPENAI_API_KEY,
-    base_url=OPENAI_API_BASE,
-    temperature=0.5,
+from backend.rag.context_packer import count_tokens, pack_context
+from backend.rag.namespace_registry import get_namespace_registry
+from backend.rag.query_analyzer import SCOPE_FIELDS, get_query_analyzer
+from backend.utils.deadline import StageTimeout, degrade
+from backend.utils.retrieval_context import (
+    get_last_retrieved_chunks,
+    set_last_context_tokens,
+    set_prefetched_chunks,
+    take_prefetched_chunks,
+)
+from backend.utils.citation import attribute, build_citations, extract_sources
+from backend.safety.output_filter import UnsafeOutput, check_output
+from backend.utils.http_clients import get_groq_client, get_http_client, get_openai_client
+from backend.utils.metrics import CONTEXT_TOKENS, Counter
+from backend.utils.token_stream import get_token_sink
+from backend.utils.tracing import record_span, span
+
+# LangChain / langchain-openai / the OpenAI SDK take ~2s to import, so they
+# are only loaded when the agent is first built (see `get_agent`). The app
+# builds it in the background at startup, after the port is already open.
+
+UNSAFE_ANSWER = "Unable to provide a safe answer based on the available information."
+
+DIRECT_ANSWERS = Counter(
+    "ika_direct_answers_total",
+    "Lookups answered from the retrieved rows without an LLM call, by namespace.",
+    labels=("namespace",),
 )
 
 
 # -------------------------------------------------
 # RETRIEVER TOOL
 # -------------------------------------------------
-@tool
 def internal_knowledge_retriever(query: str) -> str:
     """
     Retrieve relevant internal company documents.
     Returns formatted context or 'NO_CONTEXT'.
     """
 
-    results = retrieve_chunks(query)
+    # The direct-answer check already retrieved for the user's question:
+    # the first call uses that, however the model words its query.
+    results = take_prefetched_chunks()
+    if results is None:
+        results = retrieve_chunks(query)
 
     if not results:
+        set_last_context_tokens(0)
         return "NO_CONTEXT"
 
-    context_parts = []
-    for r in results:
-        context_parts.append(
-            f"""Source: {r['source']} (Page {r.get('page', 'N/A')})
-Content:
-{r['text']}"""
-        )
+    # Dedupe headers/empty fields and cap the prompt at CONTEXT_TOKEN_BUDGET.
+    packed = pack_context(results)
+    set_last_context_tokens(packed.token_count)
+    CONTEXT_TOKENS.inc(packed.token_count)
 
-    return "\n\n".join(context_parts)
+    return packed.text or "NO_CONTEXT"
 
 
 # -------------------------------------------------
 # AGENT INITIALIZATION
 # -------------------------------------------------
-agent = create_agent(
-    model=llm,
-    tools=[internal_knowledge_retriever],
-    system_prompt=SYSTEM_PROMPT
-)
+_agent_lock = threading.Lock()
+
+
+@lru_cache(maxsize=1)
+def _build_agent():
+    from langchain.agents import create_agent
+    from langchain.tools import tool
+    from langchain_openai import ChatOpenAI
+
+    from backend.agent.middleware import DeadlineMiddleware
+
+    llm = ChatOpenAI(
+        model=LLM_MODEL,
+        api_key=OPENAI_API_KEY,
+        base_url=OPENAI_API_BASE,
+        temperature=0.5,
+        # Same keep-alive pool as the embeddings client.
+        http_client=get_http_client("openai"),
+        timeout=get_http_client("openai").timeout,
+        # DeadlineMiddleware retries only when the request deadline allows.
+        max_retries=0,
+        # Streamed so OutputFilterHandler can stop a bad answer early.
+        streaming=OUTPUT_STREAM_FILTER,
+        stream_usage=OUTPUT_STREAM_FILTER,
+    )
+
+    return create_agent(
+        model=llm,
+        tools=[tool(internal_knowledge_retriever)],
+        system_prompt=SYSTEM_PROMPT,
+        middleware=[DeadlineMiddleware()],
+    )
+
+
+def get_agent():
+    """Build the agent on first use (one builder at a time)."""
+    with _agent_lock:
+        return _build_agent()
+
+
+def preload() -> None:
+    """Import and build everything the first /ask needs."""
+    get_agent()
+    get_openai_client()
+    get_groq_client()
+    get_query_index()  # maps the local snapshot (VECTOR_STORE=snapshot) / resolves the Pinecone host
+    if get_namespace_registry() is not None:
+        get_namespace_registry().state()  # first registry read, so no request waits on it
+    count_tokens(SYSTEM_PROMPT)  # loads the tiktoken encoding
 
 
 # -------------------------------------------------
@@ -64,13 +130,33 @@ def run_agent(query: str) -> dict:
     """
     Executes the agentic RAG pipeline and returns a grounded response.
     """
-    result = agent.invoke({
-        "messages": [
-            {"role": "user", "content": query}
-        ]
-    })
+    from backend.agent.callbacks import LLMTraceHandler, OutputFilterHandler
+
+    callbacks = [LLMTraceHandler()]
+    if OUTPUT_STREAM_FILTER:
+        callbacks.append(OutputFilterHandler(on_text=get_token_sink()))
+
+    try:
+        result = get_agent().invoke(
+            {
+                "messages": [
+                    {"role": "user", "content": query}
+                ]
+            },
+            config={"callbacks": callbacks},
+        )
+    except UnsafeOutput as exc:
+        # Generation was stopped mid-stream; nothing of it is returned.
+        record_span("output_filter", 0.0, rule=exc.rule, aborted=True)
+        return {"answer": UNSAFE_ANSWER, "sources": []}
+    except StageTimeout:
+        # An LLM turn ran out of time: answer from whatever was retrieved.
+        degrade("llm_timeout")
+        chunks = get_last_retrieved_chunks()
+        if not chunks:
+            return {"answer": TIMEOUT_ANSWER, "sources": []}
+        return _extractive_response(chunks)
 
-    
     final_message = result["messages"][-1].content or ""
 
     if "NO_CONTEXT" in final_message:
@@ -79,13 +165,68 @@ def run_agent(query: str) -> dict:
             "sources": [],
         }
 
-    if not is_safe_output(final_message):
+    with span("output_filter") as attrs:
+        unsafe = check_output(final_message)
+        if unsafe:
+            attrs["rule"] = unsafe
+
+    if unsafe:
         return {
-            "answer": "Unable to provide a safe answer based on the available information.",
+            "answer": UNSAFE_ANSWER,
             "sources": [],
         }
 
+    return _cited_response(final_message)
+
+
+def _cited_response(answer: str) -> dict:
+    with span("citations"):
+        citations = build_citations(answer)
     return {
-        "answer": final_message,
-        "sources": extract_sources(),
+        "answer": answer,
+        "sources": extract_sources(citations),
+        "citations": citations,
     }
+
+
+def _extractive_response(chunks: list[dict]) -> dict:
+    answer = extractive_answer(chunks)
+    if answer == NO_ANSWER:
+        return {"answer": answer, "sources": []}
+    return _cited_response(answer)
+
+
+def run_direct(query: str) -> dict | None:
+    """
+    Answer a locator / checklist lookup with the retrieved rows, no LLM
+    call (see `answering_rows`), or None when the top chunk isn't a
+    confident match for it. The agent's tool then reuses the retrieval.
+    """
+    try:
+        chunks = retrieve_chunks(query)
+    except StageTimeout:
+        return None  # the agent degrades the way it does on its own timeouts
+    set_prefetched_chunks(chunks)
+    if not chunks:
+        return None
+
+    # Locator / keyword names the query mentions (sheet and module names only narrow it down).
+    constraints = get_query_analyzer().constraints(query).get(chunks[0]["namespace"], {})
+    named = [v for field, values in constraints.items() if field not in SCOPE_FIELDS for v in values]
+    rows = answering_rows(query, chunks, min_score=DIRECT_ANSWER_MIN_SCORE, named=named)
+    answer = structured_answer(rows) if rows else None
+    if answer is None:
+        return None
+
+    DIRECT_ANSWERS.inc(namespace=rows[0]["namespace"])
+    with span("citations"):
+        citations = attribute(answer, rows)
+    return {"answer": answer, "sources": extract_sources(citations), "citations": citations}
+
+
+def run_extractive(query: str) -> dict:
+    """
+    Retrieval only: answer with the top chunks, no LLM call. Used when the
+    deadline leaves no time for the agent (or the prompt guard timed out).
+    """
+    return _extractive_response(retrieve_chunks(query))
@@ -0,0 +1,104 @@
+import time
+from typing import Callable, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from backend.safety.output_filter import StreamingOutputFilter, UnsafeOutput
+from backend.utils.metrics import LLM_TOKENS
+from backend.utils.tracing import record_span
+
+
+class LLMTraceHandler(BaseCallbackHandler):
+    """Records one `llm_turn` span and the token usage per LLM call."""
+
+    def __init__(self):
+        self._starts: dict = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._starts[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+
+        prompt_tokens = completion_tokens = 0
+        for generations in response.generations or []:
+            for gen in generations:
+                usage = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage.get("input_tokens", 0)
+                completion_tokens += usage.get("output_tokens", 0)
+        if not (prompt_tokens or completion_tokens):
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+
+        LLM_TOKENS.inc(prompt_tokens, kind="prompt")
+        LLM_TOKENS.inc(completion_tokens, kind="completion")
+
+        if start is not None:
+            record_span(
+                "llm_turn",
+                time.perf_counter() - start,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+            )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        start = self._starts.pop(run_id, None)
+        if start is not None:
+            record_span("llm_turn", time.perf_counter() - start, error=type(error).__name__)
+
+
+class OutputFilterHandler(BaseCallbackHandler):
+    """
+    Runs the output policy over streamed answer tokens. On a violation it
+    raises UnsafeOutput, which stops reading the stream and so cancels the
+    upstream generation. Text that passed the filter is handed to `on_text`
+    (the /ask/stream sink), if given.
+
+    Only the final answer is filtered: a turn that calls tools is dropped
+    from the first tool-call delta on, and what it held back is discarded.
+    """
+
+    # Let the exception out of the callback manager instead of logging it.
+    raise_error = True
+
+    def __init__(self, on_text: Optional[Callable[[str], None]] = None):
+        self._filters: dict = {}
+        self._tool_turns: set = set()
+        self._on_text = on_text
+
+    def on_llm_new_token(self, token, *, run_id, chunk=None, **kwargs):
+        if run_id in self._tool_turns:
+            return
+        if getattr(getattr(chunk, "message", None), "tool_call_chunks", None):
+            self._tool_turns.add(run_id)
+            self._filters.pop(run_id, None)
+            return
+        if not token:
+            return
+        stream = self._filters.setdefault(run_id, StreamingOutputFilter())
+        rule = stream.feed(token)
+        if rule is not None:
+            self._filters.pop(run_id, None)
+            raise UnsafeOutput(rule)
+        self._forward(stream.release())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        # The complete answer is checked once more by run_agent.
+        stream = self._filters.pop(run_id, None)
+        tool_turn = run_id in self._tool_turns or any(
+            getattr(getattr(gen, "message", None), "tool_calls", None)
+            for generations in response.generations or []
+            for gen in generations
+        )
+        self._tool_turns.discard(run_id)
+        if stream is not None and not tool_turn and stream.finish() is None:
+            self._forward(stream.release(final=True))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._filters.pop(run_id, None)
+        self._tool_turns.discard(run_id)
+
+    def _forward(self, text: str) -> None:
+        if text and self._on_text is not None:
+            self._on_text(text)
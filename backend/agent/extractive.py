@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Optional
+
+from backend.config import NAMESPACE_LOCATORS, NAMESPACE_VALIDATION
+from backend.rag.context_packer import pack_context
+
+NO_ANSWER = "I don't know based on the available knowledge base."
+TIMEOUT_ANSWER = "The assistant couldn't answer in time. Please try again."
+
+# Extractive answers quote the top chunks; keep them short enough to read.
+EXTRACTIVE_TOKEN_BUDGET = 400
+
+
+def extractive_answer(chunks: list[dict], token_budget: int = EXTRACTIVE_TOKEN_BUDGET) -> str:
+    """
+    Answer with the best retrieved passages verbatim, without an LLM call.
+    Used when there is no time left for the agent to compose an answer.
+    """
+
+    packed = pack_context(chunks, token_budget=token_budget)
+    if not packed.text:
+        return NO_ANSWER
+
+    return (
+        "I couldn't put together a full answer in time. "
+        "These are the most relevant passages from the knowledge base:\n\n"
+        + packed.text
+    )
+
+
+# -------------------------------------------------
+# STRUCTURED ROWS (locators / validation checklist)
+# -------------------------------------------------
+# Fields that locate the row rather than answer anything.
+_SKIP_FIELDS = {"document type", "sheet", "row"}
+
+# Query words that say what kind of entry is wanted, not which one.
+_GENERIC_TERMS = {
+    "a", "an", "and", "are", "be", "by", "can", "checklist", "do", "does", "for", "how", "i", "in", "is",
+    "it", "keyword", "keywords", "locator", "locators", "must", "of", "on", "or", "point", "rule", "rules",
+    "should", "that", "the", "to", "use", "used", "what", "when", "where", "which", "with", "xpath",
+}
+_WORD = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+")
+
+
+def _terms(text: str) -> set[str]:
+    """Lower-cased words, with camelCase / snake_case names split ("loginBtn" -> login, btn)."""
+    return {w.lower() for w in _WORD.findall(text or "")} - _GENERIC_TERMS
+
+
+def _fields(text: str) -> dict[str, str]:
+    """`Field: value` lines of a row chunk, lower-cased field -> value (empty values dropped)."""
+    fields: dict[str, str] = {}
+    for line in (text or "").splitlines():
+        key, sep, value = line.partition(":")
+        field = key.strip().lower()
+        if sep and value.strip() and field not in _SKIP_FIELDS:
+            fields.setdefault(field, value.strip())
+    return fields
+
+
+def _snippet(code: str) -> str:
+    # Locator values are stored as Robot Framework assignments ("= id:j_username").
+    return "`" + code.lstrip("= ").replace("`", "'") + "`"
+
+
+def _locator_bullet(fields: dict[str, str]) -> Optional[tuple[str, str]]:
+    """(name, `- **Locator Name**: `Code Snippet`` or the keyword, then the description)."""
+    name = fields.get("locator name") or fields.get("keyword")
+    if not name:
+        return None
+    kind = "" if fields.get("locator name") else " (keyword)"
+    lines = [f"- **{name}**{kind}" + (f": {_snippet(fields['code snippet'])}" if fields.get("code snippet") else "")]
+    if fields.get("description"):
+        lines.append(f"  {fields['description']}")
+    return name, "\n".join(lines)
+
+
+def _validation_bullet(fields: dict[str, str]) -> Optional[tuple[str, str]]:
+    """(rule, `- **Rule**: ...` with its expected result), or the cells of an untyped checklist row."""
+    if fields.get("rule") or fields.get("expected result"):
+        rule = fields.get("rule") or fields["expected result"]
+        lines = [f"- **Rule**: {rule}"]
+        if fields.get("rule") and fields.get("expected result"):
+            lines.append(f"  **Expected Result**: {fields['expected result']}")
+        for field in ("applies to", "condition", "failure message", "severity/priority"):
+            if fields.get(field):
+                lines.append(f"  {field.title()}: {fields[field]}")
+        return rule, "\n".join(lines)
+    # Untyped sheets: one "Column: value" line per cell. The column header is
+    # often a navigation link, so a single cell is shown on its own.
+    if not fields:
+        return None
+    if len(fields) == 1:
+        value = next(iter(fields.values()))
+        return value, f"- {value}"
+    text = "; ".join(f"{k.title()}: {v}" for k, v in fields.items())
+    return text, f"- {text}"
+
+
+# Namespaces whose chunks are one spreadsheet row each; a lookup there is
+# answered by the rows themselves.
+_BULLETS = {NAMESPACE_LOCATORS: _locator_bullet, NAMESPACE_VALIDATION: _validation_bullet}
+# Row fields holding the name of the entry (the values a query can name).
+_NAME_FIELDS = ("locator name", "keyword")
+
+
+def answering_rows(query: str, chunks: list[dict], *, min_score: float, named: list[str] = ()) -> list[dict]:
+    """
+    The retrieved rows that answer a lookup on their own, best first: rows
+    of the top chunk's namespace that hold an entry the query `named`, or
+    score at least `min_score` and share a word with it. Empty when the top
+    chunk itself isn't one, i.e. the lookup needs the LLM.
+    """
+    if not chunks or chunks[0].get("namespace") not in _BULLETS:
+        return []
+    namespace = chunks[0]["namespace"]
+    terms = _terms(query)
+
+    def answers(chunk: dict) -> bool:
+        fields = _fields(chunk.get("text", ""))
+        if any(fields.get(f) in named for f in _NAME_FIELDS):
+            return True
+        return chunk.get("score", 0.0) >= min_score and bool(terms & _terms(" ".join(fields.values())))
+
+    rows = sorted(chunks, key=lambda c: c.get("score", 0.0), reverse=True)
+    if not answers(rows[0]):
+        return []
+    return [c for c in rows if c.get("namespace") == namespace and answers(c)]
+
+
+def structured_answer(rows: list[dict]) -> Optional[str]:
+    """
+    Render `answering_rows` as bullets grouped under their sheet, without
+    an LLM call. An entry found in several sheets is shown once, with the
+    most detail.
+    """
+    groups: dict[tuple, dict[str, str]] = {}
+    seen: dict[str, tuple] = {}  # entry -> group it is shown in
+    for row in rows:
+        bullet = _BULLETS.get(row.get("namespace"), lambda f: None)(_fields(row.get("text", "")))
+        if bullet is None:
+            continue
+        entry, text = bullet
+        if entry == row.get("page"):
+            continue  # a section title row repeating its sheet name
+        group = (row.get("source"), row.get("page"))
+        if entry in seen:
+            shown = groups[seen[entry]]
+            if len(text) <= len(shown[entry]):
+                continue
+            del shown[entry]
+        groups.setdefault(group, {})[entry] = text
+        seen[entry] = group
+
+    sections = []
+    for (source, page), bullets in groups.items():
+        if not bullets:
+            continue
+        name = Path(source).name if source else "Knowledge base"
+        heading = f"**{page}** ({name})" if page else f"**{name}**"
+        sections.append(heading + "\n" + "\n".join(bullets.values()))
+    return "\n\n".join(sections) or None
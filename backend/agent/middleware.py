@@ -0,0 +1,33 @@
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import AIMessage, ToolMessage
+
+from backend.agent.extractive import extractive_answer
+from backend.config import DEGRADE_EXTRACTIVE_BELOW_S, LLM_TURN_TIMEOUT_S
+from backend.utils.deadline import degrade, remaining
+from backend.utils.http_clients import call_within_deadline
+from backend.utils.retrieval_context import get_last_retrieved_chunks
+
+
+class DeadlineMiddleware(AgentMiddleware):
+    """
+    Fits every LLM turn into the request deadline.
+
+    Each turn runs through `call_within_deadline` with LLM_TURN_TIMEOUT_S as
+    its cap. Once the tool has answered and too little time is left for
+    another turn, the turn is skipped and the retrieved passages are
+    returned as the answer.
+    """
+
+    def wrap_model_call(self, request, handler):
+        has_context = any(isinstance(m, ToolMessage) for m in request.messages)
+        if has_context and remaining() < DEGRADE_EXTRACTIVE_BELOW_S:
+            degrade("agent_turn")
+            return AIMessage(content=extractive_answer(get_last_retrieved_chunks()))
+
+        return call_within_deadline(
+            "llm_turn",
+            LLM_TURN_TIMEOUT_S,
+            lambda timeout: handler(
+                request.override(model_settings={**request.model_settings, "timeout": timeout})
+            ),
+        )
@@ -1,31 +1,399 @@
-from fastapi import FastAPI
+import contextvars
+import json
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import ExitStack, asynccontextmanager
+
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from backend.agent.agent import run_agent
-from backend.safety.input_guard import is_query_allowed
+from backend.agent.agent import preload, run_agent, run_direct, run_extractive
+from backend.cache.faq import FAQ_HIT, get_faq_store, has_faq_answer, lookup_faq_key, lookup_faq_similar
+from backend.cache.response_cache import get_response_cache, has_fresh_response, lookup_response, store_response
+from backend.config import (
+    ADMISSION_MAX_IN_FLIGHT,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_PER_CLIENT,
+    ADMISSION_QUEUE_TIMEOUT_S,
+    DEGRADE_SKIP_AGENT_BELOW_S,
+    DIRECT_ANSWERS,
+    DOCSTORE_PATH,
+    HTTP_WARMUP,
+    PRELOAD_AGENT,
+    QUERY_LOG_PATH,
+    REQUEST_TIMEOUT_S,
+    SINGLEFLIGHT_WORKERS,
+    WARMUP_TIMEOUT_S,
+    WARMUP_TOP_N,
+)
+from backend.rag.docstore import get_docstore
+from backend.safety.input_guard import check_query
 from backend.safety.prompt_guard import is_prompt_safe
+from backend.utils.admission import AdmissionController, AdmissionRejected
+from backend.utils.deadline import StageTimeout, degrade, degraded_reasons, remaining, start_deadline
+from backend.utils.http_clients import start_warm_up
+from backend.utils.metrics import Counter, Gauge, render_metrics
+from backend.utils.query import normalize_query
+from backend.utils.query_log import get_query_log, hot_queries
+from backend.utils.retrieval_context import start_retrieval_context
+from backend.utils.singleflight import SingleFlight
+from backend.utils.token_stream import start_token_stream
+from backend.utils.tracing import record_span, span, start_trace, trace_summary
+
+logger = logging.getLogger(__name__)
+
+
+# Set once the agent is built and the caches are warm (see /ready).
+ready = threading.Event()
+
+
+def _start_up() -> None:
+    try:
+        if DOCSTORE_PATH and get_docstore() is None:
+            logger.error("No docstore at DOCSTORE_PATH=%s: slim vectors can't be answered from", DOCSTORE_PATH)
+        if get_faq_store() is not None:
+            logger.info("FAQ tier: %d entries", len(get_faq_store()))
+        if PRELOAD_AGENT:
+            preload()
+        if WARMUP_TOP_N and QUERY_LOG_PATH:
+            # With a shared answer cache one worker replays for all of them.
+            if get_response_cache().claim("warmup", WARMUP_TIMEOUT_S):
+                _warm_caches(hot_queries(QUERY_LOG_PATH, WARMUP_TOP_N), WARMUP_TIMEOUT_S)
+            else:
+                logger.info("Another worker is warming the shared caches")
+    except Exception:
+        logger.exception("Startup warm-up failed")
+    finally:
+        ready.set()
+
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pre-open provider connections, build the agent and replay the hottest
+    # logged queries in the background: the port opens right away, /ask
+    # works meanwhile, and /ready reports 200 once the caches are warm.
+    if HTTP_WARMUP:
+        start_warm_up()
+    threading.Thread(target=_start_up, name="start-up", daemon=True).start()
+    yield
+    if get_query_log() is not None:
+        get_query_log().close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Identical in-flight queries share one pipeline run.
+inflight = SingleFlight(max_workers=SINGLEFLIGHT_WORKERS)
+
+# Bounded concurrency + priority queue in front of the pipeline.
+admission = AdmissionController(
+    max_in_flight=ADMISSION_MAX_IN_FLIGHT,
+    per_client=ADMISSION_PER_CLIENT,
+    max_queue=ADMISSION_MAX_QUEUE,
+    queue_timeout_s=ADMISSION_QUEUE_TIMEOUT_S,
+)
+
+ASK_REQUESTS = Counter("ika_ask_requests_total", "Completed /ask requests by outcome.", labels=("outcome",))
+COALESCED = Gauge("ika_singleflight_requests", "Single-flight calls, by kind (calls/coalesced/in_flight).", labels=("kind",))
+for _kind in ("calls", "coalesced", "in_flight"):
+    COALESCED.set_function(lambda k=_kind: inflight.stats()[k], kind=_kind)
+ADMISSION = Gauge("ika_admission_requests", "Requests holding an admission slot or queued for one.", labels=("state",))
+for _state in ("in_flight", "queued"):
+    ADMISSION.set_function(lambda k=_state: admission.stats()[k], state=_state)
+ADMISSION_REJECTED = Counter("ika_admission_rejected_total", "Requests turned away by admission control.", labels=("reason",))
+WARMUP_QUERIES = Counter("ika_warmup_queries_total", "Hot queries replayed into the caches at startup.")
 
 class AskRequest(BaseModel):
     query: str
 
-@app.post("/ask")
-def ask(req: AskRequest):
-    query = req.query
+
+def _answer(query: str) -> tuple[dict, str | None, list[str]]:
+    """
+    Full /ask pipeline. Returns (response body, cache status or None,
+    degradations taken to stay within the request deadline).
+    """
 
     # Rule-based input validation
-    if not is_query_allowed(query):
+    with span("input_guard") as attrs:
+        blocked_by = check_query(query)
+        if blocked_by:
+            attrs["rule"] = blocked_by
+    if blocked_by:
         return {
             "answer": "This query is outside the allowed scope.",
             "sources": []
-        }
+        }, None, []
+
+    # Precomputed FAQ answer: a vetted question asked again (normalized)
+    # needs no guard or LLM call.
+    with span("faq_lookup", match="key"):
+        faq = lookup_faq_key(query)
+    if faq is not None:
+        return faq, FAQ_HIT, []
 
     # Prompt injection / jailbreak detection
-    if is_prompt_safe(query):
+    with span("prompt_guard"):
+        try:
+            prompt_verdict = is_prompt_safe(query)
+        except StageTimeout:
+            # Unverified query: still answered, but never shown to the LLM.
+            degrade("prompt_guard")
+            prompt_verdict = None
+    if prompt_verdict is False:
         return {
             "answer": "Query blocked due to unsafe or malicious intent.",
             "sources": []
-        }
-    
-    # print(query)
-    return run_agent(query)
\ No newline at end of file
+        }, None, []
+
+    # Exact-match response cache (normalized query + model + prompt + index version)
+    with span("cache_lookup"):
+        cached, cache_status = lookup_response(query)
+    if cached is not None:
+        return cached, cache_status, []
+
+    # Paraphrase of an FAQ question (the query embedding is reused by retrieval)
+    with span("faq_lookup", match="embedding"):
+        faq = lookup_faq_similar(query)
+    if faq is not None:
+        return faq, FAQ_HIT, []
+
+    if prompt_verdict is None or remaining() < DEGRADE_SKIP_AGENT_BELOW_S:
+        if prompt_verdict is not None:
+            degrade("skip_agent")
+        with span("extractive"):
+            result = run_extractive(query)
+    else:
+        # print(query)
+        result = None
+        if DIRECT_ANSWERS:
+            # Locator / checklist lookups: the retrieved rows are the answer.
+            with span("direct_answer") as attrs:
+                result = run_direct(query)
+                attrs["answered"] = result is not None
+        if result is None:
+            with span("agent"):
+                result = run_agent(query)
+
+    degraded = degraded_reasons()
+    # Degraded answers are a stopgap; don't serve them from the cache later.
+    if not degraded:
+        store_response(query, result)
+    return result, cache_status, degraded
+
+
+def _warm_caches(queries: list[str], budget_s: float) -> None:
+    """
+    Run `queries` through the pipeline one at a time, so their guard
+    verdicts and answers are cached before the first user asks them.
+    Queries whose answer is already cached (a shared cache that is still
+    warm) are skipped. Replays are not written to the query log.
+    """
+    warm_until = time.monotonic() + budget_s
+    warmed = 0
+    for query in queries:
+        if time.monotonic() >= warm_until:
+            break
+        start_trace()
+        start_deadline(REQUEST_TIMEOUT_S)
+        start_retrieval_context()
+        if has_fresh_response(query):
+            continue
+        try:
+            with span("warmup"):
+                _answer(query)
+            warmed += 1
+        except Exception as exc:
+            logger.warning("Warm-up query failed: %s", exc)
+    WARMUP_QUERIES.inc(warmed)
+    logger.info("Warmed caches with %d of %d hot queries", warmed, len(queries))
+
+
+def _log_query(query: str, trace: list[dict], started: float, cache: str | None, outcome: str, result: dict | None = None) -> None:
+    log = get_query_log()
+    if log is None:
+        return
+    log.record(
+        query,
+        namespaces=list(dict.fromkeys(s["namespace"] for s in trace if s["stage"] == "vector_query")),
+        latency_ms=(time.perf_counter() - started) * 1000,
+        cache=cache,
+        outcome=outcome,
+        answer=(result or {}).get("answer"),
+    )
+
+
+def _outcome(result: dict, cache_status: str | None, degraded: list[str]) -> str:
+    """Query log outcome; only "answered" queries are replayed at warm-up."""
+    if cache_status is None:
+        return "blocked"
+    if degraded:
+        return "degraded"
+    return "answered" if result.get("sources") else "no_answer"
+
+
+def _priority(key: str, query: str) -> int:
+    """Queue priority: requests that are cheap to serve go first."""
+    if inflight.in_flight(key) or has_faq_answer(query) or has_fresh_response(query):
+        return 0
+    return 1
+
+
+@app.post("/ask")
+def ask(
+    req: AskRequest,
+    request: Request,
+    response: Response,
+    x_debug_trace: str | None = Header(default=None),
+    x_client_id: str | None = Header(default=None),
+):
+    query = req.query
+    key = normalize_query(query)
+    client = x_client_id or (request.client.host if request.client else "unknown")
+    trace = start_trace()
+    deadline = start_deadline(REQUEST_TIMEOUT_S)
+    start_retrieval_context()
+    started = time.perf_counter()
+
+    try:
+        with span("request"):
+            # The pipeline budgets its stages to finish before the deadline;
+            # these waits are only the backstop. Joining an identical
+            # request in flight costs nothing, so it skips admission.
+            joined = inflight.join(key, timeout=max(deadline.remaining(), 0.1))
+            if joined is None:
+                queued_at = time.perf_counter()
+                with admission.admit(client, priority=_priority(key, query)):
+                    record_span("admission_wait", time.perf_counter() - queued_at)
+                    joined = inflight.do(key, lambda: _answer(query), timeout=max(deadline.remaining(), 0.1))
+            (result, cache_status, degraded), shared = joined
+    except AdmissionRejected as exc:
+        ADMISSION_REJECTED.inc(reason=exc.reason)
+        _log_query(query, trace, started, None, "rejected")
+        raise HTTPException(
+            status_code=exc.status_code,
+            detail="The assistant is busy. Please retry shortly.",
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    except (FutureTimeoutError, StageTimeout):
+        ASK_REQUESTS.inc(outcome="timeout")
+        _log_query(query, trace, started, None, "timeout")
+        raise HTTPException(status_code=504, detail="The request timed out. Please try again.")
+    except Exception:
+        ASK_REQUESTS.inc(outcome="error")
+        _log_query(query, trace, started, None, "error")
+        raise
+
+    ASK_REQUESTS.inc(outcome=cache_status or "rejected")
+    _log_query(query, trace, started, cache_status, _outcome(result, cache_status, degraded), result)
+    if cache_status:
+        response.headers["X-Cache"] = cache_status
+    if degraded:
+        response.headers["X-Degraded"] = ",".join(degraded)
+
+    # Coalesced callers share the same result object; hand out copies.
+    body = dict(result)
+    if x_debug_trace:
+        body["trace"] = trace_summary(trace)
+        body["trace"]["coalesced"] = shared
+        body["trace"]["degraded"] = degraded
+    return body
+
+
+@app.post("/ask/stream")
+def ask_stream(
+    req: AskRequest,
+    request: Request,
+    x_client_id: str | None = Header(default=None),
+):
+    """
+    /ask, streamed as NDJSON: `{"type": "token", "text": ...}` lines while
+    the answer is generated, then one `{"type": "done", ...}` line with the
+    full response body, which is authoritative (the streamed text may be
+    replaced, e.g. by a fallback). Failures after the stream has started
+    arrive as `{"type": "error", "status": ..., "detail": ...}`.
+
+    Streams are not coalesced with identical in-flight requests, since each
+    one needs its own tokens.
+    """
+    query = req.query
+    client = x_client_id or (request.client.host if request.client else "unknown")
+    trace = start_trace()
+    deadline = start_deadline(REQUEST_TIMEOUT_S)
+    start_retrieval_context()
+    started = time.perf_counter()
+
+    admitted = ExitStack()
+    queued_at = time.perf_counter()
+    try:
+        admitted.enter_context(admission.admit(client, priority=_priority(normalize_query(query), query)))
+    except AdmissionRejected as exc:
+        ADMISSION_REJECTED.inc(reason=exc.reason)
+        _log_query(query, trace, started, None, "rejected")
+        raise HTTPException(
+            status_code=exc.status_code,
+            detail="The assistant is busy. Please retry shortly.",
+            headers={"Retry-After": str(exc.retry_after)},
+        )
+    record_span("admission_wait", time.perf_counter() - queued_at)
+
+    events: queue.Queue = queue.Queue()
+    start_token_stream(lambda text: events.put({"type": "token", "text": text}))
+
+    def run() -> None:
+        try:
+            with span("request"):
+                result, cache_status, degraded = _answer(query)
+            ASK_REQUESTS.inc(outcome=cache_status or "rejected")
+            _log_query(query, trace, started, cache_status, _outcome(result, cache_status, degraded), result)
+            events.put({"type": "done", **result, "cache": cache_status, "degraded": degraded})
+        except StageTimeout:
+            ASK_REQUESTS.inc(outcome="timeout")
+            _log_query(query, trace, started, None, "timeout")
+            events.put({"type": "error", "status": 504, "detail": "The request timed out. Please try again."})
+        except Exception:
+            ASK_REQUESTS.inc(outcome="error")
+            _log_query(query, trace, started, None, "error")
+            logger.exception("/ask/stream failed")
+            events.put({"type": "error", "status": 500, "detail": "Internal error."})
+        finally:
+            admitted.close()
+            events.put(None)
+
+    threading.Thread(target=contextvars.copy_context().run, args=(run,), name="ask-stream", daemon=True).start()
+
+    def lines():
+        while True:
+            try:
+                event = events.get(timeout=max(deadline.remaining(), 0.1))
+            except queue.Empty:
+                yield json.dumps({"type": "error", "status": 504, "detail": "The request timed out. Please try again."}) + "\n"
+                return
+            if event is None:
+                return
+            yield json.dumps(event) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/ready")
+def readiness(response: Response):
+    """
+    Readiness probe: 503 until the agent is built and the caches are warm,
+    or while the configured docstore is missing.
+    """
+    if not ready.is_set():
+        response.status_code = 503
+        return {"status": "warming_up"}
+    if DOCSTORE_PATH and get_docstore() is None:
+        response.status_code = 503
+        return {"status": "docstore_missing"}
+    return {"status": "ready"}
+
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+
+@dataclass(frozen=True)
+class CacheEntry:
+    """A cached value plus whether it is still within its TTL.
+
+    Expired entries are kept for a grace period so callers can tell a
+    "stale" lookup (we had it, but it's too old) from a plain miss.
+    """
+
+    value: Any
+    fresh: bool
+
+
+class CacheBackend(ABC):
+    """Minimal key/value cache interface shared by all cache implementations."""
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[CacheEntry]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        ...
+
+    def contains_fresh(self, key: str) -> bool:
+        entry = self.get(key)
+        return entry is not None and entry.fresh
+
+    def claim(self, key: str, ttl_s: float) -> bool:
+        """
+        Take `key` for `ttl_s` unless someone sharing the cache already has.
+        A cache of this process only is shared with no one.
+        """
+        return True
+
+
+class InMemoryCache(CacheBackend):
+    """Thread-safe in-process LRU cache with TTL.
+
+    - at most `max_entries` keys; the least recently used key is evicted first
+    - entries older than `ttl_s` are returned as stale, and dropped entirely
+      after another `stale_grace_s`
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_s: float = 3600.0, stale_grace_s: float | None = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl_s = ttl_s
+        self.stale_grace_s = ttl_s if stale_grace_s is None else stale_grace_s
+        self._data: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+
+            stored_at, value = item
+            age = now - stored_at
+            if age > self.ttl_s + self.stale_grace_s:
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return CacheEntry(value=value, fresh=age <= self.ttl_s)
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisCache(CacheBackend):
+    """Cache shared by all workers/instances, stored in Redis.
+
+    Values must be JSON-serializable. Keys expire in Redis after
+    `ttl_s + stale_grace_s`; LRU eviction under memory pressure is the Redis
+    server's job (`maxmemory-policy allkeys-lru`).
+
+    `client` can be any object with redis-py's `get` / `set(ex=)` / `delete`
+    methods (`set(nx=)` too for `claim`), e.g. `benchmarks.fakes.FakeRedis()`
+    as a local stand-in (see `python -m benchmarks.cache_backends`).
+    """
+
+    def __init__(
+        self,
+        client: Any = None,
+        *,
+        url: str | None = None,
+        prefix: str = "ika:",
+        ttl_s: float = 3600.0,
+        stale_grace_s: float | None = None,
+    ):
+        if client is None:
+            try:
+                import redis
+            except Exception as exc:  # pragma: no cover
+                raise RuntimeError("redis is required for the shared cache. Install with `pip install redis`.") from exc
+            if not url:
+                raise RuntimeError("REDIS_URL is not set")
+            client = redis.Redis.from_url(url)
+
+        self._client = client
+        self.prefix = prefix
+        self.ttl_s = ttl_s
+        self.stale_grace_s = ttl_s if stale_grace_s is None else stale_grace_s
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        raw = self._client.get(self.prefix + key)
+        if raw is None:
+            return None
+        try:
+            item = json.loads(raw)
+        except (TypeError, ValueError):
+            return None
+
+        # Wall clock here: entries are shared across processes/machines.
+        age = time.time() - float(item.get("t", 0))
+        return CacheEntry(value=item.get("v"), fresh=age <= self.ttl_s)
+
+    def set(self, key: str, value: Any) -> None:
+        payload = json.dumps({"t": time.time(), "v": value}, separators=(",", ":"))
+        self._client.set(self.prefix + key, payload, ex=max(1, int(self.ttl_s + self.stale_grace_s)))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(self.prefix + key)
+
+    def claim(self, key: str, ttl_s: float) -> bool:
+        return bool(self._client.set(self.prefix + key, os.getpid(), nx=True, ex=max(1, int(ttl_s))))
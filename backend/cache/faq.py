@@ -0,0 +1,319 @@
+"""
+Precomputed FAQ answer tier.
+
+`scripts/build_faq.py` runs frequent or curated questions through the full
+pipeline once and keeps the grounded, undegraded answers in FAQ_FILE:
+
+    {"entries": [{"question": "...", "key": "<normalized>", "embedding": [...],
+                  "answer": "...", "sources": [...], "citations": [...],
+                  "index_version": "1", "chunks": [{"namespace": "sop", "id": "...", "text_hash": "..."}],
+                  "created_at": 1760000000.0}]}
+
+/ask answers a query from it, without any guard or LLM call, when its
+normalized form is an entry's key, or (after the prompt guard) when its
+embedding is within FAQ_SIMILARITY of an entry's question. Only entries
+built for the current INDEX_VERSION are served.
+
+`chunks` are the chunks the answer was generated from. When ingestion
+changes or removes one of them, `refresh_faq` generates the entry again.
+"""
+
+from __future__ import annotations
+
+import copy
+import json
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, NamedTuple, Optional
+
+from backend.cache.response_cache import get_index_version
+from backend.config import EMBEDDING_TIMEOUT_S, FAQ_FILE, FAQ_RELOAD_S, FAQ_SIMILARITY, REQUEST_TIMEOUT_S
+from backend.rag.docstore import text_hash
+from backend.rag.embeddings import embed_texts
+from backend.utils.deadline import StageTimeout, degraded_reasons, start_deadline
+from backend.utils.metrics import Counter
+from backend.utils.query import normalize_query
+from backend.utils.retrieval_context import get_last_retrieved_chunks, set_query_embedding, start_retrieval_context
+from backend.utils.tracing import span, start_trace
+
+logger = logging.getLogger(__name__)
+
+FAQ_HIT = "faq"
+
+FAQ_LOOKUPS = Counter(
+    "ika_faq_lookups_total",
+    "FAQ tier lookups, by how the query matched (key/embedding/none).",
+    labels=("match",),
+)
+
+
+# -------------------------------------------------
+# FILE
+# -------------------------------------------------
+def load_faq(path: str | Path) -> list[dict]:
+    """Entries in the FAQ file, or none when there is no file."""
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))["entries"]
+    except FileNotFoundError:
+        return []
+
+
+def write_faq(path: str | Path, entries: list[dict]) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps({"entries": entries}, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+# -------------------------------------------------
+# SERVING
+# -------------------------------------------------
+class _Entries(NamedTuple):
+    by_key: dict[str, dict]
+    embedded: list[dict]
+    matrix: object  # unit-length question embeddings (numpy), one row per `embedded` entry
+
+
+def _index(entries: list[dict]) -> _Entries:
+    current = [e for e in entries if e.get("index_version") == get_index_version()]
+    embedded = [e for e in current if e.get("embedding")]
+    matrix = None
+    if embedded:
+        import numpy as np  # only once there are entries to compare with
+
+        matrix = np.asarray([e["embedding"] for e in embedded], dtype=np.float32)
+        matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    return _Entries({e["key"]: e for e in current}, embedded, matrix)
+
+
+class FAQStore:
+    """The FAQ file, indexed for lookups and reloaded when it changes."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._version: Optional[str] = None
+        self._checked_at = float("-inf")
+        self._entries = _index([])
+
+    def _current(self) -> _Entries:
+        if time.monotonic() - self._checked_at >= FAQ_RELOAD_S:
+            self._maybe_reload()
+        return self._entries
+
+    def _maybe_reload(self) -> None:
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except FileNotFoundError:
+                mtime = None
+            # A namespace switch changes the index version: entries built
+            # before it stop being served even though the file is the same.
+            version = get_index_version()
+            if mtime == self._mtime and version == self._version:
+                return
+            try:
+                self._entries = _index(load_faq(self.path))
+                self._mtime = mtime
+                self._version = version
+                logger.info("Loaded %d FAQ entries from %s", len(self._entries.by_key), self.path)
+            except (OSError, ValueError, KeyError) as exc:
+                # Keep serving the last good entries.
+                logger.error("FAQ reload from %s failed: %s", self.path, exc)
+
+    def __len__(self) -> int:
+        return len(self._current().by_key)
+
+    def match_key(self, query: str) -> Optional[dict]:
+        return self._current().by_key.get(normalize_query(query))
+
+    def match_embedding(self, embedding: list[float], min_similarity: float) -> Optional[tuple[dict, float]]:
+        """Entry whose question is most similar to `embedding`, if at least `min_similarity`."""
+        entries = self._current()
+        if entries.matrix is None:
+            return None
+        import numpy as np
+
+        vector = np.asarray(embedding, dtype=np.float32)
+        scores = entries.matrix @ (vector / max(float(np.linalg.norm(vector)), 1e-12))
+        best = int(scores.argmax())
+        if scores[best] < min_similarity:
+            return None
+        return entries.embedded[best], float(scores[best])
+
+
+_store: Optional[FAQStore] = None
+_store_lock = threading.Lock()
+
+
+def get_faq_store() -> Optional[FAQStore]:
+    """The process-wide FAQ store, or None when FAQ_FILE is empty."""
+    global _store
+    if _store is None and FAQ_FILE:
+        with _store_lock:
+            if _store is None:
+                _store = FAQStore(FAQ_FILE)
+    return _store
+
+
+def _response(entry: dict) -> dict:
+    return copy.deepcopy({"answer": entry["answer"], "sources": entry["sources"], "citations": entry["citations"]})
+
+
+def has_faq_answer(query: str) -> bool:
+    """Peek for a key match without counting a lookup (used for admission priority)."""
+    store = get_faq_store()
+    return store is not None and store.match_key(query) is not None
+
+
+def lookup_faq_key(query: str) -> Optional[dict]:
+    """Precomputed response for a query that is an FAQ question (normalized), or None."""
+    store = get_faq_store()
+    entry = store.match_key(query) if store is not None else None
+    if entry is None:
+        return None
+    FAQ_LOOKUPS.inc(match="key")
+    return _response(entry)
+
+
+def lookup_faq_similar(query: str) -> Optional[dict]:
+    """
+    Precomputed response for the FAQ question closest to `query` by
+    embedding, or None. The query embedding is kept for retrieval.
+    """
+    store = get_faq_store()
+    if store is None or not len(store):
+        return None
+    match = None
+    if FAQ_SIMILARITY > 0:
+        try:
+            with span("embedding"):
+                embedding = embed_texts([query], timeout=EMBEDDING_TIMEOUT_S)[0]
+        except StageTimeout:
+            embedding = None  # retrieval tries again, within its own budget
+        if embedding is not None:
+            set_query_embedding(query, embedding)
+            match = store.match_embedding(embedding, FAQ_SIMILARITY)
+    FAQ_LOOKUPS.inc(match="embedding" if match else "none")
+    return _response(match[0]) if match else None
+
+
+# -------------------------------------------------
+# BUILDING (offline: scripts/build_faq.py, scripts/ingest_docs.py)
+# -------------------------------------------------
+def generate_entry(question: str) -> tuple[Optional[dict], str]:
+    """
+    Run `question` through the full /ask pipeline once. Returns (entry,
+    "ok"), or (None, why the answer can't be served as an FAQ answer).
+    """
+    from backend.agent.agent import run_agent
+    from backend.safety.input_guard import check_query
+    from backend.safety.prompt_guard import is_prompt_safe
+
+    start_trace()
+    start_deadline(REQUEST_TIMEOUT_S)
+    start_retrieval_context()
+
+    try:
+        if check_query(question) or not is_prompt_safe(question):
+            return None, "blocked"
+        result = run_agent(question)
+    except StageTimeout:
+        return None, "timeout"
+    if degraded_reasons():
+        return None, "degraded"
+    if not result.get("sources"):
+        return None, "no_answer"
+
+    return {
+        "question": question,
+        "key": normalize_query(question),
+        "embedding": embed_texts([question])[0],
+        "answer": result["answer"],
+        "sources": result["sources"],
+        "citations": result.get("citations", []),
+        "index_version": get_index_version(),
+        "chunks": [
+            {"namespace": c["namespace"], "id": c["id"], "text_hash": c.get("text_hash") or text_hash(c["text"])}
+            for c in get_last_retrieved_chunks()
+        ],
+        "created_at": round(time.time(), 3),
+    }, "ok"
+
+
+def build_faq(questions: Iterable[str], path: str | Path) -> dict[str, str]:
+    """
+    Generate entries for `questions` and merge them into the FAQ file
+    (replacing entries for the same normalized question). Returns the
+    outcome per question.
+    """
+    entries = {e["key"]: e for e in load_faq(path)}
+    outcomes = {}
+    for question in questions:
+        entry, outcome = generate_entry(question)
+        outcomes[question] = outcome
+        if entry is not None:
+            entries[entry["key"]] = entry
+    write_faq(path, list(entries.values()))
+    return outcomes
+
+
+class ChunkHashRecorder:
+    """
+    Records the text hash of every upserted chunk, per namespace. Has the
+    SnapshotWriter `add` interface, so it plugs into RecordingIndex.
+    """
+
+    def __init__(self):
+        self.hashes: dict[str, dict[str, str]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, vectors: Iterable, namespace: str = "") -> None:
+        from backend.rag.local_index import unpack_vector  # numpy: ingestion only
+
+        with self._lock:
+            hashes = self.hashes.setdefault(namespace or "", {})
+            for vector in vectors:
+                vid, _, metadata = unpack_vector(vector)
+                hashes[str(vid)] = metadata.get("text_hash") or text_hash(metadata.get("text", ""))
+
+
+def is_stale(entry: dict, hashes: dict[str, dict[str, str]]) -> bool:
+    """Whether a chunk `entry` was generated from was changed or removed by an ingestion of `hashes`."""
+    return any(
+        c["namespace"] in hashes and hashes[c["namespace"]].get(c["id"]) != c["text_hash"]
+        for c in entry.get("chunks", [])
+    )
+
+
+def refresh_faq(path: str | Path, hashes: dict[str, dict[str, str]]) -> dict[str, int]:
+    """
+    After an ingestion that upserted `hashes` (namespace -> chunk id -> text
+    hash, every chunk of each namespace it ingested), generate the stale
+    entries again and stamp the rest with the current INDEX_VERSION.
+    Entries that no longer get a servable answer are dropped.
+    """
+    counts = {"unchanged": 0, "regenerated": 0, "dropped": 0}
+    refreshed = []
+    for entry in load_faq(path):
+        if not is_stale(entry, hashes):
+            entry["index_version"] = get_index_version()
+            refreshed.append(entry)
+            counts["unchanged"] += 1
+            continue
+        new, outcome = generate_entry(entry["question"])
+        if new is None:
+            logger.warning("Dropped FAQ entry %r: %s after re-ingestion", entry["question"], outcome)
+            counts["dropped"] += 1
+        else:
+            refreshed.append(new)
+            counts["regenerated"] += 1
+    if refreshed or counts["dropped"]:
+        write_faq(path, refreshed)
+    return counts
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+from functools import lru_cache
+
+from backend.cache.backends import CacheBackend, InMemoryCache, RedisCache
+from backend.config import (
+    INDEX_VERSION,
+    LLM_MODEL,
+    REDIS_URL,
+    RESPONSE_CACHE_BACKEND,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_TTL_S,
+)
+from backend.agent.prompts import SYSTEM_PROMPT
+from backend.rag.namespace_registry import registry_revision
+from backend.utils.metrics import CACHE_REQUESTS
+from backend.utils.query import normalize_query
+
+CACHE_HIT = "hit"
+CACHE_MISS = "miss"
+CACHE_STALE = "stale"
+
+
+@lru_cache(maxsize=1)
+def get_response_cache() -> CacheBackend:
+    """
+    Create and cache the response cache selected by RESPONSE_CACHE_BACKEND.
+    """
+    if RESPONSE_CACHE_BACKEND == "redis":
+        return RedisCache(url=REDIS_URL, prefix="ika:answer:", ttl_s=RESPONSE_CACHE_TTL_S)
+
+    return InMemoryCache(max_entries=RESPONSE_CACHE_MAX_ENTRIES, ttl_s=RESPONSE_CACHE_TTL_S)
+
+
+@lru_cache(maxsize=1)
+def _prompt_hash() -> str:
+    return hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+
+def get_index_version() -> str:
+    """INDEX_VERSION, plus the namespace registry revision once a versioned ingestion switched namespaces."""
+    revision = registry_revision()
+    return f"{INDEX_VERSION}.{revision}" if revision else INDEX_VERSION
+
+
+def response_cache_key(query: str) -> str:
+    """
+    Cache key for a full /ask response.
+
+    A cached answer is only valid for the same question, model, system prompt
+    and indexed content, so all of them are part of the key.
+    """
+    parts = [normalize_query(query), LLM_MODEL, _prompt_hash(), get_index_version()]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+def lookup_response(query: str) -> tuple[dict | None, str]:
+    """
+    Returns (cached response or None, cache status).
+    Stale entries are reported but not served.
+    """
+    entry = get_response_cache().get(response_cache_key(query))
+    if entry is None:
+        status = CACHE_MISS
+    elif not entry.fresh:
+        status = CACHE_STALE
+    else:
+        status = CACHE_HIT
+    CACHE_REQUESTS.inc(cache="response", status=status)
+
+    if status != CACHE_HIT:
+        return None, status
+    return copy.deepcopy(entry.value), status
+
+
+def has_fresh_response(query: str) -> bool:
+    """Peek at the cache without counting a lookup (used for admission priority)."""
+    return get_response_cache().contains_fresh(response_cache_key(query))
+
+
+def store_response(query: str, response: dict) -> None:
+    """
+    Cache a grounded answer. Fallbacks (no context / unsafe output) are not
+    cached so a later retry can still succeed.
+    """
+    if not response.get("sources"):
+        return
+    get_response_cache().set(response_cache_key(query), copy.deepcopy(response))
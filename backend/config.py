@@ -14,7 +14,24 @@ LLM_MODEL = "gpt-5-nano-2025-08-07"
 EMBEDDING_MODEL = "text-embedding-3-small"
 EMBEDDING_DIMENSION: int = 1536
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-OPENAI_API_BASE = "https://api.openai.com/v1"
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+
+# -------------------------------------------------
+# PROMPT GUARD (Groq, OpenAI-compatible API)
+# -------------------------------------------------
+GROQ_API_KEY = os.getenv("GROQ_API_KEY")
+GROQ_API_BASE = os.getenv("GROQ_API_BASE", "https://api.groq.com/openai/v1")
+# Prompt Guard 2 returns a jailbreak/injection probability; at or above this
+# the query is blocked.
+PROMPT_GUARD_THRESHOLD = float(os.getenv("PROMPT_GUARD_THRESHOLD", "0.5"))
+# Verdicts are cached per normalized query (same backend as the response cache).
+PROMPT_GUARD_CACHE_TTL_S = float(os.getenv("PROMPT_GUARD_CACHE_TTL_S", "86400"))
+PROMPT_GUARD_CACHE_MAX_ENTRIES = int(os.getenv("PROMPT_GUARD_CACHE_MAX_ENTRIES", "8192"))
+# Short, plain questions about the knowledge base (in-domain terms, question
+# shape, nothing addressed to the assistant) are cleared locally, without
+# calling Groq. Set to 0 to send every query to the model.
+PROMPT_GUARD_PREFILTER = os.getenv("PROMPT_GUARD_PREFILTER", "1") == "1"
+PROMPT_GUARD_PREFILTER_MAX_CHARS = int(os.getenv("PROMPT_GUARD_PREFILTER_MAX_CHARS", "160"))
 
 # -------------------------------------------------
 # PINECONE CONFIGURATION
@@ -22,12 +39,43 @@ OPENAI_API_BASE = "https://api.openai.com/v1"
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENV = os.getenv("PINECONE_ENV")
 PINECONE_INDEX = "internal-knowledge-assistant"
+# Optional index host (shown in the Pinecone console); saves two API calls at startup.
+PINECONE_HOST = os.getenv("PINECONE_HOST")
+
+# "pinecone" (default), "memory" (in-process index for benchmarks / local dev)
+# or "snapshot" (serve from the local snapshot in INDEX_SNAPSHOT_DIR, memory-
+# mapped and shared by all worker processes; no Pinecone calls).
+VECTOR_STORE = os.getenv("VECTOR_STORE", "pinecone")
 
 # -------------------------------------------------
 # RETRIEVAL CONFIGURATION
 # -------------------------------------------------
 TOP_K = 7
 
+# Adaptive retrieval: ask each namespace for ADAPTIVE_INITIAL_K matches and
+# widen to TOP_K only where more matches could still make the final context.
+ADAPTIVE_TOP_K = os.getenv("ADAPTIVE_TOP_K", "1") == "1"
+ADAPTIVE_INITIAL_K = int(os.getenv("ADAPTIVE_INITIAL_K", "2"))
+
+# Metadata filter pushdown: sheet / module / locator / keyword names found in
+# the query restrict the vector search in that namespace. The vocabulary is
+# written by scripts/ingest_docs.py.
+QUERY_FILTERS = os.getenv("QUERY_FILTERS", "1") == "1"
+QUERY_VOCAB_FILE = os.getenv("QUERY_VOCAB_FILE", "query_vocab.json")
+# How often serving processes check the vocabulary file for a re-ingestion.
+QUERY_VOCAB_RELOAD_S = float(os.getenv("QUERY_VOCAB_RELOAD_S", "30"))
+
+# Max chunks the retriever returns after score filtering / dedupe.
+FINAL_CONTEXT_SIZE = 5
+
+# Max tokens of retrieved context packed into the agent prompt.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1200"))
+
+# Bumped whenever the indexed content changes, so cached answers built on
+# the previous content are never served. Versioned ingestions bump it on
+# their own (the namespace registry revision is appended).
+INDEX_VERSION = os.getenv("INDEX_VERSION", "1")
+
 # Pinecone namespaces (one per doc type).
 #
 # We keep these as simple strings so:
@@ -49,3 +97,160 @@ ALL_NAMESPACES = [
     NAMESPACE_COMPANY,
 	NAMESPACE_SOP,
 ]
+
+# -------------------------------------------------
+# VERSIONED NAMESPACES (blue/green re-ingestion)
+# -------------------------------------------------
+# Ingestion writes each namespace above into a fresh version ("sop@v42") and
+# then switches to it in the registry; queries resolve each namespace to its
+# active version. "index": a record in the vector index itself, seen by every
+# server using it (a file inside INDEX_SNAPSHOT_DIR with VECTOR_STORE=snapshot).
+# A path: that local file. Empty string: ingest in place, query the names as
+# they are.
+NAMESPACE_REGISTRY = os.getenv("NAMESPACE_REGISTRY", "index")
+# How often serving processes check the registry for a switch.
+NAMESPACE_REGISTRY_RELOAD_S = float(os.getenv("NAMESPACE_REGISTRY_RELOAD_S", "10"))
+# A replaced version is deleted (by a later ingestion, or scripts/namespaces.py
+# cleanup) once it has been retired this long: processes that haven't reloaded
+# the registry yet still query it, and it can be switched back to until then.
+NAMESPACE_RETIRE_GRACE_S = float(os.getenv("NAMESPACE_RETIRE_GRACE_S", "600"))
+
+# -------------------------------------------------
+# RESPONSE CACHE
+# -------------------------------------------------
+# "memory" (per process) or "redis" (shared by all workers; needs REDIS_URL)
+RESPONSE_CACHE_BACKEND = os.getenv("RESPONSE_CACHE_BACKEND", "memory")
+RESPONSE_CACHE_TTL_S = float(os.getenv("RESPONSE_CACHE_TTL_S", "3600"))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+REDIS_URL = os.getenv("REDIS_URL")
+
+# -------------------------------------------------
+# REQUEST HANDLING
+# -------------------------------------------------
+# Deadline for an /ask request, from arrival (the Streamlit client gives up at 30s).
+# Every stage's timeout is cut to fit what is left of it.
+REQUEST_TIMEOUT_S = float(os.getenv("REQUEST_TIMEOUT_S", "25"))
+# Time kept back from the stages to assemble a degraded answer and respond.
+DEADLINE_RESERVE_S = float(os.getenv("DEADLINE_RESERVE_S", "1.5"))
+# Per-stage caps (each is also cut to the time left before the deadline).
+GUARD_TIMEOUT_S = float(os.getenv("GUARD_TIMEOUT_S", "3"))
+EMBEDDING_TIMEOUT_S = float(os.getenv("EMBEDDING_TIMEOUT_S", "3"))
+LLM_TURN_TIMEOUT_S = float(os.getenv("LLM_TURN_TIMEOUT_S", "12"))
+# With less than this left, stop querying further namespaces.
+DEGRADE_NAMESPACES_BELOW_S = float(os.getenv("DEGRADE_NAMESPACES_BELOW_S", "8"))
+# With less than this left, don't start the agent: answer extractively from
+# the retrieved chunks (no LLM call).
+DEGRADE_SKIP_AGENT_BELOW_S = float(os.getenv("DEGRADE_SKIP_AGENT_BELOW_S", "8"))
+# With less than this left once the tool has answered, skip the agent's
+# final LLM turn and answer extractively.
+DEGRADE_EXTRACTIVE_BELOW_S = float(os.getenv("DEGRADE_EXTRACTIVE_BELOW_S", "4"))
+# Worker threads running coalesced /ask pipelines.
+SINGLEFLIGHT_WORKERS = int(os.getenv("SINGLEFLIGHT_WORKERS", "16"))
+# Import LangChain and build the agent in the background at startup instead
+# of on the first /ask.
+PRELOAD_AGENT = os.getenv("PRELOAD_AGENT", "1") == "1"
+# Answer locator / validation checklist lookups with the retrieved rows as
+# bullets, without an LLM call, when the top chunk is such a row and scores at
+# least DIRECT_ANSWER_MIN_SCORE or holds the locator / keyword the query names.
+DIRECT_ANSWERS = os.getenv("DIRECT_ANSWERS", "1") == "1"
+DIRECT_ANSWER_MIN_SCORE = float(os.getenv("DIRECT_ANSWER_MIN_SCORE", "0.75"))
+
+# -------------------------------------------------
+# QUERY LOG / WARM-UP
+# -------------------------------------------------
+# Every /ask is appended to this JSONL log (empty string: no log), written in
+# the background, one file per worker (query_log.<pid>.jsonl) rotated at
+# QUERY_LOG_MAX_BYTES.
+QUERY_LOG_PATH = os.getenv("QUERY_LOG_PATH", "logs/query_log.jsonl")
+QUERY_LOG_MAX_BYTES = int(os.getenv("QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+QUERY_LOG_BACKUPS = int(os.getenv("QUERY_LOG_BACKUPS", "5"))
+# Records waiting to be written; beyond this they are dropped.
+QUERY_LOG_QUEUE_SIZE = int(os.getenv("QUERY_LOG_QUEUE_SIZE", "10000"))
+# At startup, replay this many of the most frequent logged queries to fill
+# the caches before /ready reports ready (0 disables), within WARMUP_TIMEOUT_S.
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "20"))
+WARMUP_TIMEOUT_S = float(os.getenv("WARMUP_TIMEOUT_S", "120"))
+
+# -------------------------------------------------
+# FAQ ANSWER TIER
+# -------------------------------------------------
+# Vetted answers to frequent questions, built by scripts/build_faq.py and
+# regenerated by scripts/ingest_docs.py when their chunks change. /ask serves
+# them without any LLM call. Empty string: no FAQ tier.
+FAQ_FILE = os.getenv("FAQ_FILE", "faq.json")
+# Besides its normalized question, an entry answers queries whose embedding
+# has at least this cosine similarity to the question's (0 disables). Costs
+# an embedding call on FAQ misses, which retrieval then reuses.
+FAQ_SIMILARITY = float(os.getenv("FAQ_SIMILARITY", "0.92"))
+# How often the FAQ file is checked for changes.
+FAQ_RELOAD_S = float(os.getenv("FAQ_RELOAD_S", "30"))
+
+# -------------------------------------------------
+# SAFETY POLICY
+# -------------------------------------------------
+# Phrase rules for the input guard and output filter (JSON, see
+# backend/safety/policy.py). Empty: the bundled backend/safety/policy.json.
+POLICY_FILE = os.getenv("POLICY_FILE", "")
+# How often the policy file is checked for changes.
+POLICY_RELOAD_S = float(os.getenv("POLICY_RELOAD_S", "5"))
+# Stream LLM answers and check them while they are generated, stopping the
+# generation as soon as an output rule is broken.
+OUTPUT_STREAM_FILTER = os.getenv("OUTPUT_STREAM_FILTER", "1") == "1"
+
+# -------------------------------------------------
+# ADMISSION CONTROL (/ask)
+# -------------------------------------------------
+# Requests running at once, and per client (X-Client-Id header or IP).
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8"))
+ADMISSION_PER_CLIENT = int(os.getenv("ADMISSION_PER_CLIENT", "4"))
+# Waiting requests beyond the in-flight limit; more than this get a 429.
+# Keep in-flight + queue below the server's worker thread pool (40 by default).
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "24"))
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "10"))
+
+# -------------------------------------------------
+# OUTBOUND HTTP (OpenAI, Groq, Pinecone)
+# -------------------------------------------------
+# One shared keep-alive pool per provider (see backend/utils/http_clients.py).
+HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "32"))
+HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "16"))
+# Idle connections are kept this long; providers close theirs after a few minutes.
+HTTP_KEEPALIVE_EXPIRY_S = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_S", "90"))
+HTTP_CONNECT_TIMEOUT_S = float(os.getenv("HTTP_CONNECT_TIMEOUT_S", "5"))
+HTTP_READ_TIMEOUT_S = float(os.getenv("HTTP_READ_TIMEOUT_S", "30"))
+# HTTP/2 is used when the `h2` package is installed.
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "1") == "1"
+# Open provider connections in the background at startup.
+HTTP_WARMUP = os.getenv("HTTP_WARMUP", "1") == "1"
+
+# -------------------------------------------------
+# CHUNK DOCSTORE
+# -------------------------------------------------
+# Chunk texts, keyed by hash (written by scripts/ingest_docs.py). Vectors
+# ingested with it carry only `text_hash` in their metadata; the retriever
+# reads the texts of the final chunks from here, and /ready reports 503
+# while it is missing. Empty string: keep the texts in the vector metadata.
+DOCSTORE_PATH = os.getenv("DOCSTORE_PATH", "")
+
+# -------------------------------------------------
+# VECTOR STORE FALLBACK
+# -------------------------------------------------
+# Local read-only snapshot of the index (written by scripts/ingest_docs.py).
+# Queries are served from it while Pinecone is failing or slow. Set to an
+# empty string to disable the fallback.
+INDEX_SNAPSHOT_DIR = os.getenv("INDEX_SNAPSHOT_DIR", "snapshot")
+# How often the snapshot's GENERATION file is checked: a re-ingest's new
+# generation is picked up this long after it is written, without a restart.
+SNAPSHOT_RELOAD_S = float(os.getenv("SNAPSHOT_RELOAD_S", "10"))
+# Generations kept on disk (the current one included).
+SNAPSHOT_KEEP_GENERATIONS = int(os.getenv("SNAPSHOT_KEEP_GENERATIONS", "2"))
+# Cap for one vector query (also cut to the request deadline).
+VECTOR_QUERY_TIMEOUT_S = float(os.getenv("VECTOR_QUERY_TIMEOUT_S", "2"))
+# Circuit breaker: open when this fraction of the last VECTOR_BREAKER_WINDOW
+# queries failed or took longer than VECTOR_SLOW_QUERY_S.
+VECTOR_SLOW_QUERY_S = float(os.getenv("VECTOR_SLOW_QUERY_S", "1"))
+VECTOR_BREAKER_FAILURE_RATE = float(os.getenv("VECTOR_BREAKER_FAILURE_RATE", "0.5"))
+VECTOR_BREAKER_WINDOW = int(os.getenv("VECTOR_BREAKER_WINDOW", "20"))
+VECTOR_BREAKER_MIN_CALLS = int(os.getenv("VECTOR_BREAKER_MIN_CALLS", "5"))
+# How often Pinecone is probed in the background while the circuit is open.
+VECTOR_BREAKER_PROBE_S = float(os.getenv("VECTOR_BREAKER_PROBE_S", "10"))
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from backend.config import CONTEXT_TOKEN_BUDGET
+
+
+# Fields the ingesters always write, even when the cell was empty.
+# An empty "Keyword:" line costs tokens and tells the LLM nothing.
+_OPTIONAL_FIELDS = {"locator name", "keyword", "code snippet", "description"}
+
+# Fields that are identical for every chunk of a group; they are emitted once
+# in the group header instead of once per chunk.
+_HEADER_FIELDS = {"document type", "sheet"}
+
+
+@dataclass(frozen=True)
+class PackedContext:
+    """Context string handed to the LLM plus what it cost."""
+
+    text: str
+    token_count: int
+    chunk_count: int
+
+
+@lru_cache(maxsize=1)
+def _get_encoder():
+    """Return a tiktoken encoder, or None when tiktoken isn't available.
+
+    tiktoken is pulled in by `langchain-openai`, so this is the normal path;
+    the fallback only keeps the packer usable in minimal environments.
+    """
+
+    try:
+        import tiktoken
+    except Exception:  # pragma: no cover
+        return None
+
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:  # pragma: no cover
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens the way the LLM will (approximate without tiktoken)."""
+
+    if not text:
+        return 0
+    enc = _get_encoder()
+    if enc is None:
+        # ~4 characters per token for English prose.
+        return max(1, len(text) // 4)
+    return len(enc.encode(text))
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    enc = _get_encoder()
+    if enc is None:
+        return text[: max_tokens * 4]
+    tokens = enc.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return enc.decode(tokens[:max_tokens])
+
+
+def _split_chunk(text: str) -> tuple[dict[str, str], str]:
+    """Split chunk text into (header fields, cleaned body).
+
+    - "Document Type" / "Sheet" lines move to the group header
+    - optional fields with an empty value are dropped
+    """
+
+    header: dict[str, str] = {}
+    body: list[str] = []
+
+    for raw in (text or "").splitlines():
+        line = raw.strip()
+        if not line:
+            continue
+
+        key, sep, value = line.partition(":")
+        field = key.strip().lower()
+        if sep and field in _HEADER_FIELDS:
+            header.setdefault(field, value.strip())
+            continue
+        if sep and field in _OPTIONAL_FIELDS and not value.strip():
+            continue
+
+        body.append(line)
+
+    return header, "\n".join(body)
+
+
+def _group_header(source: str | None, page: str | None, fields: dict[str, str]) -> str:
+    name = Path(source).name if source else "Unknown source"
+    if fields.get("sheet"):
+        location = f"Sheet: {fields['sheet']}"
+    else:
+        location = f"Page {page if page is not None else 'N/A'}"
+
+    lines = [f"Source: {name} ({location})"]
+    if fields.get("document type"):
+        lines.append(f"Document Type: {fields['document type']}")
+    return "\n".join(lines)
+
+
+def pack_context(chunks: list[dict], token_budget: int = CONTEXT_TOKEN_BUDGET) -> PackedContext:
+    """Pack retrieved chunks into a compact, token-budgeted context string.
+
+    Chunks are taken greedily by score. Chunks from the same source and
+    sheet/page share one header, and chunks that don't fit the remaining
+    budget are skipped (a smaller, lower-ranked one may still fit).
+    """
+
+    if not chunks:
+        return PackedContext(text="", token_count=0, chunk_count=0)
+
+    # group key -> (header, [bodies]); dict keeps the order groups were opened,
+    # which is best-score-first because we iterate by score.
+    groups: dict[tuple, tuple[str, list[str]]] = {}
+    used = 0
+    packed = 0
+
+    for chunk in sorted(chunks, key=lambda c: c.get("score", 0.0), reverse=True):
+        fields, body = _split_chunk(chunk.get("text", ""))
+        if not body:
+            continue
+
+        key = (chunk.get("source"), fields.get("sheet") or chunk.get("page"))
+        is_new_group = key not in groups
+        header = _group_header(chunk.get("source"), chunk.get("page"), fields) if is_new_group else ""
+
+        # +2 for the blank-line separators between entries / groups.
+        cost = count_tokens(body) + 2 + (count_tokens(header) if is_new_group else 0)
+        if used + cost > token_budget:
+            if packed:
+                continue
+            # Never return an empty context because the best chunk alone is
+            # too large: keep as much of it as fits.
+            body = _truncate_to_tokens(body, token_budget - count_tokens(header) - 2)
+            if not body:
+                continue
+            cost = token_budget
+
+        if is_new_group:
+            groups[key] = (header, [])
+        groups[key][1].append(body)
+        used += cost
+        packed += 1
+
+    text = "\n\n".join(
+        header + "\n\n" + "\n\n".join(bodies) for header, bodies in groups.values()
+    )
+    return PackedContext(text=text, token_count=count_tokens(text), chunk_count=packed)
@@ -0,0 +1,126 @@
+"""
+Local content-addressed store for chunk texts.
+
+With the texts in the vector metadata every query returns them for all
+top-k matches of every namespace, and long SOP sections hit Pinecone's
+metadata size limit. Ingestion instead writes each text once into a sqlite
+file (DOCSTORE_PATH) keyed by its hash, and the vector keeps only
+`text_hash` next to the small filterable fields. The retriever hydrates
+the texts of the final few chunks in one lookup.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Iterable, Optional
+
+from backend.config import DOCSTORE_PATH
+
+logger = logging.getLogger(__name__)
+
+# Hex digits of the sha256 kept as the key (128 bits).
+HASH_CHARS = 32
+# Read-only connections map the file instead of copying pages into a
+# per-connection cache, so worker processes share it through the page cache.
+READ_MMAP_BYTES = 1 << 30
+
+
+class DocstoreMissing(RuntimeError):
+    """Slim vectors came back but there is no docstore to read their texts from."""
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:HASH_CHARS]
+
+
+class DocStore:
+    """sqlite file of `hash -> text`. Writes are idempotent; reads use one connection per thread."""
+
+    def __init__(self, path: str | Path, *, readonly: bool = False):
+        self.path = Path(path)
+        self.readonly = readonly
+        self._local = threading.local()
+        if not readonly:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self._connect() as conn:
+                conn.execute("CREATE TABLE IF NOT EXISTS chunks (hash TEXT PRIMARY KEY, text TEXT NOT NULL) WITHOUT ROWID")
+
+    def _connect(self) -> sqlite3.Connection:
+        if self.readonly:
+            conn = sqlite3.connect(f"file:{self.path.as_posix()}?mode=ro", uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size={READ_MMAP_BYTES}")
+            return conn
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def put_many(self, texts: Iterable[str]) -> list[str]:
+        """Store `texts` and return their hashes, in order."""
+        rows = [(text_hash(t), t) for t in texts]
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR IGNORE INTO chunks (hash, text) VALUES (?, ?)", rows)
+        return [h for h, _ in rows]
+
+    def get_many(self, hashes: Iterable[str]) -> dict[str, str]:
+        """Texts for the `hashes` that are in the store."""
+        keys = list(dict.fromkeys(hashes))
+        if not keys:
+            return {}
+        cur = self._conn().execute(
+            f"SELECT hash, text FROM chunks WHERE hash IN ({','.join('?' * len(keys))})", keys
+        )
+        return dict(cur.fetchall())
+
+
+class SlimIndex:
+    """
+    Index proxy that moves each upserted vector's `text` metadata into a
+    DocStore and stores its `text_hash` instead. Everything else goes to
+    the wrapped index unchanged.
+    """
+
+    def __init__(self, index, docstore: DocStore):
+        self._index = index
+        self._docstore = docstore
+
+    def upsert(self, vectors: list, namespace: str = "", **kwargs):
+        from backend.rag.local_index import unpack_vector  # numpy: ingestion only
+
+        unpacked = [unpack_vector(v) for v in vectors]
+        hashes = iter(self._docstore.put_many(md["text"] for _, _, md in unpacked if md.get("text")))
+        slim = []
+        for vid, values, metadata in unpacked:
+            if metadata.get("text"):
+                metadata = {k: v for k, v in metadata.items() if k != "text"}
+                metadata["text_hash"] = next(hashes)
+            slim.append((vid, values, metadata))
+        return self._index.upsert(vectors=slim, namespace=namespace, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+
+_docstore: Optional[DocStore] = None
+_docstore_lock = threading.Lock()
+
+
+def get_docstore() -> Optional[DocStore]:
+    """
+    Read-only docstore at DOCSTORE_PATH, or None when there is none (yet:
+    a missing file is looked for again on the next call).
+    """
+    global _docstore
+    if _docstore is None and DOCSTORE_PATH and Path(DOCSTORE_PATH).exists():
+        with _docstore_lock:
+            if _docstore is None:
+                _docstore = DocStore(DOCSTORE_PATH, readonly=True)
+    return _docstore
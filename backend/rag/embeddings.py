@@ -50,21 +50,18 @@
 
 
 from typing import List
-from openai import OpenAI
 
-from backend.config import (
-    OPENAI_API_KEY,
-    EMBEDDING_MODEL,
-)
+from backend.config import EMBEDDING_MODEL
+from backend.utils.http_clients import call_within_deadline, get_openai_client
 
-# OpenAI client (NO base_url override)
-client = OpenAI(api_key=OPENAI_API_KEY)
 
-
-def embed_texts(texts: List[str]) -> List[List[float]]:
+def embed_texts(texts: List[str], timeout: float | None = None) -> List[List[float]]:
     """
     Convert a list of texts into embedding vectors using OpenAI embeddings.
     Returns one 1536-dim vector per input text.
+
+    With `timeout` (the stage cap), the call is fitted into the request
+    deadline and a timeout raises StageTimeout("embedding").
     """
 
     if not texts:
@@ -74,9 +71,17 @@ def embed_texts(texts: List[str]) -> List[List[float]]:
     if not clean_texts:
         return []
 
-    response = client.embeddings.create(
-        model=EMBEDDING_MODEL,
-        input=clean_texts
-    )
+    client = get_openai_client()
+    if timeout is None:
+        response = client.embeddings.create(model=EMBEDDING_MODEL, input=clean_texts)
+    else:
+        response = call_within_deadline(
+            "embedding",
+            timeout,
+            lambda t: client.with_options(timeout=t, max_retries=0).embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=clean_texts
+            ),
+        )
 
     return [item.embedding for item in response.data]
\ No newline at end of file
@@ -223,6 +223,7 @@ def ingest_common_keyword_locators(
 	*,
 	namespace: str | None = None,
 	batch_size: int = 64,
+	index=None,
 ) -> int:
 	"""Reads the cleaned locators xlsx and upserts vectors to Pinecone.
 
@@ -239,7 +240,7 @@ def ingest_common_keyword_locators(
 	if not chunks:
 		return 0
 
-	index = get_index()
+	index = index if index is not None else get_index()
 	upserted = 0
 	chunk_texts = [c.text for c in chunks]
 
@@ -70,6 +70,7 @@ def ingest_pr_review(
 	*,
 	namespace: str | None = None,
 	batch_size: int = 64,
+	index=None,
 ) -> int:
 	"""Reads the PR review checklist docx and upserts vectors to Pinecone."""
 
@@ -80,7 +81,7 @@ def ingest_pr_review(
 	if not chunks:
 		return 0
 
-	index = get_index()
+	index = index if index is not None else get_index()
 	upserted = 0
 	chunk_texts = [c.text for c in chunks]
 
@@ -112,6 +112,7 @@ def ingest_sop(
     *,
     namespace: str | None = None,
     batch_size: int = 64,
+    index=None,
 ) -> int:
     from backend.rag.embeddings import embed_texts
     from backend.rag.pinecone_client import get_index
@@ -120,7 +121,7 @@ def ingest_sop(
     if not chunks:
         return 0
 
-    index = get_index()
+    index = index if index is not None else get_index()
     upserted = 0
 
     for start in range(0, len(chunks), batch_size):
@@ -208,6 +208,7 @@ def ingest_validation_checklist(
 	*,
 	namespace: str | None = None,
 	batch_size: int = 64,
+	index=None,
 ) -> int:
 	"""Reads the validation checklist xlsx and upserts vectors to Pinecone.
 
@@ -224,7 +225,7 @@ def ingest_validation_checklist(
 	if not chunks:
 		return 0
 
-	index = get_index()
+	index = index if index is not None else get_index()
 	upserted = 0
 	chunk_texts = [c.text for c in chunks]
 
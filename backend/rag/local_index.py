@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+
+import numpy as np
+
+
+@dataclass
+class LocalMatch:
+    """Same shape as a Pinecone query match (`id`, `score`, `metadata`)."""
+
+    id: str
+    score: float
+    metadata: Optional[dict] = None
+    values: list[float] = field(default_factory=list)
+
+
+@dataclass
+class LocalQueryResult:
+    matches: list[LocalMatch]
+    namespace: str = ""
+
+
+@dataclass
+class LocalVector:
+    """Same shape as a Pinecone fetched vector / list item (`id`, `values`, `metadata`)."""
+
+    id: str
+    values: list[float] = field(default_factory=list)
+    metadata: Optional[dict] = None
+
+
+@dataclass
+class LocalListPage:
+    vectors: list[LocalVector]
+    namespace: str = ""
+
+
+@dataclass
+class LocalFetchResult:
+    vectors: dict[str, LocalVector]
+    namespace: str = ""
+
+
+def unpack_vector(vector: Any) -> tuple[str, list[float], dict]:
+    """Accept Pinecone's tuple `(id, values[, metadata])` or dict vector formats."""
+    if isinstance(vector, dict):
+        return str(vector["id"]), vector["values"], dict(vector.get("metadata") or {})
+    if len(vector) == 2:
+        return str(vector[0]), vector[1], {}
+    return str(vector[0]), vector[1], dict(vector[2] or {})
+
+
+def matches_filter(metadata: dict, flt: Optional[dict]) -> bool:
+    """Evaluate the subset of Pinecone's metadata filter language we use.
+
+    Supports `{"field": value}`, `$eq`, `$ne`, `$in`, `$nin`, `$and`, `$or`.
+    """
+
+    if not flt:
+        return True
+
+    for key, cond in flt.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, c) for c in cond):
+                return False
+            continue
+        if key == "$or":
+            if not any(matches_filter(metadata, c) for c in cond):
+                return False
+            continue
+
+        value = metadata.get(key)
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+        for op, expected in cond.items():
+            if op == "$eq" and value != expected:
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and value not in expected:
+                return False
+            if op == "$nin" and value in expected:
+                return False
+
+    return True
+
+
+class _Namespace:
+    def __init__(self):
+        self.ids: list[str] = []
+        self.positions: dict[str, int] = {}
+        self.metadata: list[dict] = []
+        self.rows: list[np.ndarray] = []
+        self._matrix: Optional[np.ndarray] = None
+
+    def upsert(self, vid: str, values: Iterable[float], metadata: dict) -> None:
+        vec = np.asarray(values, dtype=np.float32)
+        norm = float(np.linalg.norm(vec))
+        if norm > 0:
+            vec = vec / norm
+
+        pos = self.positions.get(vid)
+        if pos is None:
+            self.positions[vid] = len(self.ids)
+            self.ids.append(vid)
+            self.metadata.append(metadata)
+            self.rows.append(vec)
+        else:
+            self.metadata[pos] = metadata
+            self.rows[pos] = vec
+        self._matrix = None
+
+    def matrix(self) -> np.ndarray:
+        if self._matrix is None:
+            self._matrix = np.vstack(self.rows) if self.rows else np.zeros((0, 0), dtype=np.float32)
+        return self._matrix
+
+
+class InMemoryIndex:
+    """In-process vector index exposing the Pinecone `Index` methods we use.
+
+    Vectors are L2-normalized on upsert, so a dot product is the cosine score
+    (same metric as the Pinecone index). Used for offline benchmarks, evals
+    and local development (`VECTOR_STORE=memory`).
+    """
+
+    def __init__(self):
+        self._namespaces: dict[str, _Namespace] = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors: list, namespace: str = "", **kwargs) -> dict:
+        with self._lock:
+            ns = self._namespaces.setdefault(namespace or "", _Namespace())
+            for vector in vectors:
+                vid, values, metadata = unpack_vector(vector)
+                ns.upsert(vid, values, metadata)
+        return {"upserted_count": len(vectors)}
+
+    def query(
+        self,
+        vector: list[float],
+        top_k: int = 10,
+        namespace: str = "",
+        filter: Optional[dict] = None,
+        include_metadata: bool = False,
+        include_values: bool = False,
+        **kwargs,
+    ) -> LocalQueryResult:
+        with self._lock:
+            ns = self._namespaces.get(namespace or "")
+            if ns is None or not ns.ids:
+                return LocalQueryResult(matches=[], namespace=namespace)
+            matrix = ns.matrix()
+            ids = list(ns.ids)
+            metadata = list(ns.metadata)
+
+        q = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if norm > 0:
+            q = q / norm
+        scores = matrix @ q
+
+        if filter:
+            allowed = np.array([matches_filter(md, filter) for md in metadata], dtype=bool)
+            scores = np.where(allowed, scores, -np.inf)
+
+        k = min(top_k, len(ids))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(ids) else np.arange(len(ids))
+        top = top[np.argsort(-scores[top])]
+
+        matches = [
+            LocalMatch(
+                id=ids[i],
+                score=float(scores[i]),
+                metadata=dict(metadata[i]) if include_metadata else None,
+                values=matrix[i].tolist() if include_values else [],
+            )
+            for i in top
+            if np.isfinite(scores[i])
+        ]
+        return LocalQueryResult(matches=matches, namespace=namespace)
+
+    def list(self, prefix: Optional[str] = None, limit: Optional[int] = None, namespace: str = "", **kwargs):
+        """Yield pages of vector IDs, like Pinecone's `Index.list`."""
+        with self._lock:
+            ns = self._namespaces.get(namespace or "")
+            ids = [vid for vid in (ns.ids if ns else []) if vid.startswith(prefix or "")]
+        limit = limit or 100
+        for start in range(0, len(ids), limit):
+            yield LocalListPage(vectors=[LocalVector(id=vid) for vid in ids[start : start + limit]], namespace=namespace)
+
+    def fetch(self, ids: list[str], namespace: str = "", **kwargs) -> LocalFetchResult:
+        with self._lock:
+            ns = self._namespaces.get(namespace or "")
+            found = {}
+            for vid in ids:
+                pos = ns.positions.get(vid) if ns else None
+                if pos is not None:
+                    found[vid] = LocalVector(id=vid, values=ns.rows[pos].tolist(), metadata=dict(ns.metadata[pos]))
+        return LocalFetchResult(vectors=found, namespace=namespace)
+
+    def delete(self, ids: Optional[list[str]] = None, delete_all: bool = False, namespace: str = "", **kwargs) -> dict:
+        with self._lock:
+            if delete_all:
+                self._namespaces.pop(namespace or "", None)
+                return {}
+            ns = self._namespaces.get(namespace or "")
+            if ns is None or not ids:
+                return {}
+            drop = set(ids)
+            fresh = _Namespace()
+            for vid, md, row in zip(ns.ids, ns.metadata, ns.rows):
+                if vid not in drop:
+                    fresh.upsert(vid, row, md)
+            self._namespaces[namespace or ""] = fresh
+        return {}
+
+    def describe_index_stats(self, **kwargs) -> dict:
+        with self._lock:
+            namespaces = {name: {"vector_count": len(ns.ids)} for name, ns in self._namespaces.items()}
+        return {
+            "namespaces": namespaces,
+            "total_vector_count": sum(n["vector_count"] for n in namespaces.values()),
+        }
@@ -0,0 +1,503 @@
+"""
+Versioned namespaces, for blue/green re-ingestion.
+
+Ingestion writes each logical namespace ("sop") into a fresh version
+("sop@v42") that no query reads yet, and once every namespace of the run is
+complete, switches them all in a single write of the registry:
+
+    {"revision": 7, "serial": 19,
+     "active": {"sop": "sop@v42", "locators": "locators@v3"},
+     "latest": {"sop": 42, "locators": 3},
+     "retired": {"sop@v41": 1760000000.0}}
+
+With NAMESPACE_REGISTRY=index (the default) the registry is one record in
+the vector index itself (namespace REGISTRY_NAMESPACE), so every server
+reading the index sees a switch, with nothing to ship or redeploy. A copy
+is kept next to the snapshot, which is also where the registry lives with
+VECTOR_STORE=snapshot. NAMESPACE_REGISTRY can also name a local file.
+
+The retriever resolves each logical namespace to its active version.
+Namespaces the registry doesn't know are queried as they are, so an index
+ingested in place keeps working until its first versioned ingestion. A
+request resolves every namespace with the registry as it was at its first
+lookup, so one that spans a switch never mixes old and new versions.
+
+A switch retires the versions it replaces. They are deleted from the index
+once they have been retired for NAMESPACE_RETIRE_GRACE_S: processes that
+haven't reloaded the registry yet still query them, and until then a
+switch back (scripts/namespaces.py activate) is instant. The unversioned
+namespaces of an index ingested in place are never retired by a switch;
+`scripts/namespaces.py retire` does that once the new versions are in use.
+Every switch bumps `revision`, which is part of the index version cached
+answers are keyed on.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Optional
+
+from backend.config import (
+    EMBEDDING_DIMENSION,
+    INDEX_SNAPSHOT_DIR,
+    NAMESPACE_REGISTRY,
+    NAMESPACE_REGISTRY_RELOAD_S,
+    VECTOR_STORE,
+)
+from backend.utils import retrieval_context
+
+logger = logging.getLogger(__name__)
+
+VERSION_SEP = "@v"
+# Where the registry record lives in the index, and its copy next to the snapshot.
+REGISTRY_NAMESPACE = "__namespace_registry__"
+REGISTRY_ID = "registry"
+REGISTRY_FILE_NAME = "namespaces.json"
+
+# A lock file older than this was left by a crashed writer (updates take milliseconds).
+_STALE_LOCK_S = 30.0
+
+
+def versioned(namespace: str, version: int) -> str:
+    return f"{namespace}{VERSION_SEP}{version}"
+
+
+def logical_namespace(namespace: str) -> str:
+    """"sop@v42" -> "sop" (unversioned names are returned as they are)."""
+    return namespace.split(VERSION_SEP, 1)[0]
+
+
+def is_versioned(namespace: str) -> bool:
+    return namespace != logical_namespace(namespace)
+
+
+# -------------------------------------------------
+# STORAGE
+# -------------------------------------------------
+def _empty() -> dict:
+    return {"revision": 0, "serial": 0, "active": {}, "latest": {}, "retired": {}}
+
+
+def load_registry(path: str | Path) -> dict:
+    """Contents of a registry file, or an empty registry when there is no file."""
+    try:
+        return {**_empty(), **json.loads(Path(path).read_text(encoding="utf-8"))}
+    except FileNotFoundError:
+        return _empty()
+
+
+def _write_registry(path: Path, registry: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(registry, indent=1, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _file_id(path: Path) -> Optional[tuple[int, int]]:
+    # Every write replaces the file, so the inode changes even within one mtime tick.
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns
+
+
+@contextmanager
+def _locked(path: Path, timeout_s: float = 10.0):
+    """
+    Exclusive lock for a read-modify-write of the registry, held by creating
+    `<path>.lock`, so ingestions running in parallel don't overwrite each
+    other's switches.
+    """
+    lock = path.with_name(path.name + ".lock")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    deadline = time.monotonic() + timeout_s
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.stat(lock).st_mtime > _STALE_LOCK_S:
+                    logger.warning("Removing stale namespace registry lock %s", lock)
+                    os.remove(lock)
+                    continue
+            except FileNotFoundError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Namespace registry {path} is locked ({lock})")
+            time.sleep(0.05)
+    try:
+        os.close(fd)
+        yield
+    finally:
+        os.remove(lock)
+
+
+class FileStore:
+    """Registry in a local JSON file."""
+
+    # Cheap to check: serving processes reload it inline.
+    remote = False
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+
+    def changed_since(self, token) -> tuple[bool, object]:
+        current = _file_id(self.path)
+        return current != token, current
+
+    def read(self) -> dict:
+        return load_registry(self.path)
+
+    def read_local(self) -> Optional[dict]:
+        return self.read()
+
+    def write(self, registry: dict) -> None:
+        _write_registry(self.path, registry)
+
+    def lock(self):
+        return _locked(self.path)
+
+    def __str__(self) -> str:
+        return str(self.path)
+
+
+class IndexStore:
+    """
+    Registry as a single record of the vector index, readable by every
+    server using the index. Writes also refresh `copy` (next to the
+    snapshot), which is read while the index can't be.
+    """
+
+    # A network round trip: serving processes reload it in the background.
+    remote = True
+
+    def __init__(self, get_index, dimension: int = EMBEDDING_DIMENSION, copy: Optional[str | Path] = None):
+        self._get_index = get_index
+        self.dimension = dimension
+        self.copy = Path(copy) if copy else None
+
+    def changed_since(self, token) -> tuple[bool, object]:
+        return True, None  # no cheap change check: read it every reload
+
+    def read(self) -> dict:
+        try:
+            res = self._get_index().fetch(ids=[REGISTRY_ID], namespace=REGISTRY_NAMESPACE)
+        except Exception:
+            if self.copy is None or not self.copy.exists():
+                raise
+            logger.warning("Namespace registry unreadable from the index; using %s", self.copy)
+            return load_registry(self.copy)
+        record = (getattr(res, "vectors", None) or {}).get(REGISTRY_ID)
+        if record is None:
+            return _empty()
+        return {**_empty(), **json.loads(record.metadata["registry"])}
+
+    def read_local(self) -> Optional[dict]:
+        """The copy, to start from before the index has been read (None when there is none)."""
+        return load_registry(self.copy) if self.copy is not None and self.copy.exists() else None
+
+    def write(self, registry: dict) -> None:
+        # Pinecone rejects all-zero vectors; the values are never queried.
+        values = [1.0] + [0.0] * (self.dimension - 1)
+        metadata = {"registry": json.dumps(registry, sort_keys=True)}
+        self._get_index().upsert(vectors=[(REGISTRY_ID, values, metadata)], namespace=REGISTRY_NAMESPACE)
+        if self.copy is not None and self.copy.parent.is_dir():
+            _write_registry(self.copy, registry)
+
+    def lock(self):
+        # Serializes the ingestions running on this host.
+        return _locked(Path(tempfile.gettempdir()) / "ika_namespace_registry")
+
+    def __str__(self) -> str:
+        return f"index namespace {REGISTRY_NAMESPACE}"
+
+
+# -------------------------------------------------
+# REGISTRY
+# -------------------------------------------------
+class NamespaceRegistry:
+    """
+    The registry, reloaded when it changes (checked at most every `reload_s`).
+    A remote store (the index) is reloaded on a background thread, so a
+    request never waits on it: it resolves with the state last loaded,
+    starting from the store's local copy.
+    """
+
+    def __init__(self, store: FileStore | IndexStore | str | Path, reload_s: float = NAMESPACE_REGISTRY_RELOAD_S):
+        self.store = store if isinstance(store, (FileStore, IndexStore)) else FileStore(store)
+        self.reload_s = reload_s
+        self._lock = threading.Lock()
+        self._token: object = None  # change token of what was loaded (file inode/mtime)
+        self._loaded = False
+        self._checked_at = float("-inf")
+        self._refreshing = False
+        self._registry = _empty()
+
+    def _current(self) -> dict:
+        if not self._loaded:
+            self._load_first()
+        elif time.monotonic() - self._checked_at >= self.reload_s:
+            if self.store.remote:
+                self._reload_in_background()
+            else:
+                self._maybe_reload()
+        return self._registry
+
+    def _load_first(self) -> None:
+        if self.store.remote:
+            local = self.store.read_local()
+            if local is not None:
+                with self._lock:
+                    if not self._loaded:
+                        self._registry, self._loaded = local, True
+                self._reload_in_background()
+                return
+        # Nothing local to start from: the first lookup has to wait
+        # (the start-up preload makes it, not a request).
+        self._maybe_reload()
+
+    def _reload_in_background(self) -> None:
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+            self._checked_at = time.monotonic()
+
+        def reload() -> None:
+            try:
+                self._maybe_reload()
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=reload, name="namespace-registry", daemon=True).start()
+
+    def refresh(self) -> None:
+        """Reload from the store now (scripts, which must not act on a stale copy)."""
+        with self._lock:
+            self._checked_at = float("-inf")
+            self._token = None
+        self._maybe_reload()
+
+    def _maybe_reload(self) -> None:
+        with self._lock:
+            self._checked_at = time.monotonic()
+            changed, token = self.store.changed_since(self._token)
+            if self._loaded and not changed:
+                return
+        # Outside the lock: lookups go on with the current state meanwhile.
+        try:
+            registry = self.store.read()
+        except Exception as exc:
+            # Keep resolving with the last good registry (a remote store is
+            # retried in the background from now on, not by every lookup).
+            logger.error("Namespace registry reload from %s failed: %s", self.store, exc)
+            self._loaded = self._loaded or self.store.remote
+            return
+        with self._lock:
+            self._token, self._loaded = token, True
+            if registry != self._registry:
+                self._registry = registry
+                logger.info("Namespace registry revision %d: %s", registry["revision"], registry["active"])
+
+    @contextmanager
+    def _update(self):
+        """Read the registry, let the caller change it, write it back and serve it right away."""
+        with self.store.lock():
+            registry = self.store.read()
+            # A store that is only eventually consistent (the index) may not
+            # return our own last write yet.
+            if self._registry["serial"] > registry["serial"]:
+                registry = json.loads(json.dumps(self._registry))
+            yield registry
+            registry["serial"] += 1
+            self.store.write(registry)
+        with self._lock:
+            self._registry = registry
+            self._token = self.store.changed_since(None)[1]
+            self._loaded = True
+            self._checked_at = time.monotonic()
+
+    def state(self) -> dict:
+        """The registry contents (never modified in place: updates replace them)."""
+        return self._current()
+
+    def resolve(self, namespace: str) -> str:
+        return self._current()["active"].get(namespace, namespace)
+
+    @property
+    def revision(self) -> int:
+        return self._current()["revision"]
+
+    def active(self) -> dict[str, str]:
+        return dict(self._current()["active"])
+
+    def retired(self) -> dict[str, float]:
+        return dict(self._current()["retired"])
+
+    def stage(self, namespaces: Iterable[str]) -> dict[str, str]:
+        """Reserve a new version of each namespace to ingest into: logical -> versioned."""
+        staged = {}
+        with self._update() as registry:
+            for ns in namespaces:
+                registry["latest"][ns] = registry["latest"].get(ns, 0) + 1
+                staged[ns] = versioned(ns, registry["latest"][ns])
+        return staged
+
+    def activate(self, versions: dict[str, str]) -> dict[str, str]:
+        """
+        Switch each logical namespace to its version in `versions`, all in one
+        write, and retire the versions they replace. Returns logical ->
+        replaced version. An unversioned namespace being replaced for the
+        first time is left alone: a server that doesn't see the registry
+        still reads it.
+        """
+        replaced = {}
+        now = round(time.time(), 3)
+        with self._update() as registry:
+            for ns, version in versions.items():
+                previous = registry["active"].get(ns)
+                registry["active"][ns] = version
+                registry["retired"].pop(version, None)  # switching back to a retired version
+                if previous is not None and previous != version:
+                    registry["retired"][previous] = now
+                    replaced[ns] = previous
+            registry["revision"] += 1
+        return replaced
+
+    def retire(self, namespaces: Iterable[str]) -> None:
+        """
+        Mark namespaces for deletion: versions that will never be switched to
+        (e.g. of a failed ingestion), or on request an unversioned namespace
+        the registry has replaced.
+        """
+        now = round(time.time(), 3)
+        with self._update() as registry:
+            active = set(registry["active"].values())
+            for ns in namespaces:
+                if ns not in active:
+                    registry["retired"][ns] = now
+
+    def expired(self, grace_s: float) -> list[str]:
+        """Versions retired at least `grace_s` ago, i.e. safe to delete."""
+        cutoff = time.time() - grace_s
+        return sorted(ns for ns, at in self._current()["retired"].items() if at <= cutoff)
+
+    def forget(self, namespaces: Iterable[str]) -> None:
+        """Drop deleted versions from the registry."""
+        with self._update() as registry:
+            for ns in namespaces:
+                registry["retired"].pop(ns, None)
+
+
+def _default_store() -> FileStore | IndexStore:
+    snapshot_copy = Path(INDEX_SNAPSHOT_DIR) / REGISTRY_FILE_NAME if INDEX_SNAPSHOT_DIR else None
+    if NAMESPACE_REGISTRY != "index":
+        return FileStore(NAMESPACE_REGISTRY)
+    if VECTOR_STORE == "snapshot":
+        # The snapshot is the index: the registry ships inside it.
+        return FileStore(snapshot_copy or REGISTRY_FILE_NAME)
+    from backend.rag.pinecone_client import get_index
+
+    return IndexStore(get_index, copy=snapshot_copy)
+
+
+_registry: Optional[NamespaceRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_namespace_registry() -> Optional[NamespaceRegistry]:
+    """The process-wide namespace registry, or None when NAMESPACE_REGISTRY is empty."""
+    global _registry
+    if _registry is None and NAMESPACE_REGISTRY:
+        with _registry_lock:
+            if _registry is None:
+                _registry = NamespaceRegistry(_default_store())
+    return _registry
+
+
+def _request_state() -> Optional[dict]:
+    """Registry state for the current request: pinned at its first lookup."""
+    registry = get_namespace_registry()
+    if registry is None:
+        return None
+    state = retrieval_context.get_namespace_registry()
+    if state is None:
+        state = registry.state()
+        retrieval_context.set_namespace_registry(state)
+    return state
+
+
+def resolve_namespace(namespace: str) -> str:
+    """Version of `namespace` queries should read."""
+    state = _request_state()
+    return state["active"].get(namespace, namespace) if state is not None else namespace
+
+
+def registry_revision() -> int:
+    state = _request_state()
+    return state["revision"] if state is not None else 0
+
+
+# -------------------------------------------------
+# INGESTION
+# -------------------------------------------------
+class VersionedIndex:
+    """
+    Index wrapper that sends upserts for a logical namespace to its staged
+    version, so ingestion code keeps using the logical names, and counts
+    them per logical namespace. Everything else goes to the wrapped index.
+    """
+
+    def __init__(self, index, versions: dict[str, str]):
+        self._index = index
+        self.versions = versions
+        self.upserted: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def upsert(self, vectors: list, namespace: str = "", **kwargs):
+        result = self._index.upsert(vectors=vectors, namespace=self.versions.get(namespace, namespace), **kwargs)
+        with self._lock:
+            self.upserted[namespace] = self.upserted.get(namespace, 0) + len(vectors)
+        return result
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+
+def delete_versions(index, namespaces: Iterable[str]) -> list[str]:
+    """
+    Delete every vector of `namespaces` from `index`. Returns the namespaces
+    that are gone (including ones the index never had); failures are logged
+    and left for the next cleanup.
+    """
+    present = set(index.describe_index_stats().get("namespaces", {}))
+    gone = []
+    for ns in namespaces:
+        if ns in present:
+            try:
+                index.delete(delete_all=True, namespace=ns)
+            except Exception as exc:
+                logger.error("Could not delete namespace %s: %s", ns, exc)
+                continue
+            logger.info("Deleted retired namespace %s", ns)
+        gone.append(ns)
+    return gone
+
+
+def cleanup_retired(index, registry: NamespaceRegistry, grace_s: float) -> list[str]:
+    """Delete the versions retired at least `grace_s` ago from `index` and the registry."""
+    expired = registry.expired(grace_s)
+    if not expired:
+        return []
+    gone = delete_versions(index, expired)
+    registry.forget(gone)
+    return gone
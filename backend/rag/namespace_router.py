@@ -1,25 +1,24 @@
-def pick_namespaces(query: str, all_namespaces: list[str]) -> list[str]:
-    q = query.lower()
-
-    selected = set()
-
-    if any(k in q for k in ["spotline", "company", "about", "overview"]):
-        selected.add("company_profile")
+# Keywords that point a query at a namespace.
+ROUTES = {
+    "company_profile": ["spotline", "company", "about", "overview"],
+    "pr_review": ["pr", "pull request", "review"],
+    "sop": ["sop", "onboarding", "procedure", "guideline"],
+    "validation": ["validation", "checklist", "rules"],
+    "locators": ["locator", "xpath", "selector", "ui"],
+}
 
-    if any(k in q for k in ["pr", "pull request", "review"]):
-        selected.add("pr_review")
 
-    if any(k in q for k in ["sop", "onboarding", "procedure", "guideline"]):
-        selected.add("sop")
-
-    if any(k in q for k in ["validation", "checklist", "rules"]):
-        selected.add("validation")
+def pick_namespaces(query: str, all_namespaces: list[str]) -> list[str]:
+    q = query.lower()
 
-    if any(k in q for k in ["locator", "xpath", "selector", "ui"]):
-        selected.add("locators")
+    hits = {ns: sum(1 for k in ROUTES.get(ns, []) if k in q) for ns in all_namespaces}
+    selected = [ns for ns in all_namespaces if hits[ns]]
 
     # Fallback: search everything
     if not selected:
         return all_namespaces
 
-    return list(selected)
\ No newline at end of file
+    # Most keyword hits first, so the namespace most likely to hold the
+    # answer is searched first; ties keep the configured order, so results
+    # (and degraded partial searches) are deterministic.
+    return sorted(selected, key=lambda ns: -hits[ns])
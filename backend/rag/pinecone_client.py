@@ -1,34 +1,66 @@
 from __future__ import annotations
-from backend.config import *
-import os, time
+import logging
+import time
 from functools import lru_cache
-from typing import Optional
-
-from pinecone import Pinecone, ServerlessSpec
 
 from backend.config import (
     PINECONE_API_KEY,
     PINECONE_ENV,
     PINECONE_INDEX,
-    EMBEDDING_DIMENSION
+    PINECONE_HOST,
+    EMBEDDING_DIMENSION,
+    HTTP_POOL_MAX_CONNECTIONS,
+    HTTP_READ_TIMEOUT_S,
+    INDEX_SNAPSHOT_DIR,
+    SNAPSHOT_RELOAD_S,
+    VECTOR_BREAKER_FAILURE_RATE,
+    VECTOR_BREAKER_MIN_CALLS,
+    VECTOR_BREAKER_PROBE_S,
+    VECTOR_BREAKER_WINDOW,
+    VECTOR_QUERY_TIMEOUT_S,
+    VECTOR_SLOW_QUERY_S,
+    VECTOR_STORE,
 )
 
+logger = logging.getLogger(__name__)
+
 
 @lru_cache(maxsize=1)
-def _get_pinecone_client() -> Pinecone:
+def _get_pinecone_client():
     """
     Create and cache the Pinecone client.
     """
+    from pinecone import Pinecone
+
     if not PINECONE_API_KEY:
         raise RuntimeError("PINECONE_API_KEY is not set")
 
-    return Pinecone(api_key=PINECONE_API_KEY)
+    # The SDK owns its HTTP pool; size it like the other provider pools.
+    return Pinecone(
+        api_key=PINECONE_API_KEY,
+        timeout=HTTP_READ_TIMEOUT_S,
+        connection_pool_maxsize=HTTP_POOL_MAX_CONNECTIONS,
+    )
 
 
 @lru_cache(maxsize=1)
 def get_index():
+    if VECTOR_STORE == "memory":
+        from backend.rag.local_index import InMemoryIndex
+
+        return InMemoryIndex()
+    if VECTOR_STORE == "snapshot":
+        return _get_live_snapshot()
+
     pc = _get_pinecone_client()
 
+    # With the host known, skip the control-plane round trips (list / describe)
+    # that otherwise run on every cold start.
+    if PINECONE_HOST:
+        return pc.Index(host=PINECONE_HOST)
+
+    from pinecone import ServerlessSpec
+
     existing_indexes = {idx.name for idx in pc.list_indexes()}
 
     if PINECONE_INDEX not in existing_indexes:
@@ -46,3 +78,44 @@ def get_index():
             time.sleep(1)
 
     return pc.Index(PINECONE_INDEX)
+
+
+@lru_cache(maxsize=1)
+def _get_live_snapshot():
+    from backend.rag.snapshot import LiveSnapshotIndex, current_generation
+
+    if not INDEX_SNAPSHOT_DIR or current_generation(INDEX_SNAPSHOT_DIR) is None:
+        raise RuntimeError(f"VECTOR_STORE=snapshot but there is no index snapshot in {INDEX_SNAPSHOT_DIR!r}")
+    return LiveSnapshotIndex(INDEX_SNAPSHOT_DIR, reload_s=SNAPSHOT_RELOAD_S)
+
+
+@lru_cache(maxsize=1)
+def get_query_index():
+    """
+    Index the retriever queries: Pinecone behind a circuit breaker, with the
+    local snapshot (INDEX_SNAPSHOT_DIR) as fallback. Without a snapshot, or
+    with VECTOR_STORE=memory / snapshot, this is just `get_index()`.
+    """
+    index = get_index()
+    if VECTOR_STORE in ("memory", "snapshot") or not INDEX_SNAPSHOT_DIR:
+        return index
+
+    from backend.rag.snapshot import current_generation
+
+    if current_generation(INDEX_SNAPSHOT_DIR) is None:
+        logger.warning("No index snapshot in %r; Pinecone queries have no fallback", INDEX_SNAPSHOT_DIR)
+        return index
+
+    from backend.rag.resilient_index import ResilientIndex
+    from backend.utils.circuit_breaker import CircuitBreaker
+
+    breaker = CircuitBreaker(
+        "pinecone",
+        window=VECTOR_BREAKER_WINDOW,
+        min_calls=VECTOR_BREAKER_MIN_CALLS,
+        failure_rate=VECTOR_BREAKER_FAILURE_RATE,
+        slow_call_s=VECTOR_SLOW_QUERY_S,
+        probe_interval_s=VECTOR_BREAKER_PROBE_S,
+        probe=index.describe_index_stats,
+    )
+    return ResilientIndex(index, _get_live_snapshot(), breaker, query_timeout_s=VECTOR_QUERY_TIMEOUT_S)
@@ -0,0 +1,219 @@
+"""
+Query analyzer for metadata filter pushdown.
+
+The ingesters store structured fields next to each chunk: the sheet name
+(`page`) plus `locator` / `keyword` for locators and `module` for validation
+rows. At ingestion the distinct values of those fields are collected into a
+vocabulary file (QUERY_VOCAB_FILE):
+
+    {"locators": {"page": ["Common_Locators", ...], "locator": ["${loginBtn}", ...], ...}, ...}
+
+At query time every vocabulary value mentioned in the query becomes a
+metadata filter for its namespace, so the vector search only ranks the
+chunks it can be about:
+
+    "what does ${loginBtn} point to"  ->  {"locators": {"locator": {"$in": ["${loginBtn}"]}}}
+
+Sheet / module names narrow the search (AND); locator / keyword names are
+alternatives (OR) within it.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from backend.config import NAMESPACE_LOCATORS, NAMESPACE_VALIDATION, QUERY_VOCAB_FILE, QUERY_VOCAB_RELOAD_S
+from backend.safety.policy import CompiledPolicy, normalize_phrase
+from backend.utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+# Metadata fields that can be pushed down, per namespace.
+FILTER_FIELDS = {
+    NAMESPACE_LOCATORS: ("page", "locator", "keyword"),
+    NAMESPACE_VALIDATION: ("page", "module"),
+}
+# Fields that narrow the search to a part of the namespace; the others name
+# single entries and are OR-ed.
+SCOPE_FIELDS = ("page", "module")
+
+QUERY_FILTERS_APPLIED = Counter(
+    "ika_query_filters_total",
+    "Metadata filters pushed down to the vector store, by namespace and field.",
+    labels=("namespace", "field"),
+)
+
+# Robot Framework variables: "${loginBtn}" is matched as "loginBtn".
+_VARIABLE = re.compile(r"^[$@&%]\{(.+)\}$")
+# snake_case or camelCase / PascalCase names.
+_IDENTIFIER = re.compile(r"[A-Za-z][A-Za-z0-9]*(?:_[A-Za-z0-9]+)+|[A-Za-z]*[a-z][A-Z][A-Za-z0-9]*")
+
+
+def vocabulary_phrases(value: str) -> list[str]:
+    """
+    Phrases a query can contain to refer to `value`; none when the value is
+    too generic to filter on. Variables count written out ("${logout}"),
+    identifiers ("loginBtn", "Common_Locators") as they are; the matcher
+    treats "_" like a space, so "common locators" finds the latter too.
+    Plain names need at least two words, so "Keywords" doesn't turn every
+    question about keywords into a sheet filter.
+    """
+    text = " ".join(str(value).split())
+    phrases = []
+    m = _VARIABLE.match(text)
+    if m:
+        # Written out in full ("${logout}") it is always specific enough.
+        phrases.append(text)
+        text = m.group(1)
+    if _IDENTIFIER.fullmatch(text):
+        phrases.append(text)
+    elif len(text.split()) >= 2:
+        phrases.append(text)
+    return phrases
+
+
+# -------------------------------------------------
+# VOCABULARY (built at ingestion)
+# -------------------------------------------------
+class VocabularyWriter:
+    """
+    Collects the distinct filterable metadata values of upserted vectors.
+    Has the SnapshotWriter `add` interface, so it plugs into RecordingIndex.
+    """
+
+    def __init__(self, fields: dict[str, tuple[str, ...]] = FILTER_FIELDS):
+        self.fields = fields
+        self._values: dict[str, dict[str, set[str]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, vectors: Iterable, namespace: str = "") -> None:
+        fields = self.fields.get(namespace or "")
+        if not fields:
+            return
+        from backend.rag.local_index import unpack_vector  # numpy: ingestion only
+
+        with self._lock:
+            values = self._values.setdefault(namespace, {f: set() for f in fields})
+            for vector in vectors:
+                _, _, metadata = unpack_vector(vector)
+                for f in fields:
+                    if metadata.get(f):
+                        values[f].add(str(metadata[f]))
+
+    def vocabulary(self) -> dict[str, dict[str, list[str]]]:
+        with self._lock:
+            return {ns: {f: sorted(v) for f, v in fields.items()} for ns, fields in self._values.items()}
+
+    def write(self, path: str | Path) -> dict:
+        """
+        Write the collected namespaces to `path`, keeping namespaces already
+        in the file but not ingested this time. Returns the full vocabulary.
+        """
+        path = Path(path)
+        vocabulary = {}
+        if path.exists():
+            vocabulary = json.loads(path.read_text(encoding="utf-8"))
+        vocabulary.update(self.vocabulary())
+
+        tmp = path.with_name(path.name + ".tmp")
+        tmp.write_text(json.dumps(vocabulary, indent=1, sort_keys=True), encoding="utf-8")
+        os.replace(tmp, path)
+        return vocabulary
+
+
+# -------------------------------------------------
+# ANALYZER
+# -------------------------------------------------
+class QueryAnalyzer:
+    """Turns the vocabulary values mentioned in a query into metadata filters."""
+
+    def __init__(self, vocabulary: dict[str, dict[str, list[str]]]):
+        # namespace -> [(field, matcher, phrase -> stored values)]
+        self._matchers: dict[str, list[tuple[str, CompiledPolicy, dict[str, list[str]]]]] = {}
+        for namespace, fields in vocabulary.items():
+            for field, values in fields.items():
+                phrases: dict[str, list[str]] = {}
+                for value in values:
+                    for phrase in vocabulary_phrases(value):
+                        # Keyed the way the matcher reports them ("Common_Locators" -> "common locators").
+                        phrases.setdefault(normalize_phrase(phrase), []).append(value)
+                if phrases:
+                    matcher = CompiledPolicy({field: list(phrases)})
+                    self._matchers.setdefault(namespace, []).append((field, matcher, phrases))
+
+    def constraints(self, query: str) -> dict[str, dict[str, list[str]]]:
+        """Stored values mentioned in `query`: namespace -> field -> values."""
+        found: dict[str, dict[str, list[str]]] = {}
+        for namespace, matchers in self._matchers.items():
+            for field, matcher, phrases in matchers:
+                values: list[str] = []
+                pos = 0
+                while (m := matcher.search(query, pos)) is not None:
+                    values.extend(v for v in phrases[m.phrase] if v not in values)
+                    pos = m.end
+                if values:
+                    found.setdefault(namespace, {})[field] = values
+        return found
+
+    def filters(self, query: str) -> dict[str, dict]:
+        """Pinecone metadata filter per namespace for `query` (namespaces without constraints are left out)."""
+        filters = {}
+        for namespace, fields in self.constraints(query).items():
+            scope, seen = [], set()
+            for f, v in fields.items():
+                # Validation sheets double as modules: one clause is enough.
+                if f in SCOPE_FIELDS and tuple(v) not in seen:
+                    seen.add(tuple(v))
+                    scope.append({f: {"$in": v}})
+            entries = [{f: {"$in": v}} for f, v in fields.items() if f not in SCOPE_FIELDS]
+            clauses = scope + ([entries[0] if len(entries) == 1 else {"$or": entries}] if entries else [])
+            filters[namespace] = clauses[0] if len(clauses) == 1 else {"$and": clauses}
+            for field in fields:
+                QUERY_FILTERS_APPLIED.inc(namespace=namespace, field=field)
+        return filters
+
+
+def load_vocabulary(path: str | Path) -> dict[str, dict[str, list[str]]]:
+    """Vocabulary written at ingestion, or an empty one when there is none (no filtering)."""
+    try:
+        return json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+
+
+_analyzer = QueryAnalyzer({})
+_vocab_mtime: Optional[float] = None
+_checked_at = float("-inf")
+_analyzer_lock = threading.Lock()
+
+
+def get_query_analyzer() -> QueryAnalyzer:
+    """
+    Analyzer for QUERY_VOCAB_FILE, rebuilt when ingestion rewrites the file
+    (checked at most every QUERY_VOCAB_RELOAD_S).
+    """
+    global _analyzer, _vocab_mtime, _checked_at
+    if not QUERY_VOCAB_FILE or time.monotonic() - _checked_at < QUERY_VOCAB_RELOAD_S:
+        return _analyzer
+    with _analyzer_lock:
+        _checked_at = time.monotonic()
+        try:
+            mtime = os.stat(QUERY_VOCAB_FILE).st_mtime
+        except FileNotFoundError:
+            mtime = None
+        if mtime != _vocab_mtime:
+            try:
+                _analyzer = QueryAnalyzer(load_vocabulary(QUERY_VOCAB_FILE))
+                _vocab_mtime = mtime
+                logger.info("Loaded query vocabulary from %s", QUERY_VOCAB_FILE)
+            except (OSError, ValueError) as exc:
+                # Keep filtering with the vocabulary already loaded.
+                logger.error("Could not load query vocabulary from %s: %s", QUERY_VOCAB_FILE, exc)
+    return _analyzer
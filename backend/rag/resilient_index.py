@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import time
+
+from backend.utils.circuit_breaker import OPEN, CircuitBreaker
+from backend.utils.deadline import stage_timeout
+from backend.utils.metrics import Counter, Gauge
+from backend.utils.tracing import span
+
+VECTOR_FALLBACK = Counter(
+    "ika_vector_fallback_total",
+    "Vector queries served from the local snapshot, by reason (error/open).",
+    labels=("reason",),
+)
+CIRCUIT_OPEN = Gauge(
+    "ika_circuit_open",
+    "1 while a circuit breaker is open, by breaker.",
+    labels=("breaker",),
+)
+
+
+class ResilientIndex:
+    """
+    Sends queries to the primary (Pinecone) index through a circuit breaker
+    and answers from a local snapshot when the primary fails, is too slow,
+    or the circuit is open. Only `query` is wrapped; everything else goes to
+    the primary index.
+    """
+
+    def __init__(self, primary, fallback, breaker: CircuitBreaker, query_timeout_s: float):
+        self.primary = primary
+        self.fallback = fallback
+        self.breaker = breaker
+        self.query_timeout_s = query_timeout_s
+        CIRCUIT_OPEN.set_function(lambda: float(breaker.state == OPEN), breaker=breaker.name)
+
+    def query(self, **kwargs):
+        if not self.breaker.allow():
+            return self._fallback_query("open", kwargs)
+
+        start = time.perf_counter()
+        try:
+            result = self.primary.query(timeout=stage_timeout(self.query_timeout_s), **kwargs)
+        except Exception:
+            self.breaker.record(False, time.perf_counter() - start)
+            return self._fallback_query("error", kwargs)
+
+        self.breaker.record(True, time.perf_counter() - start)
+        return result
+
+    def _fallback_query(self, reason: str, kwargs: dict):
+        VECTOR_FALLBACK.inc(reason=reason)
+        with span("vector_fallback", namespace=kwargs.get("namespace", ""), reason=reason):
+            return self.fallback.query(**kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.primary, name)
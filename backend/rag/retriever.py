@@ -1,40 +1,174 @@
+import logging
+
+from backend.rag.docstore import DocstoreMissing, get_docstore
 from backend.rag.embeddings import embed_texts
-from backend.rag.pinecone_client import get_index
-from backend.config import ALL_NAMESPACES, TOP_K
-from backend.utils.retrieval_context import set_last_retrieved_chunks
+from backend.rag.namespace_registry import resolve_namespace
+from backend.rag.pinecone_client import get_query_index
+from backend.config import (
+    ADAPTIVE_INITIAL_K,
+    ADAPTIVE_TOP_K,
+    ALL_NAMESPACES,
+    DEGRADE_NAMESPACES_BELOW_S,
+    DOCSTORE_PATH,
+    EMBEDDING_TIMEOUT_S,
+    FINAL_CONTEXT_SIZE,
+    QUERY_FILTERS,
+    TOP_K,
+)
+from backend.utils.citation import shingle_hashes
+from backend.utils.deadline import degrade, remaining
+from backend.utils.retrieval_context import get_query_embedding, set_last_retrieved_chunks
 from backend.rag.namespace_router import pick_namespaces
+from backend.rag.query_analyzer import get_query_analyzer
+from backend.utils.tracing import span
 
-index = get_index()
+logger = logging.getLogger(__name__)
 
 MIN_ABSOLUTE_SCORE = 0.45
 RELATIVE_DROP = 0.15  # keep chunks close to best score
 
 
-def retrieve_chunks(query: str) -> list[dict]:
-    q_embed = embed_texts([query])[0]
+def _query_namespace(ns: str, q_embed: list[float], k: int, flt: dict | None = None) -> list[dict]:
+    with span("vector_query", namespace=ns, top_k=k, filtered=flt is not None):
+        res = get_query_index().query(
+            vector=q_embed,
+            top_k=k,
+            include_metadata=True,
+            namespace=resolve_namespace(ns),
+            **({"filter": flt} if flt else {}),
+        )
 
     matches = []
+    for m in getattr(res, "matches", []) or []:
+        md = m.metadata or {}
+        matches.append(
+            {
+                "id": m.id,
+                "score": float(m.score),
+                "text": md.get("text", ""),
+                "text_hash": md.get("text_hash"),
+                "source": md.get("source"),
+                "page": md.get("page"),
+                "namespace": ns,
+            }
+        )
+    return matches
 
-    namespaces = pick_namespaces(query, ALL_NAMESPACES)
-    for ns in namespaces:
-        res = index.query(
-            vector=q_embed,
-            top_k=TOP_K,
-            include_metadata=True,
-            namespace=ns,
+
+def _hydrate(items: list[dict]) -> list[dict]:
+    """
+    Fill in the texts of chunks whose vectors only carry `text_hash` (slim
+    metadata) from the local docstore. Chunks whose text can't be found are
+    dropped: without it they are no use to the LLM. Without a docstore at
+    all, every slim chunk would be: that raises DocstoreMissing instead.
+    """
+    missing = [item["text_hash"] for item in items if not item["text"] and item.get("text_hash")]
+    if not missing:
+        return items
+
+    docstore = get_docstore()
+    if docstore is None:
+        raise DocstoreMissing(
+            f"The index has slim vectors (text_hash only) but there is no docstore at DOCSTORE_PATH={DOCSTORE_PATH!r}"
         )
+    with span("hydrate", chunks=len(missing)):
+        texts = docstore.get_many(missing)
+
+    hydrated = []
+    for item in items:
+        if not item["text"]:
+            item["text"] = texts.get(item.get("text_hash"), "")
+            if not item["text"]:
+                logger.warning("No text for chunk %s (text_hash=%s) in the docstore", item["id"], item.get("text_hash"))
+                continue
+        hydrated.append(item)
+    return hydrated
+
+
+def retrieve_chunks(
+    query: str,
+    *,
+    embedding: list[float] | None = None,
+    top_k: int = TOP_K,
+    min_score: float = MIN_ABSOLUTE_SCORE,
+    relative_drop: float = RELATIVE_DROP,
+    max_results: int = FINAL_CONTEXT_SIZE,
+    use_router: bool = True,
+    adaptive: bool = ADAPTIVE_TOP_K,
+    initial_k: int = ADAPTIVE_INITIAL_K,
+    use_filters: bool = QUERY_FILTERS,
+) -> list[dict]:
+    """
+    Embed the query, search the routed namespaces and return the filtered,
+    deduplicated best chunks.
+
+    With `adaptive`, each namespace is first searched for `initial_k`
+    matches. One is searched again at `top_k` only when its last match could
+    still make the final `max_results` (it passes the score filters and is
+    not beaten by `max_results` better matches already found); otherwise
+    nothing past it would be kept, so it is never fetched.
 
-        for m in getattr(res, "matches", []) or []:
-            md = m.metadata or {}
-            matches.append(
-                {
-                    "score": float(m.score),
-                    "text": md.get("text", ""),
-                    "source": md.get("source"),
-                    "page": md.get("page"),
-                    "namespace": ns,
-                }
-            )
+    With `use_filters`, sheet / module / locator / keyword names in the
+    query are pushed down as metadata filters (see query_analyzer). A
+    namespace whose filtered search has no match above `min_score` is
+    searched again without the filter.
+
+    The keyword arguments default to the production settings; the eval
+    benchmark overrides them for parameter sweeps. Pass `embedding` to skip
+    the embedding call when the query vector is already known (one computed
+    earlier in the request, e.g. for the FAQ lookup, is reused).
+    """
+    if embedding is None:
+        embedding = get_query_embedding(query)
+    if embedding is None:
+        with span("embedding"):
+            embedding = embed_texts([query], timeout=EMBEDDING_TIMEOUT_S)[0]
+    q_embed = embedding
+
+    filters = get_query_analyzer().filters(query) if use_filters else {}
+
+    matches = []
+    searched = []  # (namespace, k, filter, matches)
+    best_score = float("-inf")
+
+    namespaces = pick_namespaces(query, ALL_NAMESPACES) if use_router else list(ALL_NAMESPACES)
+    for i, ns in enumerate(namespaces):
+        # Short on time: answer from the namespaces already searched.
+        if i and remaining() < DEGRADE_NAMESPACES_BELOW_S:
+            degrade("namespaces")
+            break
+
+        k = min(initial_k, top_k) if adaptive else top_k
+        flt = filters.get(ns)
+        found = _query_namespace(ns, q_embed, k, flt)
+        if flt and not any(m["score"] >= min_score for m in found):
+            # The names in the query weren't what it was about.
+            flt = None
+            found = _query_namespace(ns, q_embed, k)
+        if found:
+            best_score = max(best_score, found[0]["score"])
+        searched.append((ns, k, flt, found))
+
+    # Matches past a namespace's k-th are scored no higher than it, so they
+    # can only reach the context if the k-th still passes the score filters
+    # and ties or beats the max_results-th best seen so far. Only those
+    # namespaces are searched again at top_k.
+    for ns, k, flt, found in searched:
+        matches.extend(found)
+    for ns, k, flt, found in sorted(searched, key=lambda s: -s[3][-1]["score"] if s[3] else 0.0):
+        if k >= top_k or len(found) < k or remaining() < DEGRADE_NAMESPACES_BELOW_S:
+            continue
+        last = found[-1]["score"]
+        kept = sorted(
+            (m["score"] for m in matches if m["score"] >= min_score and best_score - m["score"] <= relative_drop),
+            reverse=True,
+        )
+        if last < min_score or best_score - last > relative_drop:
+            continue
+        if len(kept) >= max_results and last < kept[max_results - 1]:
+            continue
+        more = _query_namespace(ns, q_embed, top_k, flt)
+        matches.extend(more[k:])
 
     if not matches:
         set_last_retrieved_chunks([])
@@ -49,15 +183,15 @@ def retrieve_chunks(query: str) -> list[dict]:
     seen = set()
 
     for item in matches:
-        if item["score"] < MIN_ABSOLUTE_SCORE:
+        if item["score"] < min_score:
             continue
-        if (best_score - item["score"]) > RELATIVE_DROP:
+        if (best_score - item["score"]) > relative_drop:
             continue
 
         sig = (
             item.get("source"),
             item.get("page"),
-            " ".join((item.get("text") or "").split()).lower(),
+            item.get("text_hash") or " ".join((item.get("text") or "").split()).lower(),
         )
         if sig in seen:
             continue
@@ -65,8 +199,13 @@ def retrieve_chunks(query: str) -> list[dict]:
 
         filtered.append(item)
 
-        if len(filtered) >= 5:  # final context size
+        if len(filtered) >= max_results:  # final context size
             break
 
+    filtered = _hydrate(filtered)
+    for item in filtered:
+        # Precomputed here so citing the answer is just set intersections.
+        item["shingles"] = shingle_hashes(item["text"])
+
     set_last_retrieved_chunks(filtered)
     return filtered
\ No newline at end of file
@@ -0,0 +1,561 @@
+"""
+Local, read-only snapshots of the vector index.
+
+Layout of a snapshot directory:
+
+    GENERATION          name of the current generation, e.g. "gen-000042"
+    gen-000042/
+        manifest.json   {"format": 1, "dimension": 1536, "generation": "gen-000042",
+                         "namespaces": {"<ns>": {"count": N, "dtype": "float32"}}}
+        <ns>.npy        N x dimension matrix, rows L2-normalized
+        <ns>.jsonl      one {"id": ..., "metadata": {...}} line per row
+        <ns>.offsets.npy  N + 1 byte offsets of the lines in <ns>.jsonl
+        <ns>.col<k>.keys.npy / .starts.npy / .rows.npy
+                        filter column k (manifest "columns": field -> k): the
+                        sorted values, and the row ids holding each of them
+
+(Snapshots written before generations have the `gen-*` files directly in
+the directory and no GENERATION file; they are still read.)
+
+All the files are memory-mapped on load and rows are only decoded when a
+query returns them, so their pages are shared, through the page cache, by
+every worker process serving from it. Filtered queries look their values
+up in the columns instead of decoding rows.
+Vectors can be stored as float16 to halve the size; scores move by well
+under 1e-3.
+
+Every write creates a new generation and then replaces GENERATION, so
+readers switch from one complete snapshot to the next (LiveSnapshotIndex
+does so without a restart).
+
+Snapshots are written by ingestion and by `export_index`, and can be loaded
+back into an index with `import_snapshot` (scripts/index_snapshot.py), so a
+fresh environment never has to re-embed the corpus.
+"""
+
+from __future__ import annotations
+
+import glob
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+
+from backend.rag.local_index import LocalMatch, LocalQueryResult, matches_filter, unpack_vector
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT = 1
+MANIFEST = "manifest.json"
+GENERATION = "GENERATION"
+DTYPES = ("float32", "float16")
+# Unique per row: not worth indexing for filters.
+_UNFILTERED_FIELDS = ("text", "text_hash")
+# Fields with longer values aren't indexed (the keys are fixed-width).
+_MAX_COLUMN_KEY = 256
+# Queries for a namespace the open generation lacks check for a newer one at most this often.
+_MISSING_NAMESPACE_CHECK_S = 1.0
+# ... and wait this long for it.
+_MISSING_NAMESPACE_WAIT_S = 0.2
+
+
+def _stem(namespace: str) -> str:
+    # Pinecone's default namespace is "".
+    return namespace or "__default__"
+
+
+@contextmanager
+def _atomic_write(path: Path, mode: str):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, mode, **({} if "b" in mode else {"encoding": "utf-8"})) as f:
+        yield f
+    os.replace(tmp, path)
+
+
+def current_generation(directory: str | Path) -> Optional[Path]:
+    """Directory holding the current generation of the snapshot in `directory`, or None."""
+    directory = Path(directory)
+    try:
+        name = (directory / GENERATION).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        # Written before generations: the files are in the directory itself.
+        return directory if (directory / MANIFEST).exists() else None
+    return directory / name
+
+
+def _generation_number(path: Optional[Path]) -> int:
+    if path is None or not path.name.startswith("gen-"):
+        return 0
+    return int(path.name[len("gen-"):])
+
+
+def _column_key(value) -> str:
+    # Pinecone compares numbers as floats: 1 and 1.0 are the same value.
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = float(value)
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _write_columns(target: Path, stem: str, metadata: list[dict]) -> tuple[dict[str, int], list[str]]:
+    """
+    Write the filter columns of one namespace; returns (field -> column
+    number, fields left unindexed).
+    """
+    values: dict[str, dict[str, list[int]]] = {}
+    unindexed = set(_UNFILTERED_FIELDS)
+    for i, md in enumerate(metadata):
+        for field, value in md.items():
+            if field in unindexed:
+                continue
+            key = _column_key(value) if not isinstance(value, (list, dict)) else None
+            if key is None or len(key) > _MAX_COLUMN_KEY:
+                # Pinecone matches list fields per element: left to matches_filter.
+                unindexed.add(field)
+                values.pop(field, None)
+                continue
+            values.setdefault(field, {}).setdefault(key, []).append(i)
+
+    columns = {}
+    for k, (field, by_key) in enumerate(sorted(values.items())):
+        keys = sorted(by_key)
+        rows = [by_key[key] for key in keys]
+        np.save(target / f"{stem}.col{k}.keys.npy", np.asarray(keys, dtype=str))
+        np.save(target / f"{stem}.col{k}.starts.npy", np.cumsum([0] + [len(r) for r in rows], dtype=np.int64))
+        np.save(target / f"{stem}.col{k}.rows.npy", np.asarray([i for r in rows for i in r], dtype=np.int32))
+        columns[field] = k
+    return columns, sorted(unindexed)
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+# -------------------------------------------------
+# WRITING
+# -------------------------------------------------
+class SnapshotWriter:
+    """Collects vectors per namespace and writes them as a snapshot."""
+
+    def __init__(self):
+        self._namespaces: dict[str, dict[str, tuple[list[float], dict]]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, vectors: Iterable, namespace: str = "") -> None:
+        """Record vectors in any format `index.upsert` accepts (last write wins)."""
+        with self._lock:
+            rows = self._namespaces.setdefault(namespace or "", {})
+            for vector in vectors:
+                vid, values, metadata = unpack_vector(vector)
+                rows[vid] = (list(values), metadata)
+
+    def write(
+        self,
+        directory: str | Path,
+        dtype: str = "float32",
+        keep_generations: int = 2,
+        drop: Iterable[str] = (),
+    ) -> dict:
+        """
+        Write the recorded namespaces as a new generation of the snapshot in
+        `directory` and return its manifest. Namespaces of the current
+        generation that weren't recorded here, or listed in `drop`, are
+        carried over (hard-linked).
+        GENERATION is replaced last, so readers see the old snapshot or the
+        new one, never a mix. Beyond the newest `keep_generations`, older
+        generations are deleted; processes that still have one mapped keep
+        reading it until they switch.
+        """
+        if dtype not in DTYPES:
+            raise ValueError(f"dtype must be one of {DTYPES}, got {dtype!r}")
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        previous = current_generation(directory)
+        name = f"gen-{_generation_number(previous) + 1:06d}"
+        target = directory / name
+        shutil.rmtree(target, ignore_errors=True)  # left over from a crashed write
+        target.mkdir()
+
+        manifest = {"format": SNAPSHOT_FORMAT, "dimension": 0, "generation": name, "namespaces": {}}
+        drop = set(drop)
+        if previous is not None:
+            existing = json.loads((previous / MANIFEST).read_text(encoding="utf-8"))
+            if existing.get("format") == SNAPSHOT_FORMAT:
+                manifest["dimension"] = existing["dimension"]
+                for namespace, meta in existing["namespaces"].items():
+                    if self._namespaces.get(namespace) or namespace in drop:
+                        continue
+                    for src in previous.glob(f"{glob.escape(_stem(namespace))}.*"):
+                        _link_or_copy(src, target / src.name)
+                    manifest["namespaces"][namespace] = meta
+
+        for namespace, rows in sorted(self._namespaces.items()):
+            if not rows:
+                continue
+            ids = list(rows)
+            matrix = _normalize(np.asarray([rows[i][0] for i in ids], dtype=np.float32)).astype(dtype)
+            np.save(target / f"{_stem(namespace)}.npy", matrix)
+            offsets = [0]
+            with open(target / f"{_stem(namespace)}.jsonl", "wb") as f:
+                for vid in ids:
+                    line = (json.dumps({"id": vid, "metadata": rows[vid][1]}, ensure_ascii=False) + "\n").encode("utf-8")
+                    f.write(line)
+                    offsets.append(offsets[-1] + len(line))
+            np.save(target / f"{_stem(namespace)}.offsets.npy", np.asarray(offsets, dtype=np.int64))
+            columns, unindexed = _write_columns(target, _stem(namespace), [rows[vid][1] or {} for vid in ids])
+            manifest["dimension"] = int(matrix.shape[1])
+            manifest["namespaces"][namespace] = {
+                "count": len(ids),
+                "dtype": dtype,
+                "columns": columns,
+                "unindexed": unindexed,
+            }
+
+        (target / MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        with _atomic_write(directory / GENERATION, "w") as f:
+            f.write(name)
+
+        generations = sorted(p for p in directory.glob("gen-*") if p.is_dir())
+        for old in generations[: max(len(generations) - max(keep_generations, 1), 0)]:
+            shutil.rmtree(old, ignore_errors=True)
+        return manifest
+
+
+def _link_or_copy(src: Path, dst: Path) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+class RecordingIndex:
+    """
+    Index proxy that also records every upsert into a SnapshotWriter (or
+    anything else with its `add(vectors, namespace)`).
+    """
+
+    def __init__(self, index, writer: SnapshotWriter):
+        self._index = index
+        self._writer = writer
+
+    def upsert(self, vectors: list, namespace: str = "", **kwargs):
+        self._writer.add(vectors, namespace=namespace)
+        return self._index.upsert(vectors=vectors, namespace=namespace, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._index, name)
+
+
+# -------------------------------------------------
+# READING
+# -------------------------------------------------
+class _SnapshotNamespace:
+    """
+    One namespace of a snapshot; vectors, rows, row offsets and filter
+    columns all stay memory-mapped.
+    """
+
+    def __init__(self, directory: Path, namespace: str, meta: dict):
+        stem = _stem(namespace)
+        self.matrix = np.load(directory / f"{stem}.npy", mmap_mode="r")
+        path = directory / f"{stem}.jsonl"
+        self._lines = np.memmap(path, dtype=np.uint8, mode="r") if path.stat().st_size else np.zeros(0, np.uint8)
+        if (directory / f"{stem}.offsets.npy").exists():
+            self._offsets = np.load(directory / f"{stem}.offsets.npy", mmap_mode="r")
+        else:
+            # Older snapshots: find the line breaks once.
+            self._offsets = np.concatenate(([0], np.flatnonzero(self._lines == ord("\n")) + 1))
+        # field -> (keys, starts, rows); None for snapshots written without columns.
+        self.columns: Optional[dict[str, tuple[np.ndarray, np.ndarray, np.ndarray]]] = None
+        if "columns" in meta:
+            self.columns = {
+                field: tuple(
+                    np.load(directory / f"{stem}.col{k}.{part}.npy", mmap_mode="r") for part in ("keys", "starts", "rows")
+                )
+                for field, k in meta["columns"].items()
+            }
+        self._unindexed = set(meta.get("unindexed", ()))
+
+    def _rows_with(self, field: str, values: list) -> np.ndarray:
+        """Boolean mask of the rows whose `field` is one of `values`."""
+        hits = np.zeros(len(self), dtype=bool)
+        column = self.columns.get(field)
+        if column is None:
+            return hits  # a field no row has
+        keys, starts, rows = column
+        for value in values:
+            key = _column_key(value)
+            at = int(np.searchsorted(keys, key))
+            if at < len(keys) and keys[at] == key:
+                hits[rows[starts[at] : starts[at + 1]]] = True
+        return hits
+
+    def allowed(self, flt: dict) -> Optional[np.ndarray]:
+        """Rows matching `flt` as a boolean mask, or None when the columns can't tell."""
+        if self.columns is None:
+            return None
+        mask = np.ones(len(self), dtype=bool)
+        for key, cond in flt.items():
+            if key in ("$and", "$or"):
+                parts = [self.allowed(c) for c in cond]
+                if any(p is None for p in parts):
+                    return None
+                if key == "$and":
+                    for part in parts:
+                        mask &= part
+                else:
+                    mask &= np.logical_or.reduce(parts) if parts else False
+                continue
+            if key in self._unindexed:
+                return None
+            if not isinstance(cond, dict):
+                cond = {"$eq": cond}
+            for op, expected in cond.items():
+                values = expected if op in ("$in", "$nin") else [expected]
+                if op not in ("$eq", "$ne", "$in", "$nin") or any(v is None or isinstance(v, (list, dict)) for v in values):
+                    return None
+                hits = self._rows_with(key, values)
+                mask &= hits if op in ("$eq", "$in") else ~hits
+        return mask
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def row(self, i: int) -> dict:
+        return json.loads(self._lines[int(self._offsets[i]) : int(self._offsets[i + 1])].tobytes())
+
+    def rows(self, start: int = 0, stop: Optional[int] = None) -> Iterator[dict]:
+        for i in range(start, len(self) if stop is None else min(stop, len(self))):
+            yield self.row(i)
+
+
+class SnapshotIndex:
+    """Read-only index over a snapshot directory, with the Pinecone query API."""
+
+    def __init__(self, directory: str | Path):
+        """`directory` is a snapshot directory or one of its generations."""
+        self.directory = current_generation(directory) if (Path(directory) / GENERATION).exists() else Path(directory)
+        self.manifest = json.loads((self.directory / MANIFEST).read_text(encoding="utf-8"))
+        if self.manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format: {self.manifest.get('format')}")
+        self._namespaces = {
+            name: _SnapshotNamespace(self.directory, name, meta) for name, meta in self.manifest["namespaces"].items()
+        }
+
+    def query(
+        self,
+        vector: list[float],
+        top_k: int = 10,
+        namespace: str = "",
+        filter: Optional[dict] = None,
+        include_metadata: bool = False,
+        include_values: bool = False,
+        **kwargs,
+    ) -> LocalQueryResult:
+        ns = self._namespaces.get(namespace or "")
+        if ns is None or not len(ns):
+            return LocalQueryResult(matches=[], namespace=namespace)
+
+        q = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(q))
+        if norm > 0:
+            q = q / norm
+        scores = np.asarray(ns.matrix @ q, dtype=np.float32)
+
+        if filter:
+            allowed = ns.allowed(filter)
+            if allowed is None:
+                # A field without a column (or an older snapshot): decode every row.
+                allowed = np.array([matches_filter(row.get("metadata") or {}, filter) for row in ns.rows()], dtype=bool)
+            scores = np.where(allowed, scores, -np.inf)
+
+        k = min(top_k, len(ns))
+        top = np.argpartition(-scores, k - 1)[:k] if k < len(ns) else np.arange(len(ns))
+        top = top[np.argsort(-scores[top])]
+
+        matches = []
+        for i in top:
+            if not np.isfinite(scores[i]):
+                continue
+            row = ns.row(int(i))
+            matches.append(
+                LocalMatch(
+                    id=row["id"],
+                    score=float(scores[i]),
+                    metadata=(row.get("metadata") or {}) if include_metadata else None,
+                    values=np.asarray(ns.matrix[i], dtype=np.float32).tolist() if include_values else [],
+                )
+            )
+        return LocalQueryResult(matches=matches, namespace=namespace)
+
+    def describe_index_stats(self, **kwargs) -> dict:
+        namespaces = {name: {"vector_count": len(ns)} for name, ns in self._namespaces.items()}
+        return {
+            "namespaces": namespaces,
+            "dimension": self.manifest.get("dimension"),
+            "total_vector_count": sum(n["vector_count"] for n in namespaces.values()),
+        }
+
+    def iter_batches(self, namespace: str, batch_size: int = 100) -> Iterator[list[dict]]:
+        """Yield the namespace as upsert-ready `{id, values, metadata}` batches."""
+        ns = self._namespaces.get(namespace or "")
+        if ns is None:
+            return
+        for start in range(0, len(ns), batch_size):
+            values = np.asarray(ns.matrix[start : start + batch_size], dtype=np.float32)
+            yield [
+                {"id": row["id"], "values": vec.tolist(), "metadata": row.get("metadata") or {}}
+                for row, vec in zip(ns.rows(start, start + batch_size), values)
+            ]
+
+
+# -------------------------------------------------
+# EXPORT / IMPORT
+# -------------------------------------------------
+def _namespaces_of(index) -> list[str]:
+    return sorted(index.describe_index_stats()["namespaces"].keys())
+
+
+def export_index(
+    index,
+    directory: str | Path,
+    *,
+    namespaces: Optional[list[str]] = None,
+    dtype: str = "float32",
+    page_size: int = 100,
+    max_workers: int = 8,
+) -> dict:
+    """
+    Dump `namespaces` (default: all) of a live index into a snapshot and
+    return its manifest. IDs are listed page by page and each page is
+    fetched on a thread pool.
+    """
+    writer = SnapshotWriter()
+
+    def fetch_page(namespace: str, ids: list[str]) -> None:
+        fetched = index.fetch(ids=ids, namespace=namespace)
+        writer.add(
+            ({"id": v.id, "values": v.values, "metadata": v.metadata} for v in fetched.vectors.values()),
+            namespace=namespace,
+        )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [
+            pool.submit(fetch_page, namespace, [item.id for item in page.vectors])
+            for namespace in namespaces or _namespaces_of(index)
+            for page in index.list(limit=page_size, namespace=namespace)
+        ]
+        for future in futures:
+            future.result()
+
+    return writer.write(directory, dtype=dtype)
+
+
+def import_snapshot(
+    snapshot: SnapshotIndex,
+    index,
+    *,
+    namespaces: Optional[list[str]] = None,
+    batch_size: int = 100,
+    max_workers: int = 8,
+) -> dict[str, int]:
+    """
+    Upsert `namespaces` (default: all) of a snapshot into `index` in parallel
+    batches and return the vector count per namespace. The stored vectors
+    are L2-normalized, which leaves cosine scores unchanged.
+    """
+    counts: dict[str, int] = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        for namespace in namespaces or _namespaces_of(snapshot):
+            futures = []
+            counts[namespace] = 0
+            for batch in snapshot.iter_batches(namespace, batch_size):
+                futures.append(pool.submit(index.upsert, vectors=batch, namespace=namespace))
+                counts[namespace] += len(batch)
+            for future in futures:
+                future.result()
+    return counts
+
+
+def load_snapshot(directory: str | Path) -> Optional[SnapshotIndex]:
+    """Open the current generation of the snapshot in `directory`, or None when there isn't one."""
+    if not directory or current_generation(directory) is None:
+        return None
+    return SnapshotIndex(directory)
+
+
+class LiveSnapshotIndex:
+    """
+    SnapshotIndex that follows the snapshot's GENERATION file: at most every
+    `reload_s`, a query starts a check on a background thread, which opens
+    a new generation and then swaps it in for the following queries,
+    without a restart. Queries never wait for it, except briefly one for a
+    namespace the open generation lacks. Queries already running finish on
+    the generation they started with.
+    """
+
+    def __init__(self, directory: str | Path, reload_s: float):
+        self.directory = Path(directory)
+        self.reload_s = reload_s
+        self._lock = threading.Lock()
+        self._snapshot = SnapshotIndex(self.directory)
+        self._checked_at = time.monotonic()
+        self._swapping: Optional[threading.Event] = None
+
+    @property
+    def generation(self) -> str:
+        return self._snapshot.directory.name
+
+    def current(self) -> SnapshotIndex:
+        if time.monotonic() - self._checked_at >= self.reload_s:
+            self._swap_in_background()
+        return self._snapshot
+
+    def _swap_in_background(self) -> threading.Event:
+        """Start a check for a new generation unless one is running; set when it is done."""
+        with self._lock:
+            if self._swapping is None:
+                self._checked_at = time.monotonic()
+                self._swapping = threading.Event()
+                threading.Thread(target=self._maybe_swap, args=(self._swapping,), name="snapshot-swap", daemon=True).start()
+            return self._swapping
+
+    def _maybe_swap(self, done: threading.Event) -> None:
+        try:
+            latest = current_generation(self.directory)
+            if latest is not None and latest != self._snapshot.directory:
+                self._snapshot = SnapshotIndex(latest)
+                logger.info("Switched to index snapshot %s", latest.name)
+        except (OSError, ValueError) as exc:
+            # Keep serving the generation already open.
+            logger.error("Could not open index snapshot %s: %s", self.directory, exc)
+        finally:
+            with self._lock:
+                self._swapping = None
+            done.set()
+
+    def query(self, *args, **kwargs) -> LocalQueryResult:
+        snapshot = self.current()
+        if kwargs.get("namespace", "") not in snapshot.manifest["namespaces"]:
+            # A namespace version switched to right after this snapshot was
+            # written: give a check for it a moment (opening only maps files)
+            # instead of answering with nothing until the next regular one.
+            swapping = self._swapping
+            if swapping is None and time.monotonic() - self._checked_at >= min(self.reload_s, _MISSING_NAMESPACE_CHECK_S):
+                swapping = self._swap_in_background()
+            if swapping is not None:
+                swapping.wait(_MISSING_NAMESPACE_WAIT_S)
+                snapshot = self._snapshot
+        return snapshot.query(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.current(), name)
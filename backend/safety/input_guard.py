@@ -1,43 +1,38 @@
-# Explicitly forbidden intent
-BANNED_KEYWORDS = [
-    "password", "credentials", "token", "secret",
-    "hack", "exploit", "bypass", "sql injection",
-    "malware", "phishing"
-]
-
-# Topics outside assistant scope
-OUT_OF_SCOPE_TOPICS = [
-    "politics", "election", "religion",
-    "medical advice", "legal advice",
-    "stock market", "crypto", "finance tips"
-]
+from typing import Optional
+
+from backend.safety.policy import check
+
+# Explicitly forbidden intent ("banned_keyword") and topics outside the
+# assistant's scope ("out_of_scope") are listed in the "input" section of
+# the policy file (backend/safety/policy.json).
 
 MAX_QUERY_LENGTH = 500
 
 
-def is_query_allowed(query: str) -> bool:
+def check_query(query: str) -> Optional[str]:
     """
     Deterministic, rule-based input validation.
-    Returns True if query is allowed, False otherwise.
+    Returns the name of the rule the query breaks, or None if it is allowed.
     """
 
     if not query:
-        return False
+        return "empty"
 
-    q = query.strip().lower()
+    q = query.strip()
 
     # Length validation
-    if len(q) == 0 or len(q) > MAX_QUERY_LENGTH:
-        return False
+    if len(q) == 0:
+        return "empty"
+    if len(q) > MAX_QUERY_LENGTH:
+        return "too_long"
 
-    # Explicit forbidden keywords
-    for word in BANNED_KEYWORDS:
-        if word in q:
-            return False
+    # Forbidden keywords and out-of-scope topics, in one pass
+    match = check("input", q)
+    return match.rule if match is not None else None
 
-    # Scope validation
-    for topic in OUT_OF_SCOPE_TOPICS:
-        if topic in q:
-            return False
 
-    return True
\ No newline at end of file
+def is_query_allowed(query: str) -> bool:
+    """
+    Returns True if query is allowed, False otherwise.
+    """
+    return check_query(query) is None
@@ -1,41 +1,90 @@
+from typing import Optional
 
-UNSAFE_OUTPUT_PHRASES = [
-    "i assume",
-    "i think",
-    "probably",
-    "might be",
-    "not sure but",
-    "you could try hacking",
-    "one way to bypass",
-    "i don't have the document but"
-]
-
-FABRICATION_SIGNALS = [
-    "according to general knowledge",
-    "based on my training data",
-    "from the internet",
-    "widely known that"
-]
+from backend.safety.policy import POLICY_MATCHES, check, get_policy
+
+# Speculative / hallucinated language ("speculation") and fabricated source
+# claims ("fabrication") are listed in the "output" section of the policy
+# file (backend/safety/policy.json).
+
+
+class UnsafeOutput(Exception):
+    """A streamed answer broke an output rule; generation was stopped."""
+
+    def __init__(self, rule: str):
+        super().__init__(f"output blocked by rule {rule!r}")
+        self.rule = rule
+
+
+def check_output(text: str) -> Optional[str]:
+    """
+    Returns the name of the rule the output breaks, or None if it is safe.
+    """
+
+    if not text:
+        return "empty"
+
+    match = check("output", text)
+    return match.rule if match is not None else None
 
 
 def is_safe_output(text: str) -> bool:
     """
     Returns True if output is safe, False otherwise
     """
+    return check_output(text) is None
 
-    if not text:
-        return False
 
-    t = text.lower()
+class StreamingOutputFilter:
+    """
+    Checks an answer chunk by chunk while it is generated.
+
+    Only a rolling window of the last few dozen characters is searched, so
+    each chunk costs the same however long the answer gets, and phrases
+    split across chunks are still found. A match that ends exactly at the
+    end of the window is held until more text arrives, since it may turn
+    out to be part of a longer word.
+
+    `release()` hands out the text that can no longer be part of a match,
+    so a streaming endpoint only ever forwards text that passed the filter.
+    """
+
+    def __init__(self):
+        self._policy = get_policy("output")
+        # One character more than the longest phrase, for the word-boundary check.
+        self._keep = self._policy.max_phrase_chars + 1
+        self._window = " "
+        self._pending = ""
+        self.chars = 0
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """Add a chunk; returns the rule broken so far, or None."""
+        self._window += chunk
+        self._pending += chunk
+        self.chars += len(chunk)
+        match = self._policy.search(self._window, 1)
+        if match is not None and match.end < len(self._window):
+            POLICY_MATCHES.inc(section="output", rule=match.rule)
+            return match.rule
 
-    # Detect speculative / hallucinated language
-    for phrase in UNSAFE_OUTPUT_PHRASES:
-        if phrase in t:
-            return False
+        if len(self._window) > 2 * self._keep:
+            # Keep one character before the cut so the word boundary still
+            # sees it (`search` starts at position 1).
+            self._window = self._window[-self._keep - 1 :]
+        return None
 
-    # Detect fabricated source claims
-    for signal in FABRICATION_SIGNALS:
-        if signal in t:
-            return False
+    def finish(self) -> Optional[str]:
+        """Check the held-back tail once the answer is complete."""
+        match = self._policy.search(self._window, 1)
+        if match is not None:
+            POLICY_MATCHES.inc(section="output", rule=match.rule)
+            return match.rule
+        return None
 
-    return True
\ No newline at end of file
+    def release(self, final: bool = False) -> str:
+        """
+        Text cleared so far and not yet released. Until `final`, the last few
+        characters are held back since a phrase may still complete there.
+        """
+        cut = len(self._pending) if final else max(0, len(self._pending) - self._keep)
+        text, self._pending = self._pending[:cut], self._pending[cut:]
+        return text
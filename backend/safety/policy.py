@@ -0,0 +1,170 @@
+"""
+Phrase policies for the input guard and the output filter.
+
+The policy file (POLICY_FILE, JSON) maps a section ("input", "output",
+"injection") to rules, and each rule to its phrases:
+
+    {"input": {"banned_keyword": ["password", "sql injection", ...], ...}, ...}
+
+Each section is compiled into one regex (a character trie, so the pattern
+stays fast with hundreds of phrases) and checked in a single pass over the
+text. Phrases match whole words only ("token" doesn't match "tokenizer"),
+case-insensitively, with an optional plural "s". Words may be joined by any
+run of whitespace, "_" or "-" ("secret key", "secret_key", "secret-key"),
+and "_" counts as a word boundary. The file is re-read when it changes on
+disk.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from backend.config import POLICY_FILE, POLICY_RELOAD_S
+from backend.utils.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLICY_FILE = Path(__file__).with_name("policy.json")
+
+POLICY_MATCHES = Counter(
+    "ika_policy_matches_total",
+    "Texts matching a policy rule, by section and rule.",
+    labels=("section", "rule"),
+)
+
+
+class PolicyMatch(NamedTuple):
+    rule: str
+    phrase: str
+    start: int
+    end: int
+
+
+# Between the words of a phrase, and what a phrase can't touch on either side.
+_SEPARATOR = re.compile(r"[\s_-]+")
+_SEPARATOR_PATTERN = r"[\s_-]+"
+_BEFORE = r"(?<![A-Za-z0-9])"
+_AFTER = r"(?![A-Za-z0-9])"
+
+
+def normalize_phrase(phrase: str) -> str:
+    """Lower-cased, words separated by single spaces ("Secret_Key" -> "secret key")."""
+    return " ".join(_SEPARATOR.split(phrase.lower())).strip()
+
+
+def _trie_pattern(phrases: list[str]) -> str:
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for ch in phrase:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        branches = [
+            (_SEPARATOR_PATTERN if ch == " " else re.escape(ch)) + emit(child)
+            for ch, child in sorted(node.items())
+            if ch
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if "" in node:
+            # A phrase ends here and longer ones continue: the rest is optional.
+            body = f"(?:{body})?"
+        return body
+
+    return emit(trie)
+
+
+class CompiledPolicy:
+    """One section of the policy, compiled to a single word-bounded regex."""
+
+    def __init__(self, rules: dict[str, list[str]]):
+        self.rules: dict[str, str] = {}  # normalized phrase -> rule
+        for rule, phrases in rules.items():
+            for phrase in phrases:
+                if normalize_phrase(phrase):
+                    self.rules.setdefault(normalize_phrase(phrase), rule)
+        # Longest phrase, so streaming callers know how much text to hold back.
+        self.max_phrase_chars = max((len(p) for p in self.rules), default=0)
+        self._regex = (
+            re.compile(rf"{_BEFORE}({_trie_pattern(list(self.rules))})s?{_AFTER}", re.IGNORECASE)
+            if self.rules
+            else None
+        )
+
+    def search(self, text: str, pos: int = 0) -> Optional[PolicyMatch]:
+        """First phrase occurrence in `text` (from `pos`), or None."""
+        if self._regex is None or not text:
+            return None
+        m = self._regex.search(text, pos)
+        if m is None:
+            return None
+        phrase = normalize_phrase(m.group(1))
+        return PolicyMatch(self.rules[phrase], phrase, m.start(), m.end())
+
+
+# -------------------------------------------------
+# LOADING / HOT RELOAD
+# -------------------------------------------------
+def load_policy(path: str | Path) -> dict[str, CompiledPolicy]:
+    raw = json.loads(Path(path).read_text(encoding="utf-8"))
+    return {section: CompiledPolicy(rules) for section, rules in raw.items()}
+
+
+class _PolicyStore:
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = os.stat(path).st_mtime
+        self._sections = load_policy(path)
+        self._checked_at = time.monotonic()
+
+    def get(self, section: str) -> CompiledPolicy:
+        if time.monotonic() - self._checked_at >= POLICY_RELOAD_S:
+            self._maybe_reload()
+        return self._sections.get(section) or CompiledPolicy({})
+
+    def _maybe_reload(self) -> None:
+        with self._lock:
+            self._checked_at = time.monotonic()
+            try:
+                mtime = os.stat(self.path).st_mtime
+                if mtime == self._mtime:
+                    return
+                self._sections = load_policy(self.path)
+                self._mtime = mtime
+                logger.info("Reloaded policy from %s", self.path)
+            except (OSError, ValueError) as exc:
+                # Keep serving the last good policy.
+                logger.error("Policy reload from %s failed: %s", self.path, exc)
+
+
+_store: Optional[_PolicyStore] = None
+_store_lock = threading.Lock()
+
+
+def get_policy(section: str) -> CompiledPolicy:
+    """Compiled policy for `section`, reloaded when the policy file changes."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = _PolicyStore(Path(POLICY_FILE) if POLICY_FILE else DEFAULT_POLICY_FILE)
+    return _store.get(section)
+
+
+def check(section: str, text: str) -> Optional[PolicyMatch]:
+    """First rule of `section` that `text` violates, or None; counted in metrics."""
+    match = get_policy(section).search(text)
+    if match is not None:
+        POLICY_MATCHES.inc(section=section, rule=match.rule)
+    return match
@@ -1,33 +1,158 @@
-from openai import OpenAI
-import os
+from __future__ import annotations
 
-client = OpenAI(
-    api_key=os.getenv("GROQ_API_KEY"),
-    base_url="https://api.groq.com/openai/v1"
+import hashlib
+import json
+import re
+from functools import lru_cache
+
+from backend.cache.backends import CacheBackend, InMemoryCache, RedisCache
+from backend.config import (
+    GUARD_TIMEOUT_S,
+    PROMPT_GUARD_CACHE_MAX_ENTRIES,
+    PROMPT_GUARD_CACHE_TTL_S,
+    PROMPT_GUARD_PREFILTER,
+    PROMPT_GUARD_PREFILTER_MAX_CHARS,
+    PROMPT_GUARD_THRESHOLD,
+    REDIS_URL,
+    RESPONSE_CACHE_BACKEND,
 )
+from backend.safety.policy import check
+from backend.utils.http_clients import call_within_deadline, get_groq_client
+from backend.utils.metrics import Counter
+from backend.utils.query import normalize_query
+from backend.utils.tracing import span
 
 PROMPT_GUARD_MODEL = "meta-llama/llama-prompt-guard-2-86m"
 
+# Where each verdict came from: "prefilter" and "cache" skip the Groq call.
+GUARD_VERDICTS = Counter(
+    "ika_prompt_guard_verdicts_total",
+    "Prompt guard verdicts, by source (prefilter/cache/remote) and result (safe/unsafe).",
+    labels=("source", "result"),
+)
 
-def is_prompt_safe(text: str) -> bool:
+# Plain questions: letters, digits, spaces and light punctuation on one line.
+_PLAIN_TEXT = re.compile(r"[\w ?!.,'\"()&/-]+")
+# Runs this long without a space look like encoded payloads, not words.
+_LONG_TOKEN = re.compile(r"\S{40,}")
+# The query has to be shaped like a question about the knowledge base...
+_QUESTION = re.compile(
+    r"(what|which|where|how|when|who|why|is|are|does|do|can|should|list|explain|describe)\b", re.IGNORECASE
+)
+_WORD = re.compile(r"[a-z0-9]+")
+# ...name something the knowledge base covers...
+_DOMAIN_TERMS = frozenset({
+    "pr", "prs", "pull", "merge", "review", "reviewer", "reviewers", "sop", "sops", "procedure", "process",
+    "locator", "locators", "keyword", "keywords", "xpath", "selector", "button", "field", "element",
+    "checklist", "validation", "validate", "verify", "verification", "report", "reports", "rule", "rules",
+    "test", "tests", "testing", "automation", "robot", "framework", "step", "steps", "branch", "commit",
+    "company", "spotline", "client", "clients", "service", "services", "sheet", "module",
+})
+# ...and not talk to or about the assistant itself.
+_ASSISTANT_TERMS = frozenset({
+    "you", "your", "yours", "yourself", "assistant", "ai", "model", "prompt", "prompts", "instruction",
+    "instructions", "system", "told", "pretend", "roleplay", "ignore", "forget", "bypass",
+})
+
+
+# -------------------------------------------------
+# LOCAL PRE-FILTER
+# -------------------------------------------------
+def is_clearly_benign(text: str) -> bool:
     """
-    Returns True if prompt is SAFE, False if it is a prompt-injection or jailbreak attempt.
+    Cheap lexical check that clears only queries that are confidently
+    benign: short and plain, phrased as a question, naming something from
+    the knowledge base (PRs, SOPs, locators, reports, ...), never addressing
+    the assistant, and with none of the "injection" policy phrases.
+    Anything else goes to the model.
     """
+    if not text or len(text) > PROMPT_GUARD_PREFILTER_MAX_CHARS:
+        return False
+    if not _PLAIN_TEXT.fullmatch(text) or _LONG_TOKEN.search(text):
+        return False
+    if not _QUESTION.match(text.strip()):
+        return False
+    words = set(_WORD.findall(text.lower()))
+    if not words & _DOMAIN_TERMS or words & _ASSISTANT_TERMS:
+        return False
+    return check("injection", text) is None
 
-    response = client.chat.completions.create(
-        model=PROMPT_GUARD_MODEL,
-        messages=[
-            {
-                "role": "user",
-                "content": text
-            }
-        ],
-        temperature=0.5
+
+# -------------------------------------------------
+# VERDICT CACHE
+# -------------------------------------------------
+@lru_cache(maxsize=1)
+def get_verdict_cache() -> CacheBackend:
+    if RESPONSE_CACHE_BACKEND == "redis":
+        return RedisCache(url=REDIS_URL, prefix="ika:guard:", ttl_s=PROMPT_GUARD_CACHE_TTL_S, stale_grace_s=0)
+
+    return InMemoryCache(
+        max_entries=PROMPT_GUARD_CACHE_MAX_ENTRIES, ttl_s=PROMPT_GUARD_CACHE_TTL_S, stale_grace_s=0
     )
 
-    verdict = response.choices[0].message.content.strip().lower()
 
-    # Prompt Guard outputs things like:
-    # "SAFE"
-    # "UNSAFE_PROMPT_INJECTION"
-    return verdict.startswith("safe")
+def verdict_cache_key(text: str) -> str:
+    parts = [normalize_query(text), PROMPT_GUARD_MODEL, PROMPT_GUARD_THRESHOLD]
+    return hashlib.sha256(json.dumps(parts).encode("utf-8")).hexdigest()
+
+
+# -------------------------------------------------
+# REMOTE CLASSIFIER
+# -------------------------------------------------
+def parse_verdict(content: str) -> bool:
+    """
+    True if the model's answer means SAFE. Prompt Guard 2 on Groq answers
+    with the probability that the text is an attack ("0.0009"); labels like
+    "SAFE" / "UNSAFE_PROMPT_INJECTION" are accepted too.
+    """
+    verdict = (content or "").strip().lower()
+    try:
+        return float(verdict) < PROMPT_GUARD_THRESHOLD
+    except ValueError:
+        return verdict.startswith(("safe", "benign"))
+
+
+def _classify_remote(text: str) -> bool:
+    client = get_groq_client()
+    response = call_within_deadline(
+        "prompt_guard",
+        GUARD_TIMEOUT_S,
+        lambda timeout: client.with_options(timeout=timeout, max_retries=0).chat.completions.create(
+            model=PROMPT_GUARD_MODEL,
+            messages=[
+                {
+                    "role": "user",
+                    "content": text
+                }
+            ],
+            temperature=0.5
+        ),
+    )
+    return parse_verdict(response.choices[0].message.content)
+
+
+def is_prompt_safe(text: str) -> bool:
+    """
+    Returns True if prompt is SAFE, False if it is a prompt-injection or jailbreak attempt.
+
+    Obviously benign queries are cleared locally and verdicts are cached, so
+    Groq is only asked about new, non-trivial queries.
+    Raises StageTimeout("prompt_guard") when Groq doesn't answer within the stage budget.
+    """
+    if PROMPT_GUARD_PREFILTER and is_clearly_benign(text):
+        GUARD_VERDICTS.inc(source="prefilter", result="safe")
+        return True
+
+    cache = get_verdict_cache()
+    key = verdict_cache_key(text)
+    entry = cache.get(key)
+    if entry is not None and entry.fresh:
+        safe = bool(entry.value)
+        GUARD_VERDICTS.inc(source="cache", result="safe" if safe else "unsafe")
+        return safe
+
+    with span("prompt_guard_remote"):
+        safe = _classify_remote(text)
+    cache.set(key, safe)
+    GUARD_VERDICTS.inc(source="remote", result="safe" if safe else "unsafe")
+    return safe
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request is not admitted.
+
+    `status_code` is 429 when the request was turned away up front (queue
+    full / per-client limit) and 503 when it waited past the queue deadline.
+    `retry_after` is a whole number of seconds for the Retry-After header.
+    """
+
+    def __init__(self, reason: str, retry_after: int, status_code: int = 429):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    client: str = field(compare=False)
+    admitted: bool = field(default=False, compare=False)
+    cancelled: bool = field(default=False, compare=False)
+
+
+class AdmissionController:
+    """Bounded concurrency with a priority wait queue.
+
+    - at most `max_in_flight` requests run at once
+    - a client may hold at most `per_client` running + queued requests
+    - up to `max_queue` requests wait, lowest `priority` first (FIFO within
+      a priority), each for at most `queue_timeout_s`
+    - everything else is rejected immediately, so overload turns into fast
+      429s instead of every request slowing down
+    """
+
+    def __init__(self, max_in_flight: int, per_client: int, max_queue: int, queue_timeout_s: float):
+        self.max_in_flight = max(1, max_in_flight)
+        self.per_client = max(1, per_client)
+        self.max_queue = max(0, max_queue)
+        self.queue_timeout_s = queue_timeout_s
+
+        self._cond = threading.Condition()
+        self._queue: list[_Waiter] = []
+        self._queued = 0
+        self._in_flight = 0
+        self._per_client: dict[str, int] = {}
+        self._seq = itertools.count()
+        # Moving average of how long an admitted request holds its slot.
+        self._service_s = 1.0
+
+    # -------------------------------------------------
+    # PUBLIC API
+    # -------------------------------------------------
+    @contextmanager
+    def admit(self, client: str, priority: int = 1) -> Iterator[None]:
+        """Hold a slot for the duration of the block (raises AdmissionRejected)."""
+        self._acquire(client, priority)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self._release(client, time.monotonic() - start)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {"in_flight": self._in_flight, "queued": self._queued}
+
+    # -------------------------------------------------
+    # INTERNALS
+    # -------------------------------------------------
+    def _retry_after(self) -> int:
+        # Time for the current backlog to drain through the available slots.
+        backlog = self._queued + self._in_flight
+        return max(1, math.ceil(self._service_s * backlog / self.max_in_flight))
+
+    def _acquire(self, client: str, priority: int) -> None:
+        with self._cond:
+            if self._per_client.get(client, 0) >= self.per_client:
+                raise AdmissionRejected("client concurrency limit", self._retry_after())
+
+            if self._in_flight < self.max_in_flight and self._queued == 0:
+                self._take_slot(client)
+                return
+
+            if self._queued >= self.max_queue:
+                raise AdmissionRejected("queue full", self._retry_after())
+
+            waiter = _Waiter(priority=priority, seq=next(self._seq), client=client)
+            heapq.heappush(self._queue, waiter)
+            self._queued += 1
+            self._per_client[client] = self._per_client.get(client, 0) + 1
+
+            deadline = time.monotonic() + self.queue_timeout_s
+            while not waiter.admitted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    waiter.cancelled = True
+                    self._queued -= 1
+                    self._decrement_client(client)
+                    self._dispatch()
+                    raise AdmissionRejected("queue timeout", self._retry_after(), status_code=503)
+                self._cond.wait(remaining)
+
+    def _take_slot(self, client: str) -> None:
+        self._in_flight += 1
+        self._per_client[client] = self._per_client.get(client, 0) + 1
+
+    def _decrement_client(self, client: str) -> None:
+        count = self._per_client.get(client, 0) - 1
+        if count > 0:
+            self._per_client[client] = count
+        else:
+            self._per_client.pop(client, None)
+
+    def _dispatch(self) -> None:
+        """Hand free slots to the best queued waiters (caller holds the lock)."""
+        woke = False
+        while self._queue and self._in_flight < self.max_in_flight:
+            waiter = heapq.heappop(self._queue)
+            if waiter.cancelled:
+                continue
+            waiter.admitted = True
+            self._queued -= 1
+            # The waiter's per-client count was taken when it was queued.
+            self._in_flight += 1
+            woke = True
+        if woke:
+            self._cond.notify_all()
+
+    def _release(self, client: str, held_s: float) -> None:
+        with self._cond:
+            self._service_s = 0.8 * self._service_s + 0.2 * held_s
+            self._in_flight -= 1
+            self._decrement_client(client)
+            self._dispatch()
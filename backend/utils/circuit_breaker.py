@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from typing import Callable, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+
+
+class CircuitBreaker:
+    """Error-rate and latency circuit breaker with background recovery probes.
+
+    The last `window` calls are tracked; a call is bad when it failed or
+    took longer than `slow_call_s`. Once at least `min_calls` are tracked
+    and the bad fraction reaches `failure_rate`, the circuit opens and
+    `allow()` returns False, so callers go straight to their fallback.
+
+    While open, `probe()` is run every `probe_interval_s` on a background
+    thread; the first probe that succeeds (and is not slow) closes the
+    circuit again with a clean window. Live traffic never pays for probing.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        window: int = 20,
+        min_calls: int = 5,
+        failure_rate: float = 0.5,
+        slow_call_s: float = 1.5,
+        probe_interval_s: float = 10.0,
+        probe: Optional[Callable[[], object]] = None,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_s = slow_call_s
+        self.probe_interval_s = probe_interval_s
+        self._probe = probe
+
+        self._lock = threading.Lock()
+        self._calls: deque[bool] = deque(maxlen=window)  # True = bad call
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trips = 0
+        self._prober: Optional[threading.Thread] = None
+
+    # -------------------------------------------------
+    # PUBLIC API
+    # -------------------------------------------------
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow(self) -> bool:
+        return self._state == CLOSED
+
+    def record(self, ok: bool, seconds: float) -> None:
+        """Record the outcome of a call made while the circuit was closed."""
+        with self._lock:
+            if self._state != CLOSED:
+                return
+            self._calls.append(not ok or seconds > self.slow_call_s)
+            if len(self._calls) >= self.min_calls and sum(self._calls) / len(self._calls) >= self.failure_rate:
+                self._trip()
+
+    def stats(self) -> dict:
+        with self._lock:
+            bad = sum(self._calls)
+            return {
+                "state": self._state,
+                "trips": self._trips,
+                "window_calls": len(self._calls),
+                "window_bad": bad,
+            }
+
+    # -------------------------------------------------
+    # INTERNALS
+    # -------------------------------------------------
+    def _trip(self) -> None:
+        # Caller holds the lock.
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._trips += 1
+        if self._probe is not None and (self._prober is None or not self._prober.is_alive()):
+            self._prober = threading.Thread(target=self._probe_loop, name=f"{self.name}-probe", daemon=True)
+            self._prober.start()
+
+    def _close(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._calls.clear()
+
+    def _probe_loop(self) -> None:
+        while self._state == OPEN:
+            time.sleep(self.probe_interval_s)
+            start = time.perf_counter()
+            try:
+                self._probe()
+            except Exception:
+                continue
+            if time.perf_counter() - start <= self.slow_call_s:
+                self._close()
@@ -1,11 +1,85 @@
+import re
 from pathlib import Path
+from typing import Optional
+
 from backend.utils.retrieval_context import get_last_retrieved_chunks
 
+_WORD = re.compile(r"\w+")
+
+# Words per shingle. Three-word runs are rare enough to show that the answer
+# took a passage's wording, and short enough to survive light rephrasing.
+SHINGLE_SIZE = 3
+# Shared shingles a chunk needs before it counts as used by the answer.
+MIN_CITATION_SHINGLES = 2
+
+
+def shingle_hashes(text: str) -> frozenset[int]:
+    """
+    Hashes of the overlapping SHINGLE_SIZE-word runs in `text` (lowercased).
+    The retriever stores them on each chunk, so attributing an answer is
+    only set intersections.
+    """
+    words = _WORD.findall((text or "").lower())
+    if len(words) < SHINGLE_SIZE:
+        return frozenset([hash(tuple(words))]) if words else frozenset()
+    return frozenset(hash(tuple(words[i : i + SHINGLE_SIZE])) for i in range(len(words) - SHINGLE_SIZE + 1))
+
+
+def _citation(chunk: dict, overlap: float) -> dict:
+    return {
+        "source": Path(chunk["source"]).name if chunk.get("source") else None,
+        "page": chunk.get("page"),
+        "namespace": chunk.get("namespace"),
+        "score": round(float(chunk.get("score", 0.0)), 4),
+        "overlap": round(overlap, 4),
+    }
+
 
-def extract_sources() -> list[str]:
+def attribute(answer: str, chunks: list[dict]) -> list[dict]:
     """
-    Returns unique document names based on retrieved chunks.
+    Chunk-level citations for `answer`, most-used chunk first.
+
+    `overlap` is the share of the answer's shingles found in the chunk.
+    Chunks below MIN_CITATION_SHINGLES are left out; when no chunk reaches
+    it (a fully paraphrased answer) every chunk is cited by retrieval score,
+    since they were all the model saw.
     """
+    if not chunks:
+        return []
+
+    answer_shingles = shingle_hashes(answer)
+    if not answer_shingles:
+        return [_citation(c, 0.0) for c in chunks]
+
+    used = []
+    for chunk in chunks:
+        shingles = chunk.get("shingles")
+        if shingles is None:
+            shingles = shingle_hashes(chunk.get("text", ""))
+        shared = len(answer_shingles & shingles)
+        if shared >= MIN_CITATION_SHINGLES:
+            used.append((shared, chunk))
+
+    if not used:
+        return [_citation(c, 0.0) for c in chunks]
+
+    used.sort(key=lambda item: (item[0], item[1].get("score", 0.0)), reverse=True)
+    return [_citation(chunk, shared / len(answer_shingles)) for shared, chunk in used]
+
+
+def build_citations(answer: str) -> list[dict]:
+    """Citations for `answer` against the chunks retrieved for this request."""
+    return attribute(answer, get_last_retrieved_chunks())
+
+
+def extract_sources(citations: Optional[list[dict]] = None) -> list[str]:
+    """
+    Returns unique document names: in citation order when `citations` is
+    given, otherwise sorted, for every retrieved chunk.
+    """
+
+    if citations is not None:
+        return list(dict.fromkeys(c["source"] for c in citations if c.get("source")))
 
     chunks = get_last_retrieved_chunks()
     if not chunks:
@@ -20,4 +94,4 @@ def extract_sources() -> list[str]:
 
         sources.add(Path(src).name)
 
-    return sorted(sources)
\ No newline at end of file
+    return sorted(sources)
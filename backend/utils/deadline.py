@@ -0,0 +1,84 @@
+"""
+Per-request deadline budget.
+
+/ask starts a deadline when the request arrives. Every stage asks
+`stage_timeout(cap)` for its own timeout, which is the stage's cap or less
+when the deadline is closer, so a slow stage can't run past the budget.
+Stages check `remaining()` to choose a cheaper path when time is short,
+and call `degrade(reason)` so the response can say it was degraded. Outside
+a request there is no deadline, so stages just use their caps.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from backend.config import DEADLINE_RESERVE_S
+from backend.utils.metrics import Counter
+
+DEGRADED = Counter(
+    "ika_degraded_total",
+    "Requests answered in a degraded mode because the deadline was close, by reason.",
+    labels=("reason",),
+)
+
+# Shortest timeout handed to a stage; below this a call can't succeed anyway.
+MIN_STAGE_TIMEOUT_S = 0.1
+
+
+class StageTimeout(Exception):
+    """A pipeline stage ran out of time (its own cap or the request deadline)."""
+
+    def __init__(self, stage: str):
+        super().__init__(f"{stage} timed out")
+        self.stage = stage
+
+
+class Deadline:
+    def __init__(self, budget_s: float):
+        self.expires_at = time.monotonic() + budget_s
+        self.degraded: list[str] = []
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+
+_CURRENT_DEADLINE: ContextVar[Optional[Deadline]] = ContextVar("ika_deadline", default=None)
+
+
+def start_deadline(budget_s: float) -> Deadline:
+    """Start the deadline for the current request and return it."""
+    deadline = Deadline(budget_s)
+    _CURRENT_DEADLINE.set(deadline)
+    return deadline
+
+
+def remaining() -> float:
+    """Seconds left before the request deadline (inf outside a request)."""
+    deadline = _CURRENT_DEADLINE.get()
+    return deadline.remaining() if deadline is not None else math.inf
+
+
+def stage_timeout(cap: float) -> float:
+    """
+    Timeout for the next stage: `cap`, or what is left of the deadline after
+    keeping DEADLINE_RESERVE_S back to assemble a degraded answer.
+    """
+    return max(MIN_STAGE_TIMEOUT_S, min(cap, remaining() - DEADLINE_RESERVE_S))
+
+
+def degrade(reason: str) -> None:
+    """Record that the current request took a cheaper path."""
+    DEGRADED.inc(reason=reason)
+    deadline = _CURRENT_DEADLINE.get()
+    if deadline is not None and reason not in deadline.degraded:
+        deadline.degraded.append(reason)
+
+
+def degraded_reasons() -> list[str]:
+    """Degradations recorded so far for the current request."""
+    deadline = _CURRENT_DEADLINE.get()
+    return list(deadline.degraded) if deadline is not None else []
@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import importlib.util
+import logging
+import threading
+import time
+from functools import lru_cache
+from typing import Callable, TypeVar
+
+import httpx
+
+from backend.config import (
+    DEADLINE_RESERVE_S,
+    GROQ_API_BASE,
+    GROQ_API_KEY,
+    HTTP2_ENABLED,
+    HTTP_CONNECT_TIMEOUT_S,
+    HTTP_KEEPALIVE_EXPIRY_S,
+    HTTP_POOL_MAX_CONNECTIONS,
+    HTTP_POOL_MAX_KEEPALIVE,
+    HTTP_READ_TIMEOUT_S,
+    OPENAI_API_BASE,
+    OPENAI_API_KEY,
+)
+from backend.utils.deadline import StageTimeout, remaining, stage_timeout
+from backend.utils.metrics import Counter, Gauge, Histogram
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+# Outbound providers sharing a pool: name -> (base url, api key).
+PROVIDERS = {
+    "openai": (OPENAI_API_BASE, OPENAI_API_KEY),
+    "groq": (GROQ_API_BASE, GROQ_API_KEY),
+}
+
+HTTP_REQUESTS = Counter(
+    "ika_http_requests_total",
+    "Outbound HTTP requests, by provider pool.",
+    labels=("client",),
+)
+HTTP_CONNECTIONS_OPENED = Counter(
+    "ika_http_connections_opened_total",
+    "New outbound connections (TCP connects), by provider pool.",
+    labels=("client",),
+)
+HTTP_CONNECT_LATENCY = Histogram(
+    "ika_http_connect_seconds",
+    "Time spent establishing outbound connections, by pool and phase (tcp/tls).",
+    labels=("client", "phase"),
+)
+HTTP_POOL_CONNECTIONS = Gauge(
+    "ika_http_pool_connections",
+    "Connections held by each provider pool, by state (active/idle).",
+    labels=("client", "state"),
+)
+
+
+# -------------------------------------------------
+# INSTRUMENTED TRANSPORT
+# -------------------------------------------------
+class _PoolTransport(httpx.HTTPTransport):
+    """HTTPTransport that reports connection setup and pool usage."""
+
+    # httpcore trace events that bracket connection setup.
+    _PHASES = {
+        "connection.connect_tcp": "tcp",
+        "connection.start_tls": "tls",
+    }
+
+    def __init__(self, name: str, **kwargs):
+        super().__init__(**kwargs)
+        self.name = name
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        HTTP_REQUESTS.inc(client=self.name)
+        request.extensions["trace"] = self._tracer(request.extensions.get("trace"))
+        return super().handle_request(request)
+
+    def _tracer(self, inner):
+        started: dict[str, float] = {}
+
+        def trace(event: str, info: dict) -> None:
+            prefix, _, state = event.rpartition(".")
+            phase = self._PHASES.get(prefix)
+            if phase is not None:
+                if state == "started":
+                    started[phase] = time.perf_counter()
+                elif state == "complete" and phase in started:
+                    HTTP_CONNECT_LATENCY.observe(
+                        time.perf_counter() - started.pop(phase), client=self.name, phase=phase
+                    )
+                    if phase == "tcp":
+                        HTTP_CONNECTIONS_OPENED.inc(client=self.name)
+            if inner is not None:
+                inner(event, info)
+
+        return trace
+
+    def pool_state(self) -> dict[str, int]:
+        connections = list(getattr(self._pool, "connections", []))
+        idle = sum(1 for c in connections if c.is_idle())
+        return {"active": len(connections) - idle, "idle": idle}
+
+
+# -------------------------------------------------
+# CLIENT FACTORY
+# -------------------------------------------------
+def _http2_available() -> bool:
+    return HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+
+
+@lru_cache(maxsize=None)
+def get_http_client(name: str) -> httpx.Client:
+    """
+    Shared keep-alive pool for one outbound provider ("openai", "groq", ...).
+
+    Every SDK client talking to that provider is built on this pool, so a
+    request reuses a warm connection instead of paying for TCP + TLS again.
+    """
+
+    transport = _PoolTransport(
+        name,
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_S,
+        ),
+    )
+    for state in ("active", "idle"):
+        HTTP_POOL_CONNECTIONS.set_function(lambda s=state: transport.pool_state()[s], client=name, state=state)
+
+    return httpx.Client(
+        transport=transport,
+        timeout=httpx.Timeout(HTTP_READ_TIMEOUT_S, connect=HTTP_CONNECT_TIMEOUT_S),
+        follow_redirects=True,
+    )
+
+
+def _openai_sdk_client(name: str):
+    from openai import OpenAI
+
+    base_url, api_key = PROVIDERS[name]
+    http_client = get_http_client(name)
+    return OpenAI(api_key=api_key, base_url=base_url, http_client=http_client, timeout=http_client.timeout)
+
+
+@lru_cache(maxsize=1)
+def get_openai_client():
+    """OpenAI SDK client on the shared "openai" pool (embeddings)."""
+    return _openai_sdk_client("openai")
+
+
+@lru_cache(maxsize=1)
+def get_groq_client():
+    """OpenAI-compatible client for Groq on the shared "groq" pool (prompt guard)."""
+    return _openai_sdk_client("groq")
+
+
+# -------------------------------------------------
+# DEADLINE-BOUND CALLS
+# -------------------------------------------------
+def call_within_deadline(stage: str, cap: float, call: Callable[[float], T]) -> T:
+    """
+    Run one provider call for `stage` inside the request deadline.
+
+    `call(timeout)` must make a single attempt (SDK retries off) with that
+    timeout, which is `cap` cut to the time left. A timeout raises
+    StageTimeout(stage) straight away; a slow provider won't be faster on a
+    retry. A transient error (connection, 429, 5xx) is retried once when a
+    full attempt still fits before the deadline.
+    """
+    from openai import APIConnectionError, APITimeoutError, InternalServerError, RateLimitError
+
+    for attempt in range(2):
+        try:
+            return call(stage_timeout(cap))
+        except APITimeoutError as exc:
+            raise StageTimeout(stage) from exc
+        except (APIConnectionError, InternalServerError, RateLimitError):
+            if attempt or remaining() - DEADLINE_RESERVE_S < cap:
+                raise
+
+
+# -------------------------------------------------
+# WARM-UP
+# -------------------------------------------------
+def _warm_up() -> None:
+    for name, (base_url, api_key) in PROVIDERS.items():
+        if not api_key:
+            continue
+        try:
+            get_http_client(name).get(
+                f"{base_url.rstrip('/')}/models",
+                headers={"Authorization": f"Bearer {api_key}"},
+            )
+        except httpx.HTTPError as exc:
+            logger.warning("HTTP warm-up for %s failed: %s", name, exc)
+
+    try:
+        from backend.rag.pinecone_client import get_query_index
+
+        get_query_index().describe_index_stats()
+    except Exception as exc:
+        logger.warning("Vector store warm-up failed: %s", exc)
+
+
+def start_warm_up() -> threading.Thread:
+    """
+    Open one connection per provider in the background, so the first /ask
+    does not pay for DNS + TCP + TLS. Failures are logged and ignored.
+    """
+
+    thread = threading.Thread(target=_warm_up, name="http-warm-up", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,14 @@
+import re
+
+_WS = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    """
+    Canonical form of a user query, used as the key for caches and request
+    coalescing. Case, surrounding/repeated whitespace and trailing
+    punctuation don't change the answer, so they don't change the key.
+    """
+
+    q = _WS.sub(" ", (query or "").strip().lower())
+    return q.rstrip(" ?!.")
@@ -0,0 +1,166 @@
+"""
+Append-only log of /ask queries (JSONL, one object per line):
+
+    {"ts": 1760000000.0, "query": "...", "key": "<normalized>", "namespaces": ["sop"],
+     "latency_ms": 812.4, "cache": "miss", "outcome": "answered", "answer_hash": "9f2c..."}
+
+Requests only put the record on a bounded queue; a background thread writes
+it to the process's own file next to QUERY_LOG_PATH (logs/query_log.jsonl
+-> logs/query_log.<pid>.jsonl), rotated at QUERY_LOG_MAX_BYTES with
+QUERY_LOG_BACKUPS old files kept. One file per worker, because rotating a
+file other processes are appending to loses their records. When the writer
+falls behind, records are dropped (and counted) rather than slowing
+requests down.
+
+The startup warm-up reads all the workers' files back with `hot_queries`.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import re
+import threading
+import time
+from collections import Counter as TallyCounter
+from pathlib import Path
+from typing import Optional
+
+from backend.config import QUERY_LOG_BACKUPS, QUERY_LOG_MAX_BYTES, QUERY_LOG_PATH, QUERY_LOG_QUEUE_SIZE
+from backend.utils.metrics import Counter
+from backend.utils.query import normalize_query
+
+QUERY_LOG_RECORDS = Counter(
+    "ika_query_log_records_total",
+    "Query log records, by result (queued/dropped).",
+    labels=("result",),
+)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: a full queue drops the record."""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+            QUERY_LOG_RECORDS.inc(result="queued")
+        except queue.Full:
+            QUERY_LOG_RECORDS.inc(result="dropped")
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The message is already a JSON line; skip QueueHandler's formatting copy.
+        return record
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # Wait for room: the queue may be full of records still being written.
+        self.queue.put(self._sentinel)
+
+
+def worker_log_path(path: str | Path) -> Path:
+    """This process's file: logs/query_log.jsonl -> logs/query_log.<pid>.jsonl."""
+    path = Path(path)
+    return path.with_name(f"{path.stem}.{os.getpid()}{path.suffix}")
+
+
+def log_files(path: str | Path) -> list[Path]:
+    """Every file of the log at `path` (all workers', rotated ones included), oldest first."""
+    path = Path(path)
+    # query_log.jsonl (written before per-worker files), query_log.<pid>.jsonl, and their .1, .2, ... rotations
+    name = re.compile(rf"{re.escape(path.stem)}(\.\d+)?{re.escape(path.suffix)}(\.\d+)?")
+    files = [f for f in path.parent.glob(path.stem + ".*") if name.fullmatch(f.name) and f.is_file()]
+    return sorted(files, key=lambda f: f.stat().st_mtime_ns)
+
+
+class QueryLog:
+    def __init__(self, path: str | Path, *, max_bytes: int, backups: int, queue_size: int):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        file_handler = logging.handlers.RotatingFileHandler(
+            self.path, maxBytes=max_bytes, backupCount=backups, encoding="utf-8"
+        )
+        file_handler.setFormatter(logging.Formatter("%(message)s"))
+        records: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._listener = _Listener(records, file_handler)
+        self._listener.start()
+
+        self._logger = logging.Logger(f"ika.query_log.{id(self)}")
+        self._logger.addHandler(_DroppingQueueHandler(records))
+
+    def record(
+        self,
+        query: str,
+        *,
+        namespaces: list[str],
+        latency_ms: float,
+        cache: Optional[str],
+        outcome: str,
+        answer: Optional[str] = None,
+    ) -> None:
+        """Queue one record; never blocks."""
+        self._logger.info(
+            json.dumps({
+                "ts": round(time.time(), 3),
+                "query": query,
+                "key": normalize_query(query),
+                "namespaces": namespaces,
+                "latency_ms": round(latency_ms, 1),
+                "cache": cache,
+                "outcome": outcome,
+                "answer_hash": hashlib.sha256(answer.encode("utf-8")).hexdigest()[:16] if answer else None,
+            })
+        )
+
+    def close(self) -> None:
+        """Flush queued records to disk."""
+        self._listener.stop()
+
+
+_log: Optional[QueryLog] = None
+_log_lock = threading.Lock()
+
+
+def get_query_log() -> Optional[QueryLog]:
+    """The process-wide query log, or None when QUERY_LOG_PATH is empty."""
+    global _log
+    if _log is None and QUERY_LOG_PATH:
+        with _log_lock:
+            if _log is None:
+                _log = QueryLog(
+                    worker_log_path(QUERY_LOG_PATH),
+                    max_bytes=QUERY_LOG_MAX_BYTES,
+                    backups=QUERY_LOG_BACKUPS,
+                    queue_size=QUERY_LOG_QUEUE_SIZE,
+                )
+    return _log
+
+
+# -------------------------------------------------
+# READING
+# -------------------------------------------------
+def hot_queries(path: str | Path, top_n: int, outcomes: tuple[str, ...] = ("answered",)) -> list[str]:
+    """
+    The `top_n` most frequent queries in the log (every worker's file and
+    their rotated ones), counted by normalized query, among records with
+    one of `outcomes`. Each is returned as its most recent original wording.
+    """
+    counts: TallyCounter[str] = TallyCounter()
+    latest: dict[str, str] = {}
+    # Oldest first, so the latest wording wins.
+    for file in log_files(path):
+        with open(file, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue  # torn line from a crash mid-write
+                if row.get("outcome") not in outcomes or not row.get("key"):
+                    continue
+                counts[row["key"]] += 1
+                latest[row["key"]] = row["query"]
+    return [latest[key] for key, _ in counts.most_common(top_n)]
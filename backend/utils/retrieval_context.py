@@ -1,12 +1,84 @@
-# Stores the last retrieved chunks for citation purposes
+# Stores the last retrieved chunks for citation purposes.
+#
+# State is per request: `start_retrieval_context()` (called by /ask) installs
+# a fresh holder in the request's context. The agent runs its tool in copies
+# of that context, which share the holder, so the chunks the tool retrieved
+# are visible when the answer is assembled. Code outside a request (evals,
+# scripts) falls back to one process-wide holder.
 
-_LAST_RETRIEVED_CHUNKS: list[dict] = []
+from contextvars import ContextVar
+from typing import Optional
+
+
+class _RetrievalState:
+    def __init__(self):
+        self.chunks: list[dict] = []
+        self.prefetched: Optional[list[dict]] = None
+        self.context_tokens: int = 0
+        self.query_embedding: Optional[tuple[str, list[float]]] = None
+        self.namespace_registry: Optional[dict] = None
+
+
+_DEFAULT_STATE = _RetrievalState()
+_CURRENT_STATE: ContextVar[Optional[_RetrievalState]] = ContextVar("ika_retrieval_state", default=None)
+
+
+def _state() -> _RetrievalState:
+    return _CURRENT_STATE.get() or _DEFAULT_STATE
+
+
+def start_retrieval_context() -> None:
+    """Give the current request its own retrieved-chunk state."""
+    _CURRENT_STATE.set(_RetrievalState())
 
 
 def set_last_retrieved_chunks(chunks: list[dict]) -> None:
-    global _LAST_RETRIEVED_CHUNKS
-    _LAST_RETRIEVED_CHUNKS = chunks or []
+    _state().chunks = chunks or []
 
 
 def get_last_retrieved_chunks() -> list[dict]:
-    return _LAST_RETRIEVED_CHUNKS
+    return _state().chunks
+
+
+def set_prefetched_chunks(chunks: list[dict]) -> None:
+    """Chunks retrieved for the user's query before the agent runs, for its first tool call."""
+    _state().prefetched = chunks
+
+
+def take_prefetched_chunks() -> Optional[list[dict]]:
+    """The prefetched chunks, once (later tool calls retrieve for themselves), or None."""
+    state = _state()
+    chunks, state.prefetched = state.prefetched, None
+    return chunks
+
+
+def set_last_context_tokens(tokens: int) -> None:
+    _state().context_tokens = tokens
+
+
+def get_last_context_tokens() -> int:
+    """Token count of the context last packed into the agent prompt."""
+    return _state().context_tokens
+
+
+def set_query_embedding(query: str, embedding: list[float]) -> None:
+    """Remember the embedding of `query` so retrieval doesn't compute it again."""
+    _state().query_embedding = (query, embedding)
+
+
+def get_query_embedding(query: str) -> Optional[list[float]]:
+    """Embedding of `query` if it was already computed in this request."""
+    known = _state().query_embedding
+    return known[1] if known is not None and known[0] == query else None
+
+
+def set_namespace_registry(registry: dict) -> None:
+    """Pin the namespace registry state for the rest of the request (not outside one)."""
+    state = _CURRENT_STATE.get()
+    if state is not None:
+        state.namespace_registry = registry
+
+
+def get_namespace_registry() -> Optional[dict]:
+    """Namespace registry state pinned by this request, or None."""
+    return _state().namespace_registry
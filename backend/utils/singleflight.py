@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import contextvars
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one computation.
+
+    The first caller for a key submits `fn` to a worker pool; every caller
+    (including the first) then waits on the same future with its own timeout.
+    A caller that times out gives up, but the computation keeps running and
+    later callers for the same key still join it. Exceptions raised by `fn`
+    are re-raised in every waiting caller.
+    """
+
+    def __init__(self, max_workers: int = 16):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="singleflight")
+        self._inflight: dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key: str, fn: Callable[[], Any], timeout: float | None = None) -> tuple[Any, bool]:
+        """
+        Returns (result, shared). `shared` is True when this caller joined a
+        computation started by another request.
+        Raises concurrent.futures.TimeoutError after `timeout` seconds.
+        """
+
+        with self._lock:
+            self.calls += 1
+            future = self._inflight.get(key)
+            shared = future is not None
+            if shared:
+                self.coalesced += 1
+            else:
+                # Run in a copy of the caller's context so context-local state
+                # (e.g. the request trace) is visible inside `fn`.
+                ctx = contextvars.copy_context()
+                future = self._executor.submit(ctx.run, fn)
+                self._inflight[key] = future
+
+        if not shared:
+            # Registered outside the lock: the callback runs inline (and takes
+            # the lock) if `fn` has already finished.
+            future.add_done_callback(lambda f, k=key: self._forget(k, f))
+
+        return future.result(timeout=timeout), shared
+
+    def join(self, key: str, timeout: float | None = None) -> tuple[Any, bool] | None:
+        """
+        Like `do`, but only joins a computation already in flight: returns
+        None, without starting one, when there is none for `key`.
+        """
+
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is None:
+                return None
+            self.calls += 1
+            self.coalesced += 1
+
+        return future.result(timeout=timeout), True
+
+    def _forget(self, key: str, future: Future) -> None:
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def in_flight(self, key: str) -> bool:
+        with self._lock:
+            return key in self._inflight
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+            }
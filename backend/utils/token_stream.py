@@ -0,0 +1,21 @@
+# Forwards answer text to a streaming response while it is generated.
+#
+# /ask/stream installs a sink for the request; the agent's output filter
+# hands each piece of cleared answer text to it. Outside a streaming
+# request there is no sink and nothing is forwarded.
+
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+TokenSink = Callable[[str], None]
+
+_CURRENT_SINK: ContextVar[Optional[TokenSink]] = ContextVar("ika_token_sink", default=None)
+
+
+def start_token_stream(sink: TokenSink) -> None:
+    """Send the current request's answer text to `sink` as it is generated."""
+    _CURRENT_SINK.set(sink)
+
+
+def get_token_sink() -> Optional[TokenSink]:
+    return _CURRENT_SINK.get()
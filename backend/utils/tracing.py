@@ -0,0 +1,59 @@
+"""
+Lightweight per-request tracing.
+
+`span(stage)` times a block, feeds the stage latency histogram and, when a
+trace is active for the current request, appends the span to it so /ask can
+return a trace summary for debugging.
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from backend.utils.metrics import STAGE_LATENCY
+
+_CURRENT_TRACE: ContextVar[Optional[list[dict]]] = ContextVar("ika_trace", default=None)
+
+
+def start_trace() -> list[dict]:
+    """Start collecting spans for the current request and return the span list."""
+    trace: list[dict] = []
+    _CURRENT_TRACE.set(trace)
+    return trace
+
+
+def record_span(stage: str, seconds: float, namespace: str = "", **attrs) -> None:
+    STAGE_LATENCY.observe(seconds, stage=stage, namespace=namespace)
+
+    trace = _CURRENT_TRACE.get()
+    if trace is not None:
+        item = {"stage": stage, "ms": round(seconds * 1000, 2)}
+        if namespace:
+            item["namespace"] = namespace
+        item.update(attrs)
+        trace.append(item)
+
+
+@contextmanager
+def span(stage: str, namespace: str = "", **attrs) -> Iterator[dict]:
+    """
+    Time the enclosed block as `stage`.
+    The yielded dict can be used to attach extra attributes to the span.
+    """
+    extra = dict(attrs)
+    start = time.perf_counter()
+    try:
+        yield extra
+    finally:
+        record_span(stage, time.perf_counter() - start, namespace=namespace, **extra)
+
+
+def trace_summary(trace: list[dict]) -> dict:
+    """Spans in order plus total milliseconds per stage."""
+    totals: dict[str, float] = {}
+    for item in trace:
+        totals[item["stage"]] = round(totals.get(item["stage"], 0.0) + item["ms"], 2)
+    return {"spans": list(trace), "totals_ms": totals}
@@ -0,0 +1,74 @@
+"""
+Cache backend check: runs the same hit / miss / stale / expiry / claim
+sequence through the per-process cache and the shared Redis cache, the
+latter against `FakeRedis` (no Redis server or `redis` package needed).
+
+Exits non-zero when a backend answers differently from what the sequence
+expects, so it can gate CI.
+
+Usage:
+    python -m benchmarks.cache_backends
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+
+TTL_S = 0.2
+
+
+def check(name: str, cache) -> list[str]:
+    """Failed steps of the sequence (empty when the backend behaves)."""
+    shared = name == "redis"
+    failures = []
+
+    def expect(step: str, ok: bool) -> None:
+        print(f"  {step:<32}{'ok' if ok else 'FAILED'}")
+        if not ok:
+            failures.append(f"{name}: {step}")
+
+    expect("miss on an unknown key", cache.get("q") is None)
+    cache.set("q", {"answer": "42", "sources": ["sop"]})
+    cache.set("old", {"answer": "1"})
+    entry = cache.get("q")
+    expect("hit after set", entry is not None and entry.fresh and entry.value["answer"] == "42")
+    expect("contains_fresh", cache.contains_fresh("q"))
+
+    time.sleep(TTL_S * 1.5)
+    entry = cache.get("q")
+    expect("stale after the TTL", entry is not None and not entry.fresh)
+    expect("not contains_fresh when stale", not cache.contains_fresh("q"))
+
+    cache.delete("q")
+    expect("miss after delete", cache.get("q") is None)
+
+    expect("first claim", cache.claim("warmup", 1))
+    # Only a shared cache has anyone else to lose a claim to.
+    expect("second claim", cache.claim("warmup", 1) is not shared)
+    if shared:
+        time.sleep(1.1)
+        # Kept for ttl_s + stale_grace_s, rounded up to Redis' 1s.
+        expect("expired after TTL + grace", cache.get("old") is None)
+        expect("claim again once expired", cache.claim("warmup", 1))
+    return failures
+
+
+def main(argv: list[str]) -> int:
+    from backend.cache.backends import InMemoryCache, RedisCache
+    from benchmarks.fakes import FakeRedis
+
+    backends = {
+        "memory": InMemoryCache(max_entries=16, ttl_s=TTL_S, stale_grace_s=TTL_S * 10),
+        "redis": RedisCache(FakeRedis(), prefix="ika:check:", ttl_s=TTL_S, stale_grace_s=0),
+    }
+    failures = []
+    for name, cache in backends.items():
+        print(name)
+        failures += check(name, cache)
+    print("\nAll backends ok" if not failures else f"\nFailed: {', '.join(failures)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
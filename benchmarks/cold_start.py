@@ -0,0 +1,193 @@
+"""
+Cold-start benchmark for the backend process.
+
+1. Import profile: runs `python -X importtime -c "import backend.app"` in
+   fresh interpreters and reports the median import time, the heaviest
+   top-level imports, and any heavy module that the serving path is supposed
+   to defer (LangChain, the OpenAI SDK, pandas, ...) but imported anyway.
+2. Time-to-first-200: starts `uvicorn backend.app:app` as a subprocess
+   against the local provider stand-ins (see `benchmarks/fakes.py`) and
+   measures spawn -> first 200 from /metrics (port open) and from /ask.
+
+Exits non-zero when a threshold is exceeded, so it can gate CI.
+
+Usage:
+    python -m benchmarks.cold_start
+    python -m benchmarks.cold_start --runs 7 --max-import-ms 1000 --max-first-ask-ms 6000 --json cold.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.fakes import FakeProviderServer
+from benchmarks.load_test import _free_port
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Must not be imported by `import backend.app`; they load lazily or never.
+DEFERRED_MODULES = (
+    "langchain_openai",
+    "langgraph",
+    "langchain.agents",
+    "openai",
+    "pinecone",
+    "tiktoken",
+    "numpy",
+    "pandas",
+    "docx",
+    "openpyxl",
+    "pypdf",
+    "redis",
+)
+
+OFFLINE_ENV = {
+    "OPENAI_API_KEY": "sk-offline",
+    "GROQ_API_KEY": "gsk-offline",
+    "VECTOR_STORE": "memory",
+    # Measure a cold process: no query log or FAQ file to load at startup.
+    "QUERY_LOG_PATH": "",
+    "FAQ_FILE": "",
+    # The index is seeded under the plain namespace names.
+    "NAMESPACE_REGISTRY": "",
+}
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int, int]]:
+    """`-X importtime` lines -> [(module, depth, self_us, cumulative_us)]."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line.split(":", 1)[1].split("|", 2)
+        # Nesting is shown as two spaces per level after the leading one.
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((name.strip(), depth, int(self_us), int(cumulative)))
+    return rows
+
+
+def import_profile(module: str = "backend.app", runs: int = 5) -> dict:
+    env = {**os.environ, **OFFLINE_ENV}
+    totals, rows = [], []
+    for _ in range(runs):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+        )
+        rows = parse_importtime(proc.stderr)
+        totals.append(next(cum for name, depth, _, cum in rows if name == module and depth == 0) / 1000)
+
+    # A module's imports are listed before it; its direct children are the
+    # depth-1 rows since the previous top-level row (interpreter startup).
+    end = next(i for i, (name, depth, *_) in enumerate(rows) if name == module and depth == 0)
+    start = max((i for i in range(end) if rows[i][1] == 0), default=-1) + 1
+    imported = {name for name, *_ in rows[start:end]}
+    top = sorted((r for r in rows[start:end] if r[1] == 1), key=lambda r: r[3], reverse=True)[:12]
+    return {
+        "module": module,
+        "runs": runs,
+        "import_ms": {"median": round(statistics.median(totals), 1), "min": round(min(totals), 1)},
+        "heaviest": [{"module": name, "cumulative_ms": round(cum / 1000, 1)} for name, _, _, cum in top],
+        "unexpected_imports": [m for m in DEFERRED_MODULES if m in imported],
+    }
+
+
+def _wait_for(fn, timeout_s: float, interval_s: float = 0.01):
+    deadline = time.perf_counter() + timeout_s
+    while time.perf_counter() < deadline:
+        try:
+            result = fn()
+            if result is not None:
+                return result
+        except Exception:
+            pass
+        time.sleep(interval_s)
+    raise TimeoutError("server did not answer in time")
+
+
+def time_to_first_200(timeout_s: float = 60.0) -> dict:
+    import httpx
+
+    openai_srv = FakeProviderServer("openai").start()
+    groq_srv = FakeProviderServer("groq").start()
+    port = _free_port()
+    env = {
+        **os.environ,
+        **OFFLINE_ENV,
+        "OPENAI_API_BASE": openai_srv.base_url,
+        "GROQ_API_BASE": groq_srv.base_url,
+    }
+    url = f"http://127.0.0.1:{port}"
+
+    spawned = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.app:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        with httpx.Client(base_url=url, timeout=timeout_s) as client:
+            _wait_for(lambda: client.get("/metrics").status_code == 200 or None, timeout_s)
+            port_open = time.perf_counter()
+            res = client.post("/ask", json={"query": "What checks should I do before raising a PR?"})
+            first_ask = time.perf_counter()
+            status = res.status_code
+    finally:
+        proc.terminate()
+        proc.wait(timeout=10)
+        openai_srv.stop()
+        groq_srv.stop()
+
+    return {
+        "first_metrics_ms": round((port_open - spawned) * 1000, 1),
+        "first_ask_ms": round((first_ask - spawned) * 1000, 1),
+        "first_ask_status": status,
+    }
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Import-time profile and time-to-first-200 for the backend")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, default=1500.0, help="Fail above this median import time")
+    parser.add_argument("--max-first-ask-ms", type=float, default=8000.0, help="Fail above this spawn -> first /ask 200")
+    parser.add_argument("--skip-server", action="store_true", help="Only run the import profile")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    failures = []
+    report = {"imports": import_profile(runs=args.runs)}
+    imports = report["imports"]
+    print(f"import backend.app: median {imports['import_ms']['median']}ms (min {imports['import_ms']['min']}ms, {args.runs} runs)")
+    for item in imports["heaviest"]:
+        print(f"  {item['cumulative_ms']:>8.1f}ms  {item['module']}")
+    if imports["import_ms"]["median"] > args.max_import_ms:
+        failures.append(f"import time {imports['import_ms']['median']}ms > {args.max_import_ms}ms")
+    if imports["unexpected_imports"]:
+        failures.append(f"serving path imports deferred modules: {', '.join(imports['unexpected_imports'])}")
+
+    if not args.skip_server:
+        first = report["first_200"] = time_to_first_200()
+        print(
+            f"\nspawn -> first /metrics 200: {first['first_metrics_ms']}ms, "
+            f"first /ask {first['first_ask_status']}: {first['first_ask_ms']}ms"
+        )
+        if first["first_ask_status"] != 200:
+            failures.append(f"first /ask returned {first['first_ask_status']}")
+        elif first["first_ask_ms"] > args.max_first_ask_ms:
+            failures.append(f"time to first /ask 200 {first['first_ask_ms']}ms > {args.max_first_ask_ms}ms")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,406 @@
+"""
+Local stand-ins for the external services used by the backend.
+
+- `FakeProviderServer`: OpenAI-compatible HTTP server (`/embeddings`,
+  `/chat/completions`) with configurable latency. In "openai" mode the chat
+  endpoint plays the agent LLM (first turn calls the retriever tool, second
+  turn answers from the tool output); in "groq" mode it plays Prompt Guard 2.
+- `hash_embedding`: deterministic bag-of-words vectors, so retrieval finds
+  the chunks that share words with the query without any API call.
+- `load_corpus` / `seed_index`: fill the in-memory index (`VECTOR_STORE=memory`)
+  with the chunks the real ingesters build from `data/`.
+- `write_vocabulary`: the query filter vocabulary ingestion would write for it.
+- `FakeRedis`: in-process stand-in for the redis-py client behind the shared
+  answer cache (`RESPONSE_CACHE_BACKEND=redis`).
+
+Everything here is stdlib + numpy so it runs with no network.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import numpy as np
+
+EMBEDDING_DIM = 1536
+_TOKEN = re.compile(r"\w+")
+
+
+# -------------------------------------------------
+# DETERMINISTIC EMBEDDINGS
+# -------------------------------------------------
+def hash_embedding(text: str, dim: int = EMBEDDING_DIM, bias: float = 1.0) -> list[float]:
+    """
+    Hashed bag-of-words embedding (unit length).
+
+    Component 0 is a constant `bias` shared by every vector. It lifts cosine
+    scores into the range real embeddings produce (unrelated texts ~0.5), so
+    the retriever's MIN_ABSOLUTE_SCORE / RELATIVE_DROP thresholds behave the
+    way they do in production.
+    """
+
+    vec = np.zeros(dim, dtype=np.float32)
+    tokens = _TOKEN.findall((text or "").lower())
+    for tok in tokens:
+        h = int.from_bytes(hashlib.blake2b(tok.encode("utf-8"), digest_size=8).digest(), "little")
+        vec[1 + h % (dim - 1)] += 1.0 if (h >> 63) & 1 else -1.0
+
+    norm = float(np.linalg.norm(vec))
+    if norm > 0:
+        vec /= norm
+    vec[0] = bias
+    vec /= float(np.linalg.norm(vec))
+    return vec.tolist()
+
+
+# -------------------------------------------------
+# FAKE OPENAI / GROQ SERVER
+# -------------------------------------------------
+def _answer_from_context(context: str) -> str:
+    """Build a short bullet answer from the tool output, like the real agent would."""
+    if not context or "NO_CONTEXT" in context:
+        return "I don't know based on the available knowledge base."
+
+    lines = []
+    for line in context.splitlines():
+        line = line.strip()
+        if not line or line.startswith(("Source:", "Document Type:")):
+            continue
+        lines.append(f"- {line.lstrip('- ')}")
+        if len(lines) >= 4:
+            break
+    return "\n".join(lines) or "I don't know based on the available knowledge base."
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeProviderServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):  # keep benchmark output clean
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+            return
+        self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        self.server.record(self.path)
+
+        if self.path.endswith("/embeddings"):
+            time.sleep(self.server.embed_latency_s)
+            inputs = body.get("input") or []
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            data = [
+                {"object": "embedding", "index": i, "embedding": hash_embedding(t, dim=self.server.dim)}
+                for i, t in enumerate(inputs)
+            ]
+            tokens = sum(len(_TOKEN.findall(t)) for t in inputs)
+            self._send_json(200, {
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "fake-embedding"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+            return
+
+        if self.path.endswith("/chat/completions"):
+            time.sleep(self.server.chat_latency_s)
+            message, finish = self._chat_reply(body)
+            if body.get("stream"):
+                self._stream_chat(body, message, finish)
+            else:
+                self._send_json(200, self._completion(body, message, finish))
+            return
+
+        self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def _chat_reply(self, body: dict) -> tuple[dict, str]:
+        messages = body.get("messages") or []
+
+        if self.server.mode == "groq":
+            # Prompt Guard 2 answers with the probability that the prompt is malicious.
+            return {"role": "assistant", "content": self.server.guard_verdict}, "stop"
+
+        tool_outputs = [m.get("content") or "" for m in messages if m.get("role") == "tool"]
+        tools = body.get("tools") or []
+        if tools and not tool_outputs:
+            user = next((m.get("content") for m in reversed(messages) if m.get("role") == "user"), "")
+            name = tools[0].get("function", {}).get("name", "internal_knowledge_retriever")
+            return {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [{
+                    "id": f"call_{uuid.uuid4().hex[:12]}",
+                    "type": "function",
+                    "function": {"name": name, "arguments": json.dumps({"query": user})},
+                }],
+            }, "tool_calls"
+
+        context = tool_outputs[-1] if tool_outputs else (messages[-1].get("content") if messages else "")
+        answer = _answer_from_context(str(context))
+        return {"role": "assistant", "content": self.server.answer_prefix + answer}, "stop"
+
+    def _completion(self, body: dict, message: dict, finish: str) -> dict:
+        prompt_tokens = sum(len(_TOKEN.findall(str(m.get("content") or ""))) for m in body.get("messages") or [])
+        completion_tokens = len(_TOKEN.findall(str(message.get("content") or "")))
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-chat"),
+            "choices": [{"index": 0, "message": message, "finish_reason": finish}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    def _stream_chat(self, body: dict, message: dict, finish: str) -> None:
+        """Server-sent events in the OpenAI streaming format, a few words per chunk."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        cid = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        base = {"id": cid, "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model", "fake-chat")}
+
+        def emit(delta: dict, finish_reason=None, **extra) -> None:
+            payload = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": finish_reason}], **extra)
+            data = f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+
+        try:
+            if message.get("tool_calls"):
+                call = message["tool_calls"][0]
+                emit({"role": "assistant", "tool_calls": [dict(call, index=0)]})
+            else:
+                words = re.split(r"(\s+)", message.get("content") or "")
+                emit({"role": "assistant", "content": ""})
+                for i in range(0, len(words), 6):
+                    time.sleep(self.server.token_latency_s)
+                    emit({"content": "".join(words[i : i + 6])})
+            emit({}, finish)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                emit_usage = self._completion(body, message, finish)["usage"]
+                payload = dict(base, choices=[], usage=emit_usage)
+                data = f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            done = b"data: [DONE]\n\n"
+            self.wfile.write(f"{len(done):x}\r\n".encode("ascii") + done + b"\r\n0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # Client cancelled the stream (e.g. the output filter aborted it).
+            self.server.record("cancelled")
+
+
+class FakeProviderServer(ThreadingHTTPServer):
+    """OpenAI-compatible stub server running on a background thread."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        mode: str = "openai",
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        chat_latency_ms: float = 0.0,
+        embed_latency_ms: float = 0.0,
+        token_latency_ms: float = 0.0,
+        guard_verdict: str = "0.0009",
+        answer_prefix: str = "",
+        dim: int = EMBEDDING_DIM,
+    ):
+        super().__init__((host, port), _Handler)
+        self.mode = mode
+        self.chat_latency_s = chat_latency_ms / 1000.0
+        self.embed_latency_s = embed_latency_ms / 1000.0
+        self.token_latency_s = token_latency_ms / 1000.0
+        self.guard_verdict = guard_verdict
+        # Prepended to every final answer, e.g. "I think " to trip the output filter.
+        self.answer_prefix = answer_prefix
+        self.dim = dim
+        self.calls: dict[str, int] = {}
+        self._calls_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def record(self, path: str) -> None:
+        with self._calls_lock:
+            self.calls[path] = self.calls.get(path, 0) + 1
+
+    def start(self) -> "FakeProviderServer":
+        self._thread = threading.Thread(target=self.serve_forever, name=f"fake-{self.mode}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+# -------------------------------------------------
+# CORPUS + INDEX SEEDING
+# -------------------------------------------------
+_FALLBACK_CORPUS = {
+    "pr_review": [
+        "Document Type: PR Review Checklist\nChecklist Group 1:\n- Variable names should follow the camelCase convention.\n- Maintain an indentation of 4 spaces.",
+        "Document Type: PR Review Checklist\nChecklist Group 2:\n- Include the latest execution results with every PR.\n- Retest affected workflows.",
+    ],
+    "sop": [
+        "Document Type: SOP / Guidelines\nSection: Raise Pull Request (PR) for Validation\nOnce the script is complete, raise a Pull Request for review.",
+        "Document Type: SOP / Guidelines\nSection: Ticket Assignment\nCheck Freshdesk for assigned tickets and review the ticket priority.",
+    ],
+    "validation": [
+        "Document Type: Validation Checklist\nSheet: Verifying Report\nRow: 2\nStep: Verify the report header, filters and totals.",
+    ],
+    "locators": [
+        "Document Type: UI Locator Reference\nSheet: Common_Locators\nLocator Name: login button\nCode Snippet: //button[@id='login']",
+        "Document Type: UI Locator Reference\nSheet: Common_Locators\nLocator Name: submit button\nCode Snippet: //button[@type='submit']",
+    ],
+    "company_profile": [
+        "Document Type: SOP / Guidelines\nSection: Spotline Company Overview\nSpotline helps organizations with AI-powered automation.",
+    ],
+}
+
+
+def load_corpus(data_dir: str | Path = "data") -> dict[str, list[dict]]:
+    """
+    Chunks per namespace, built by the real ingestion builders from `data/`.
+    Falls back to a small built-in corpus when pandas / python-docx are missing.
+
+    Each record is `{"id", "text", "metadata"}` with the same metadata layout
+    the ingesters upsert.
+    """
+
+    from backend.config import (
+        NAMESPACE_COMPANY,
+        NAMESPACE_LOCATORS,
+        NAMESPACE_PR_REVIEW,
+        NAMESPACE_SOP,
+        NAMESPACE_VALIDATION,
+    )
+
+    data = Path(data_dir)
+    corpus: dict[str, list[dict]] = {}
+
+    def add(namespace: str, prefix: str, chunks: list, extra=lambda c: {}) -> None:
+        records = []
+        for i, c in enumerate(chunks):
+            meta = {"text": c.text, "source": c.source, "page": c.page, **extra(c)}
+            meta = {k: v for k, v in meta.items() if v is not None and v != ""}
+            records.append({"id": f"{prefix}::{Path(c.source).name}::{i}", "text": c.text, "metadata": meta})
+        corpus[namespace] = records
+
+    try:
+        from backend.rag.ingestion.common_keyword_locator_ingest import build_locator_chunks
+        from backend.rag.ingestion.pr_review_ingest import build_pr_review_chunks
+        from backend.rag.ingestion.sop_ingest import build_sop_chunks
+        from backend.rag.ingestion.validation_checklist_ingest import build_validation_chunks
+
+        add(NAMESPACE_LOCATORS, "locators",
+            build_locator_chunks(data / "common_keywords_locators" / "SAF_Common_Keywords_Locators_v1.0.xlsx"),
+            lambda c: {"locator": c.locator_name, "keyword": c.keyword})
+        add(NAMESPACE_VALIDATION, "validation",
+            build_validation_chunks(data / "validation_checklist" / "Report Verification Checklist.xlsx"),
+            lambda c: {"module": c.module, "rule": c.rule})
+        add(NAMESPACE_PR_REVIEW, "pr_review", build_pr_review_chunks(data / "pr_review" / "PR Review Checklist.docx"))
+        add(NAMESPACE_SOP, "sop", build_sop_chunks(data / "guidelines" / "Standard Operating procedure.docx"))
+        add(NAMESPACE_COMPANY, "sop", build_sop_chunks(data / "company" / "spotline_profile.docx"))
+    except Exception:
+        corpus = {
+            ns: [
+                {"id": f"{ns}::fallback::{i}", "text": t, "metadata": {"text": t, "source": f"data/{ns}", "page": str(i + 1)}}
+                for i, t in enumerate(texts)
+            ]
+            for ns, texts in _FALLBACK_CORPUS.items()
+        }
+
+    return corpus
+
+
+def seed_index(index, corpus: dict[str, list[dict]], embed=hash_embedding) -> int:
+    """Upsert the corpus into `index` using `embed` for the vectors."""
+    total = 0
+    for namespace, records in corpus.items():
+        vectors = [(r["id"], embed(r["text"]), r["metadata"]) for r in records]
+        if vectors:
+            index.upsert(vectors=vectors, namespace=namespace)
+        total += len(vectors)
+    return total
+
+
+def write_vocabulary(corpus: dict[str, list[dict]], path: str | Path) -> dict:
+    """Write the query filter vocabulary (QUERY_VOCAB_FILE) for the corpus."""
+    from backend.rag.query_analyzer import VocabularyWriter
+
+    writer = VocabularyWriter()
+    for namespace, records in corpus.items():
+        writer.add([(r["id"], [], r["metadata"]) for r in records], namespace=namespace)
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    return writer.write(path)
+
+
+# -------------------------------------------------
+# REDIS
+# -------------------------------------------------
+class FakeRedis:
+    """
+    The part of redis-py's client `RedisCache` uses: `get`, `set(ex=, nx=)`
+    and `delete`, with key expiry, in process memory.
+    """
+
+    def __init__(self):
+        self._data: dict[str, tuple[bytes, float]] = {}  # key -> (value, expires at)
+        self._lock = threading.Lock()
+
+    def _live(self, key: str):
+        item = self._data.get(key)
+        if item is not None and item[1] <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    def get(self, key: str):
+        with self._lock:
+            item = self._live(key)
+            return item[0] if item is not None else None
+
+    def set(self, key: str, value, ex=None, nx: bool = False):
+        with self._lock:
+            if nx and self._live(key) is not None:
+                return None
+            data = value if isinstance(value, bytes) else str(value).encode("utf-8")
+            self._data[key] = (data, time.monotonic() + ex if ex else float("inf"))
+            return True
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(key, None) is not None for key in keys)
@@ -0,0 +1,351 @@
+"""
+Offline load test for /ask.
+
+Boots `backend.app` in-process (uvicorn on a local port) against local
+stand-ins for OpenAI, Groq and Pinecone (see `benchmarks/fakes.py`), then
+drives it with a configurable query mix and concurrency. No network or API
+keys needed.
+
+Reports throughput, error rate, end-to-end latency percentiles and
+per-stage percentiles (taken from the `X-Debug-Trace` trace summary).
+
+Usage:
+    python -m benchmarks.load_test --requests 500 --concurrency 16
+    python -m benchmarks.load_test --mix benchmarks/query_mix.jsonl --chat-latency-ms 800 --json out.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from benchmarks.fakes import FakeProviderServer, load_corpus, seed_index, write_vocabulary
+
+DEFAULT_MIX = [
+    {"query": "What checks should I do before raising a PR?", "weight": 4},
+    {"query": "How to verify a report?", "weight": 3},
+    {"query": "Locator for the login button?", "weight": 3},
+    {"query": "What is the ticket assignment procedure in the SOP?", "weight": 2},
+    {"query": "What does Spotline do?", "weight": 1},
+    {"query": "What are the validation rules for report totals?", "weight": 1},
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile (0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def load_mix(path: str | None) -> list[dict]:
+    """Query mix from a JSONL file of `{"query": ..., "weight": ...}` lines."""
+    if not path:
+        return DEFAULT_MIX
+    mix = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        line = line.strip()
+        if line:
+            item = json.loads(line)
+            mix.append({"query": item["query"], "weight": float(item.get("weight", 1))})
+    return mix
+
+
+def start_stack(args) -> tuple[str, list]:
+    """Start the fake providers and the app. Returns (ask_url, things_to_stop)."""
+
+    openai_srv = FakeProviderServer(
+        "openai",
+        chat_latency_ms=args.chat_latency_ms,
+        embed_latency_ms=args.embed_latency_ms,
+        token_latency_ms=args.token_latency_ms,
+    ).start()
+    groq_srv = FakeProviderServer("groq", chat_latency_ms=args.guard_latency_ms).start()
+
+    # Config is read at import time, so the environment must be set before
+    # anything under `backend` is imported.
+    os.environ.update({
+        "OPENAI_API_KEY": "sk-offline",
+        "OPENAI_API_BASE": openai_srv.base_url,
+        "GROQ_API_KEY": "gsk-offline",
+        "GROQ_API_BASE": groq_srv.base_url,
+        "VECTOR_STORE": "memory",
+        "QUERY_VOCAB_FILE": str(Path(__file__).with_name(".cache") / "query_vocab.json"),
+        "QUERY_LOG_PATH": str(Path(__file__).with_name(".cache") / "query_log.jsonl"),
+        "FAQ_FILE": str(Path(__file__).with_name(".cache") / "faq.json"),
+        # The index is seeded under the plain namespace names.
+        "NAMESPACE_REGISTRY": "",
+        # Replay the previous runs' hot queries at startup only when asked.
+        "WARMUP_TOP_N": os.environ.get("WARMUP_TOP_N", "20") if args.warmup else "0",
+    })
+    if args.no_response_cache:
+        os.environ["RESPONSE_CACHE_TTL_S"] = "0"
+
+    from backend.rag.pinecone_client import get_index
+
+    corpus = load_corpus(args.data_dir)
+    write_vocabulary(corpus, os.environ["QUERY_VOCAB_FILE"])
+    n = seed_index(get_index(), corpus)
+    print(f"Seeded in-memory index with {n} vectors")
+
+    faq_file = Path(os.environ["FAQ_FILE"])
+    faq_file.unlink(missing_ok=True)
+    if args.faq:
+        from backend.cache.faq import build_faq
+
+        outcomes = build_faq([m["query"] for m in load_mix(args.mix)], faq_file)
+        print(f"FAQ tier: {sum(o == 'ok' for o in outcomes.values())} of {len(outcomes)} mix queries precomputed")
+
+    import uvicorn
+    from backend.app import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False))
+    thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.02)
+
+    return f"http://127.0.0.1:{port}", [openai_srv, groq_srv, server]
+
+
+def _scrape_metrics(client) -> list[tuple[str, dict[str, str], float]]:
+    """(name, labels, value) for every sample on the app's /metrics page."""
+    samples = []
+    for line in client.get("/metrics").text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        series, value = line.rsplit(" ", 1)
+        name, _, labels = series.partition("{")
+        pairs = (item.split("=", 1) for item in labels.rstrip("}").split(",") if "=" in item)
+        samples.append((name, {k: v.strip('"') for k, v in pairs}, float(value)))
+    return samples
+
+
+def _connections_opened(samples) -> dict[str, float]:
+    """Outbound connections the app opened per provider pool."""
+    return {
+        labels["client"]: value
+        for name, labels, value in samples
+        if name == "ika_http_connections_opened_total"
+    }
+
+
+def _prompt_guard_report(samples) -> dict:
+    """
+    Share of prompt-guard verdicts that skipped the Groq call (local
+    pre-filter or verdict cache) and the latency that saved, estimated from
+    the mean time of the calls that were made.
+    """
+    by_source: dict[str, float] = {}
+    remote = {"sum": 0.0, "count": 0.0}
+    for name, labels, value in samples:
+        if name == "ika_prompt_guard_verdicts_total":
+            by_source[labels["source"]] = by_source.get(labels["source"], 0) + value
+        elif name in ("ika_stage_latency_seconds_sum", "ika_stage_latency_seconds_count"):
+            if labels.get("stage") == "prompt_guard_remote":
+                remote[name.rsplit("_", 1)[1]] += value
+
+    total = sum(by_source.values())
+    skipped = total - by_source.get("remote", 0)
+    mean_ms = remote["sum"] / remote["count"] * 1000 if remote["count"] else None
+    return {
+        "verdicts": {k: int(v) for k, v in sorted(by_source.items())},
+        "skipped_share": round(skipped / total, 4) if total else 0.0,
+        "remote_mean_ms": round(mean_ms, 2) if mean_ms is not None else None,
+        "saved_ms_est": round(skipped * mean_ms, 1) if mean_ms is not None else None,
+    }
+
+
+def report_warmup(base_url: str, timeout: float) -> float:
+    """Wait for /ready (startup cache warm-up) and print how long it took."""
+    import httpx
+
+    start = time.perf_counter()
+    with httpx.Client(base_url=base_url, timeout=5) as client:
+        while client.get("/ready").status_code != 200:
+            if time.perf_counter() - start > timeout:
+                raise RuntimeError(f"/ready not 200 after {timeout}s")
+            time.sleep(0.05)
+        warmed = sum(v for name, _, v in _scrape_metrics(client) if name == "ika_warmup_queries_total")
+    elapsed = time.perf_counter() - start
+    print(f"Warm-up: {int(warmed)} hot queries replayed, ready after {elapsed:.2f}s")
+    return elapsed
+
+
+def run_load(
+    base_url: str,
+    mix: list[dict],
+    *,
+    requests: int,
+    concurrency: int,
+    seed: int,
+    timeout: float,
+    clients: int = 0,
+) -> dict:
+    import httpx
+
+    rng = random.Random(seed)
+    queries = rng.choices([m["query"] for m in mix], weights=[m["weight"] for m in mix], k=requests)
+
+    latencies: list[float] = []
+    stages: dict[str, list[float]] = {}
+    statuses: dict[str, int] = {}
+    cache: dict[str, int] = {}
+    degraded: dict[str, int] = {}
+    lock = threading.Lock()
+
+    client = httpx.Client(
+        base_url=base_url,
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        headers={"X-Debug-Trace": "1"},
+    )
+
+    def one(job: tuple[int, str]) -> None:
+        i, query = job
+        # Spread requests over `clients` simulated users (default: one per request).
+        headers = {"X-Client-Id": f"bench-{i % clients if clients else i}"}
+        start = time.perf_counter()
+        try:
+            res = client.post("/ask", json={"query": query}, headers=headers)
+            status = str(res.status_code)
+            body = res.json() if res.status_code == 200 else {}
+        except Exception as exc:
+            status = type(exc).__name__
+            body = {}
+        elapsed = (time.perf_counter() - start) * 1000
+
+        with lock:
+            statuses[status] = statuses.get(status, 0) + 1
+            if status != "200":
+                return
+            latencies.append(elapsed)
+            cache_status = res.headers.get("X-Cache", "none")
+            cache[cache_status] = cache.get(cache_status, 0) + 1
+            for reason in filter(None, res.headers.get("X-Degraded", "").split(",")):
+                degraded[reason] = degraded.get(reason, 0) + 1
+            for item in (body.get("trace") or {}).get("spans", []):
+                name = item["stage"] + (f"[{item['namespace']}]" if item.get("namespace") else "")
+                stages.setdefault(name, []).append(item["ms"])
+
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, enumerate(queries)))
+    wall = time.perf_counter() - wall_start
+    samples = _scrape_metrics(client)
+    client.close()
+
+    errors = sum(n for s, n in statuses.items() if s != "200")
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(requests / wall, 2) if wall > 0 else 0.0,
+        "error_rate": round(errors / requests, 4) if requests else 0.0,
+        "statuses": statuses,
+        "cache": cache,
+        "degraded": degraded,
+        "connections_opened": _connections_opened(samples),
+        "prompt_guard": _prompt_guard_report(samples),
+        "latency_ms": {p: round(percentile(latencies, v), 2) for p, v in (("p50", 50), ("p95", 95), ("p99", 99))},
+        "stages_ms": {
+            name: {
+                "count": len(vals),
+                "p50": round(percentile(vals, 50), 2),
+                "p95": round(percentile(vals, 95), 2),
+                "p99": round(percentile(vals, 99), 2),
+            }
+            for name, vals in sorted(stages.items())
+        },
+    }
+
+
+def print_report(report: dict) -> None:
+    print(f"\nRequests: {report['requests']}  concurrency: {report['concurrency']}  wall: {report['wall_s']}s")
+    print(f"Throughput: {report['throughput_rps']} req/s  error rate: {report['error_rate']:.2%}")
+    print(f"Statuses: {report['statuses']}  cache: {report['cache']}  degraded: {report['degraded']}")
+    print(f"Outbound connections opened: {report['connections_opened']}")
+    guard = report["prompt_guard"]
+    line = f"Prompt guard: {guard['verdicts']}  skipped Groq: {guard['skipped_share']:.1%}"
+    if guard["remote_mean_ms"] is not None:
+        line += f"  remote mean: {guard['remote_mean_ms']}ms  saved ~{guard['saved_ms_est']}ms"
+    print(line)
+    lat = report["latency_ms"]
+    print(f"End-to-end latency ms: p50={lat['p50']} p95={lat['p95']} p99={lat['p99']}")
+    print(f"\n{'stage':<34}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}")
+    for name, s in report["stages_ms"].items():
+        print(f"{name:<34}{s['count']:>8}{s['p50']:>10}{s['p95']:>10}{s['p99']:>10}")
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Offline load test for /ask against local provider stubs")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--mix", default=None, help="JSONL query mix ({query, weight} per line)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--clients", type=int, default=0, help="Simulated client ids (0 = one per request)")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--chat-latency-ms", type=float, default=300.0)
+    parser.add_argument("--token-latency-ms", type=float, default=0.0)
+    parser.add_argument("--embed-latency-ms", type=float, default=40.0)
+    parser.add_argument("--guard-latency-ms", type=float, default=80.0)
+    parser.add_argument("--no-response-cache", action="store_true", help="Make every response-cache lookup miss")
+    parser.add_argument(
+        "--warmup",
+        action="store_true",
+        help="Replay the hottest queries logged by earlier runs at startup and wait for /ready",
+    )
+    parser.add_argument(
+        "--faq",
+        action="store_true",
+        help="Precompute FAQ answers for the mix's queries before the load starts",
+    )
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    base_url, running = start_stack(args)
+    try:
+        if args.warmup:
+            report_warmup(base_url, args.timeout)
+        report = run_load(
+            base_url,
+            load_mix(args.mix),
+            requests=args.requests,
+            concurrency=args.concurrency,
+            seed=args.seed,
+            timeout=args.timeout,
+            clients=args.clients,
+        )
+    finally:
+        for item in running:
+            if hasattr(item, "should_exit"):
+                item.should_exit = True
+            else:
+                item.stop()
+
+    print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0 if report["error_rate"] == 0 else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,144 @@
+"""
+Vector metadata layout benchmark: chunk text in the metadata ("full", the
+old layout) vs. only its hash, with the text in the local docstore ("slim").
+
+Seeds the in-memory index with the chunks from `data/` in each layout and,
+for every golden question, reports:
+
+- metadata bytes per vector (mean / max; Pinecone caps it at 40 KB),
+- query response bytes: the matches JSON the retriever's namespace queries
+  get back (top_k per routed namespace), its decode time, and the transfer
+  time that would add at `--link-mbps`,
+- `retrieve_chunks` latency, including docstore hydration for "slim",
+
+and checks both layouts return the same chunks and texts.
+
+Usage:
+    python -m benchmarks.metadata_layout
+    python -m benchmarks.metadata_layout --link-mbps 50 --json layout.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.fakes import hash_embedding, load_corpus, seed_index
+from benchmarks.load_test import percentile
+from benchmarks.retrieval_eval import CACHE_DIR, GOLDEN_SET, load_golden
+
+
+def _response_json(index, vector: list[float], namespaces: list[str], top_k: int) -> list[str]:
+    """Query responses as Pinecone would serialize them (matches with metadata)."""
+    bodies = []
+    for ns in namespaces:
+        res = index.query(vector=vector, top_k=top_k, namespace=ns, include_metadata=True)
+        bodies.append(json.dumps({
+            "namespace": ns,
+            "matches": [{"id": m.id, "score": m.score, "metadata": m.metadata} for m in res.matches],
+        }))
+    return bodies
+
+
+def measure(golden: list[dict], corpus: dict[str, list[dict]], link_mbps: float) -> dict:
+    from backend.config import ALL_NAMESPACES, TOP_K
+    from backend.rag.namespace_router import pick_namespaces
+    from backend.rag.pinecone_client import get_query_index
+    from backend.rag.retriever import retrieve_chunks
+
+    index = get_query_index()
+    metadata_bytes = [
+        len(json.dumps(v.metadata))
+        for ns in corpus
+        for page in index.list(namespace=ns)
+        for v in index.fetch([item.id for item in page.vectors], namespace=ns).vectors.values()
+    ]
+
+    response_bytes, decode_ms, latencies, results = [], [], [], []
+    for item in golden:
+        vector = hash_embedding(item["question"])
+        bodies = _response_json(index, vector, pick_namespaces(item["question"], ALL_NAMESPACES), TOP_K)
+        response_bytes.append(sum(len(b) for b in bodies))
+        start = time.perf_counter()
+        for body in bodies:
+            json.loads(body)
+        decode_ms.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        chunks = retrieve_chunks(item["question"], embedding=vector)
+        latencies.append((time.perf_counter() - start) * 1000)
+        results.append([(c["id"], c["text"]) for c in chunks])
+
+    n = len(golden)
+    mean_bytes = sum(response_bytes) / n
+    return {
+        "metadata_bytes": {"mean": round(sum(metadata_bytes) / len(metadata_bytes)), "max": max(metadata_bytes)},
+        "response_bytes": {"mean": round(mean_bytes), "max": max(response_bytes)},
+        "decode_ms": round(sum(decode_ms) / n, 3),
+        "transfer_ms_est": round(mean_bytes * 8 / (link_mbps * 1e6) * 1000, 3),
+        "retrieve_ms": {"p50": round(percentile(latencies, 50), 3), "p95": round(percentile(latencies, 95), 3)},
+        "results": results,
+    }
+
+
+def _print_summary(label: str, report: dict) -> None:
+    print(
+        f"{label:<5} metadata/vector mean={report['metadata_bytes']['mean']}B max={report['metadata_bytes']['max']}B  "
+        f"response/query mean={report['response_bytes']['mean']}B max={report['response_bytes']['max']}B  "
+        f"decode={report['decode_ms']}ms transfer~{report['transfer_ms_est']}ms  "
+        f"retrieve p50={report['retrieve_ms']['p50']}ms p95={report['retrieve_ms']['p95']}ms"
+    )
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Compare full-text vs hash-only vector metadata")
+    parser.add_argument("--golden", default=str(GOLDEN_SET))
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--link-mbps", type=float, default=100.0, help="Bandwidth for the transfer time estimate")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    docstore_path = CACHE_DIR / "docstore.sqlite"
+    docstore_path.parent.mkdir(parents=True, exist_ok=True)
+    docstore_path.unlink(missing_ok=True)
+    # Config is read at import time: set the environment before `backend`.
+    os.environ.update({
+        "VECTOR_STORE": "memory",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-offline"),
+        "DOCSTORE_PATH": str(docstore_path),
+        "QUERY_VOCAB_FILE": "",
+        "NAMESPACE_REGISTRY": "",
+    })
+
+    from backend.rag.docstore import DocStore, SlimIndex
+    from backend.rag.pinecone_client import get_index
+
+    corpus = load_corpus(args.data_dir)
+    golden = load_golden(args.golden)
+
+    n = seed_index(get_index(), corpus)
+    print(f"Indexed {n} chunks, {len(golden)} golden questions\n")
+    full = measure(golden, corpus, args.link_mbps)
+
+    # Same ids, so the slim upsert replaces the full metadata in place.
+    seed_index(SlimIndex(get_index(), DocStore(docstore_path)), corpus)
+    slim = measure(golden, corpus, args.link_mbps)
+
+    _print_summary("full", full)
+    _print_summary("slim", slim)
+    same = sum(a == b for a, b in zip(full.pop("results"), slim.pop("results")))
+    ratio = slim["response_bytes"]["mean"] / full["response_bytes"]["mean"]
+    print(f"\nresponse payload: {ratio:.1%} of full; identical chunks and texts for {same}/{len(golden)} questions")
+    print(f"docstore: {docstore_path} ({docstore_path.stat().st_size} bytes)")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps({"full": full, "slim": slim}, indent=2), encoding="utf-8")
+    return 0 if same == len(golden) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,183 @@
+"""
+Re-ingestion under load: what queries see while every namespace is ingested
+again, in place vs blue/green (versioned namespaces + registry switch).
+
+Seeds the in-memory index with the corpus as revision 1, then re-ingests it
+as revision 2 in batches (`--batch-delay-ms` stands in for embedding time)
+while a query thread searches every namespace the way the retriever does.
+A query "sees a mix" when its matches come from both revisions, or when a
+namespace it searched returned nothing. Blue/green must show none, and
+after the switch every query must see revision 2 only. Finally the retired
+versions are deleted and must be gone from the index.
+
+Usage:
+    python -m benchmarks.reindex_swap
+    python -m benchmarks.reindex_swap --batch-size 8 --batch-delay-ms 20 --json reindex.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from benchmarks.retrieval_eval import CACHE_DIR
+
+REGISTRY_FILE = CACHE_DIR / "reindex_namespaces.json"
+
+
+def _revision(corpus: dict[str, list[dict]], rev: str) -> dict[str, list[dict]]:
+    return {
+        ns: [{**r, "metadata": {**r["metadata"], "rev": rev}} for r in records]
+        for ns, records in corpus.items()
+    }
+
+
+def _ingest(index, corpus: dict[str, list[dict]], embeddings: dict[str, list], batch_size: int, delay_s: float) -> None:
+    for ns, records in corpus.items():
+        for start in range(0, len(records), batch_size):
+            batch = records[start : start + batch_size]
+            index.upsert(vectors=[(r["id"], embeddings[r["id"]], r["metadata"]) for r in batch], namespace=ns)
+            time.sleep(delay_s)
+
+
+class _Queries(threading.Thread):
+    """Searches every namespace per query, like the retriever, until stopped."""
+
+    def __init__(self, index, namespaces: list[str], vectors: list[list[float]], top_k: int):
+        super().__init__(daemon=True)
+        from backend.rag.namespace_registry import resolve_namespace
+        from backend.utils.retrieval_context import start_retrieval_context
+
+        self.resolve = resolve_namespace
+        self.start_request = start_retrieval_context
+        self.index = index
+        self.namespaces = namespaces
+        self.vectors = vectors
+        self.top_k = top_k
+        self.stop = threading.Event()
+        self.results: list[tuple[set, bool, float]] = []  # (revisions seen, a namespace was empty, ms)
+
+    def run(self) -> None:
+        rng = random.Random(0)
+        while not self.stop.is_set():
+            vector = rng.choice(self.vectors)
+            self.start_request()  # namespaces resolve as of the request's start
+            start = time.perf_counter()
+            revisions, empty = set(), False
+            for ns in self.namespaces:
+                res = self.index.query(vector=vector, top_k=self.top_k, namespace=self.resolve(ns), include_metadata=True)
+                empty |= not res.matches
+                revisions |= {m.metadata.get("rev") for m in res.matches}
+            self.results.append((revisions, empty, (time.perf_counter() - start) * 1000))
+
+    def summary(self, start: int, stop: Optional[int] = None) -> dict:
+        results = self.results[start:stop]
+        return {
+            "queries": len(results),
+            "mixed": sum(len(revs) > 1 for revs, _, _ in results),
+            "empty": sum(empty for _, empty, _ in results),
+            "p50_ms": round(statistics.median(ms for _, _, ms in results), 3) if results else None,
+        }
+
+
+def run(mode: str, corpus, embeddings, args) -> dict:
+    from backend.rag.local_index import InMemoryIndex
+    from backend.rag.namespace_registry import VersionedIndex, cleanup_retired, get_namespace_registry
+
+    # In place: no registry file, so every namespace resolves to itself.
+    REGISTRY_FILE.unlink(missing_ok=True)
+    registry = get_namespace_registry()
+    index = InMemoryIndex()
+    v1, v2 = _revision(corpus, "1"), _revision(corpus, "2")
+
+    if mode == "blue_green":
+        versions = registry.stage(corpus)
+        _ingest(VersionedIndex(index, versions), v1, embeddings, 1000, 0)
+        registry.activate(versions)
+    else:
+        _ingest(index, v1, embeddings, 1000, 0)
+
+    queries = _Queries(index, list(corpus), list(embeddings.values()), args.top_k)
+    queries.start()
+    time.sleep(0.2)
+    before = len(queries.results)
+
+    start = time.perf_counter()
+    if mode == "blue_green":
+        versions = registry.stage(corpus)
+        _ingest(VersionedIndex(index, versions), v2, embeddings, args.batch_size, args.batch_delay_ms / 1000)
+        registry.activate(versions)
+    else:
+        _ingest(index, v2, embeddings, args.batch_size, args.batch_delay_ms / 1000)
+    ingest_s = time.perf_counter() - start
+    # The query running at the switch may still answer from before it.
+    during = len(queries.results) + 1
+
+    time.sleep(0.2)
+    queries.stop.set()
+    queries.join()
+
+    report = {
+        "ingest_s": round(ingest_s, 2),
+        "during": queries.summary(before, during),
+        "after_only_rev2": all(revs == {"2"} for revs, _, _ in queries.results[during:]),
+    }
+    if mode == "blue_green":
+        deleted = cleanup_retired(index, registry, grace_s=0)
+        present = set(index.describe_index_stats()["namespaces"])
+        report["deleted"] = deleted
+        report["cleanup_ok"] = not (set(deleted) & present) and present == set(registry.active().values())
+    return report
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Queries during a re-ingestion: in place vs blue/green")
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--batch-delay-ms", type=float, default=20.0, help="Pause per upsert batch (embedding time)")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    # Config is read at import time: set the environment before `backend`.
+    os.environ.update({
+        "VECTOR_STORE": "memory",
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "sk-offline"),
+        "NAMESPACE_REGISTRY": str(REGISTRY_FILE),
+        "NAMESPACE_REGISTRY_RELOAD_S": "0",
+    })
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+    from benchmarks.fakes import hash_embedding, load_corpus
+
+    corpus = load_corpus(args.data_dir)
+    embeddings = {r["id"]: hash_embedding(r["text"]) for records in corpus.values() for r in records}
+    print(f"Corpus: {len(embeddings)} chunks in {len(corpus)} namespaces\n")
+
+    report = {mode: run(mode, corpus, embeddings, args) for mode in ("in_place", "blue_green")}
+    print(f"{'mode':<12}{'ingest':>9}{'queries':>9}{'mixed':>8}{'empty':>8}{'p50':>10}  after: rev 2 only")
+    for mode, r in report.items():
+        d = r["during"]
+        print(
+            f"{mode:<12}{r['ingest_s']:>8.2f}s{d['queries']:>9}{d['mixed']:>8}{d['empty']:>8}"
+            f"{d['p50_ms']:>8.2f}ms  {'yes' if r['after_only_rev2'] else 'NO'}"
+        )
+    bg = report["blue_green"]
+    print(f"\nRetired versions deleted: {', '.join(bg['deleted'])} ({'ok' if bg['cleanup_ok'] else 'FAILED'})")
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    ok = bg["during"]["mixed"] == 0 and bg["during"]["empty"] == 0 and bg["after_only_rev2"] and bg["cleanup_ok"]
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
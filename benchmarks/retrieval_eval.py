@@ -0,0 +1,241 @@
+"""
+Retrieval quality-and-latency evaluation against a golden set.
+
+Builds a local in-memory index from the chunks the ingesters produce for
+`data/`, runs `retrieve_chunks` for every golden question and reports
+recall@k, MRR, namespaces queried, matches fetched and latency per query,
+for fixed top-k ("baseline") and adaptive top-k retrieval.
+
+Embeddings are cached on disk (`benchmarks/.cache/`), so after one run with
+`--embedder openai` the eval runs offline with real vectors. `--embedder hash`
+(default) uses deterministic hashed vectors and needs no API key at all.
+
+Usage:
+    python -m benchmarks.retrieval_eval
+    python -m benchmarks.retrieval_eval --embedder openai --sweep --json eval.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.fakes import hash_embedding, load_corpus, seed_index, write_vocabulary
+from benchmarks.load_test import percentile
+
+GOLDEN_SET = Path(__file__).with_name("golden_set.jsonl")
+CACHE_DIR = Path(__file__).with_name(".cache")
+
+
+class CachedEmbedder:
+    """Embeds texts with `backend` ("hash" or "openai"), caching vectors on disk."""
+
+    def __init__(self, backend: str = "hash", cache_dir: Path = CACHE_DIR):
+        self.backend = backend
+        self.path = cache_dir / f"embeddings-{backend}.npz"
+        self._cache: dict[str, np.ndarray] = {}
+        self._dirty = False
+        if self.path.exists():
+            data = np.load(self.path, allow_pickle=False)
+            self._cache = dict(zip(data["keys"].tolist(), data["vectors"]))
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+    def embed(self, texts: list[str], batch_size: int = 64) -> list[list[float]]:
+        missing = [t for t in dict.fromkeys(texts) if self._key(t) not in self._cache]
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start : start + batch_size]
+            if self.backend == "openai":
+                from backend.rag.embeddings import embed_texts
+
+                vectors = embed_texts(batch)
+            else:
+                vectors = [hash_embedding(t) for t in batch]
+            for t, v in zip(batch, vectors):
+                self._cache[self._key(t)] = np.asarray(v, dtype=np.float32)
+            self._dirty = True
+        return [self._cache[self._key(t)].tolist() for t in texts]
+
+    def embed_one(self, text: str) -> list[float]:
+        return self.embed([text])[0]
+
+    def save(self) -> None:
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        keys = list(self._cache)
+        np.savez_compressed(self.path, keys=np.array(keys), vectors=np.vstack([self._cache[k] for k in keys]))
+        self._dirty = False
+
+
+def load_golden(path: str | Path = GOLDEN_SET) -> list[dict]:
+    return [json.loads(line) for line in Path(path).read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def build_index(embedder: CachedEmbedder, data_dir: str) -> int:
+    from backend.rag.pinecone_client import get_index
+
+    corpus = load_corpus(data_dir)
+    texts = [r["text"] for records in corpus.values() for r in records]
+    embedder.embed(texts)
+    write_vocabulary(corpus, os.environ["QUERY_VOCAB_FILE"])
+    return seed_index(get_index(), corpus, embed=embedder.embed_one)
+
+
+def evaluate(golden: list[dict], embedder: CachedEmbedder, params: dict) -> dict:
+    """Run every golden question through `retrieve_chunks(**params)`."""
+
+    from backend.rag.retriever import retrieve_chunks
+    from backend.utils.tracing import start_trace
+
+    per_query = []
+    for item in golden:
+        vector = embedder.embed_one(item["question"])
+        trace = start_trace()
+        start = time.perf_counter()
+        results = retrieve_chunks(item["question"], embedding=vector, **params)
+        latency_ms = (time.perf_counter() - start) * 1000
+
+        expected = set(item["expected_ids"])
+        rank = next((i + 1 for i, r in enumerate(results) if r.get("id") in expected), None)
+        queried = list(dict.fromkeys(s["namespace"] for s in trace if s["stage"] == "vector_query"))
+        per_query.append({
+            "question": item["question"],
+            "rank": rank,
+            "results": len(results),
+            "namespaces": queried,
+            # Matches requested from the vector store (payload proxy).
+            "fetched": sum(s.get("top_k", 0) for s in trace if s["stage"] == "vector_query"),
+            "filtered": any(s.get("filtered") for s in trace if s["stage"] == "vector_query"),
+            "latency_ms": round(latency_ms, 3),
+        })
+
+    n = len(per_query) or 1
+    latencies = [q["latency_ms"] for q in per_query]
+    return {
+        "params": params,
+        "recall@1": round(sum(1 for q in per_query if q["rank"] and q["rank"] <= 1) / n, 4),
+        "recall@3": round(sum(1 for q in per_query if q["rank"] and q["rank"] <= 3) / n, 4),
+        "recall@5": round(sum(1 for q in per_query if q["rank"] and q["rank"] <= 5) / n, 4),
+        "mrr": round(sum(1.0 / q["rank"] for q in per_query if q["rank"]) / n, 4),
+        "avg_namespaces": round(sum(len(q["namespaces"]) for q in per_query) / n, 3),
+        "avg_fetched": round(sum(q["fetched"] for q in per_query) / n, 2),
+        "avg_results": round(sum(q["results"] for q in per_query) / n, 3),
+        "filtered_share": round(sum(q["filtered"] for q in per_query) / n, 3),
+        "latency_ms": {"p50": round(percentile(latencies, 50), 3), "p95": round(percentile(latencies, 95), 3)},
+        "queries": per_query,
+    }
+
+
+def sweep(golden: list[dict], embedder: CachedEmbedder, baseline: dict, tolerance: float) -> tuple[list[dict], dict]:
+    """
+    Grid over the retrieval knobs. Returns (all results, cheapest setting whose
+    recall@5 is within `tolerance` of the baseline). Cost is matches fetched
+    from the vector store first, then chunks passed to the LLM.
+    """
+
+    grid = {
+        "top_k": [3, 5, 7, 10],
+        "min_score": [0.35, 0.45, 0.55],
+        "relative_drop": [0.05, 0.10, 0.15, 0.25],
+        "max_results": [3, 5],
+        "use_router": [True, False],
+        "adaptive": [False, True],
+        "use_filters": [False, True],
+    }
+    results = []
+    for values in itertools.product(*grid.values()):
+        params = dict(zip(grid.keys(), values))
+        report = evaluate(golden, embedder, params)
+        report.pop("queries")
+        results.append(report)
+
+    floor = baseline["recall@5"] - tolerance
+    eligible = [r for r in results if r["recall@5"] >= floor]
+    best = min(eligible, key=lambda r: (r["avg_fetched"], r["avg_results"], -r["mrr"])) if eligible else baseline
+    return results, best
+
+
+def _print_summary(label: str, report: dict) -> None:
+    print(
+        f"{label:<10} recall@1={report['recall@1']:.3f} recall@3={report['recall@3']:.3f} "
+        f"recall@5={report['recall@5']:.3f} mrr={report['mrr']:.3f} "
+        f"namespaces={report['avg_namespaces']:.2f} fetched={report['avg_fetched']:.1f} "
+        f"results={report['avg_results']:.2f} filtered={report['filtered_share']:.2f} p50={report['latency_ms']['p50']}ms p95={report['latency_ms']['p95']}ms"
+    )
+    print(f"{'':<10} params={report['params']}")
+
+
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality and latency on the golden set")
+    parser.add_argument("--golden", default=str(GOLDEN_SET))
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--embedder", choices=["hash", "openai"], default="hash")
+    parser.add_argument("--sweep", action="store_true", help="Grid-search retrieval parameters")
+    parser.add_argument("--tolerance", type=float, default=0.0, help="Allowed recall@5 loss in --sweep")
+    parser.add_argument("--verbose", action="store_true", help="Print per-query results")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    # Local index; the OpenAI key is only used with --embedder openai.
+    os.environ["VECTOR_STORE"] = "memory"
+    os.environ["QUERY_VOCAB_FILE"] = str(CACHE_DIR / "query_vocab.json")
+    os.environ["NAMESPACE_REGISTRY"] = ""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-offline")
+
+    embedder = CachedEmbedder(args.embedder)
+    n = build_index(embedder, args.data_dir)
+    golden = load_golden(args.golden)
+    print(f"Indexed {n} chunks, {len(golden)} golden questions, embedder={args.embedder}\n")
+
+    from backend.config import ADAPTIVE_INITIAL_K, FINAL_CONTEXT_SIZE, TOP_K
+    from backend.rag.retriever import MIN_ABSOLUTE_SCORE, RELATIVE_DROP
+
+    production = {
+        "top_k": TOP_K,
+        "min_score": MIN_ABSOLUTE_SCORE,
+        "relative_drop": RELATIVE_DROP,
+        "max_results": FINAL_CONTEXT_SIZE,
+        "use_router": True,
+    }
+    # Fixed top-k on every routed namespace, then adaptive k, then adaptive
+    # k with metadata filter pushdown (the production default).
+    baseline = evaluate(golden, embedder, {**production, "adaptive": False, "use_filters": False})
+    adaptive = evaluate(
+        golden, embedder, {**production, "adaptive": True, "initial_k": ADAPTIVE_INITIAL_K, "use_filters": False}
+    )
+    filtered = evaluate(
+        golden, embedder, {**production, "adaptive": True, "initial_k": ADAPTIVE_INITIAL_K, "use_filters": True}
+    )
+    _print_summary("baseline", baseline)
+    _print_summary("adaptive", adaptive)
+    _print_summary("filtered", filtered)
+    if args.verbose:
+        for q in filtered["queries"]:
+            flag = "F" if q["filtered"] else " "
+            print(f"  rank={q['rank']!s:<5} {flag} ns={','.join(q['namespaces']):<40} {q['question']}")
+
+    report = {"baseline": baseline, "adaptive": adaptive, "filtered": filtered}
+    if args.sweep:
+        results, best = sweep(golden, embedder, baseline, args.tolerance)
+        _print_summary("cheapest", best)
+        report.update({"sweep": results, "recommended": best})
+
+    embedder.save()
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
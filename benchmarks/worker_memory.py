@@ -0,0 +1,187 @@
+"""
+Worker memory benchmark: N worker processes serving the same local index,
+loaded as the memory-mapped snapshot (VECTOR_STORE=snapshot) or copied into
+each worker's own in-memory index (VECTOR_STORE=memory).
+
+Writes a snapshot of `--vectors` random vectors with slim metadata (the
+corpus rows cycled), then for each worker count starts that many workers at
+once. Each worker loads the index, runs `--queries` queries and reports,
+from /proc/self/smaps_rollup, how much its private memory (USS) grew and its
+proportional share of all its pages (PSS, shared pages divided by the
+processes mapping them). Finally checks that a live index switches to a
+newly written generation without reopening.
+
+Linux only (reads /proc).
+
+Usage:
+    python -m benchmarks.worker_memory
+    python -m benchmarks.worker_memory --vectors 50000 --workers 1 2 4 8 --json memory.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.retrieval_eval import CACHE_DIR
+
+MODES = ("snapshot", "memory")
+
+
+def _memory_kb() -> dict[str, int]:
+    """Private (USS), PSS and RSS of this process, in KiB."""
+    fields = {}
+    with open("/proc/self/smaps_rollup", encoding="ascii") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if value.strip().endswith("kB"):
+                fields[name] = int(value.split()[0])
+    return {
+        "uss": fields["Private_Clean"] + fields["Private_Dirty"],
+        "pss": fields["Pss"],
+        "rss": fields["Rss"],
+    }
+
+
+# -------------------------------------------------
+# WORKER (child process)
+# -------------------------------------------------
+def worker(mode: str, directory: str, queries: int) -> None:
+    from backend.rag.local_index import InMemoryIndex
+    from backend.rag.snapshot import LiveSnapshotIndex, SnapshotIndex, import_snapshot
+
+    before = _memory_kb()
+    if mode == "snapshot":
+        index = LiveSnapshotIndex(directory, reload_s=10)
+    else:
+        index = InMemoryIndex()
+        import_snapshot(SnapshotIndex(directory), index)
+    namespaces = list(index.describe_index_stats()["namespaces"])
+
+    rng = np.random.default_rng(os.getpid())
+    dim = index.describe_index_stats().get("dimension") or 1536
+    start = time.perf_counter()
+    for i in range(queries):
+        index.query(vector=rng.standard_normal(dim).tolist(), top_k=5, namespace=namespaces[i % len(namespaces)], include_metadata=True)
+    query_ms = (time.perf_counter() - start) * 1000 / max(queries, 1)
+
+    after = _memory_kb()
+    print(json.dumps({
+        "uss_growth_kb": after["uss"] - before["uss"],
+        "pss_kb": after["pss"],
+        "rss_kb": after["rss"],
+        "query_ms": round(query_ms, 3),
+    }), flush=True)
+    sys.stdin.read()  # stay alive (and mapped) until every worker has reported
+
+
+# -------------------------------------------------
+# DRIVER
+# -------------------------------------------------
+def write_snapshot(directory: Path, vectors: int, dim: int, data_dir: str) -> dict:
+    from backend.rag.docstore import text_hash
+    from backend.rag.snapshot import SnapshotWriter
+    from benchmarks.fakes import load_corpus
+
+    corpus = load_corpus(data_dir)
+    rows = [(ns, r) for ns, records in corpus.items() for r in records]
+    rng = np.random.default_rng(0)
+    writer = SnapshotWriter()
+    for start in range(0, vectors, 1000):
+        batch: dict[str, list] = {}
+        for i in range(start, min(start + 1000, vectors)):
+            ns, record = rows[i % len(rows)]
+            metadata = {k: v for k, v in record["metadata"].items() if k != "text"}
+            metadata["text_hash"] = text_hash(record["text"])
+            batch.setdefault(ns, []).append((f"{record['id']}#{i}", rng.standard_normal(dim).astype(np.float32), metadata))
+        for ns, items in batch.items():
+            writer.add(items, namespace=ns)
+    return writer.write(directory)
+
+
+def run_workers(mode: str, directory: Path, count: int, queries: int) -> list[dict]:
+    procs = [
+        subprocess.Popen(
+            [sys.executable, "-m", "benchmarks.worker_memory", "--worker", mode, str(directory), "--queries", str(queries)],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+        )
+        for _ in range(count)
+    ]
+    try:
+        # PSS is read while all workers are alive, so shared pages are split between them.
+        reports = [json.loads(p.stdout.readline()) for p in procs]
+    finally:
+        for p in procs:
+            p.stdin.close()
+            p.wait()
+    return reports
+
+
+def check_swap(directory: Path) -> bool:
+    """A live index answers from a generation written after it was opened."""
+    from backend.rag.snapshot import LiveSnapshotIndex, SnapshotWriter
+
+    live = LiveSnapshotIndex(directory, reload_s=0)
+    before = live.generation
+    writer = SnapshotWriter()
+    writer.add([("swap-check", [1.0] + [0.0] * (live.describe_index_stats()["dimension"] - 1), {"text_hash": "x"})], "swap")
+    writer.write(directory)
+    vector = [1.0] + [0.0] * (live.describe_index_stats()["dimension"] - 1)
+    # The new generation is opened in the background; queries meanwhile use the old one.
+    deadline = time.monotonic() + 5
+    while live.generation == before and time.monotonic() < deadline:
+        live.query(vector=vector, top_k=1, namespace="swap")
+        time.sleep(0.01)
+    res = live.query(vector=vector, top_k=1, namespace="swap")
+    swapped = live.generation != before and [m.id for m in res.matches] == ["swap-check"]
+    print(f"generation swap: {before} -> {live.generation} without reopening: {'ok' if swapped else 'FAILED'}")
+    return swapped
+
+
+def main(argv: list[str]) -> int:
+    if argv[:1] == ["--worker"]:
+        worker(argv[1], argv[2], int(argv[argv.index("--queries") + 1]))
+        return 0
+
+    parser = argparse.ArgumentParser(description="Per-worker memory of a shared mmap'd snapshot vs per-worker in-memory index")
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    directory = CACHE_DIR / "worker_snapshot"
+    manifest = write_snapshot(directory, args.vectors, args.dim, args.data_dir)
+    size_mb = sum(f.stat().st_size for f in (directory / manifest["generation"]).iterdir()) / 2**20
+    print(f"Snapshot {manifest['generation']}: {args.vectors} vectors x {args.dim}, {size_mb:.0f} MiB on disk\n")
+
+    report: dict = {"vectors": args.vectors, "snapshot_mb": round(size_mb, 1), "modes": {}}
+    print(f"{'mode':<10}{'workers':>8}{'USS growth/worker':>20}{'PSS/worker':>14}{'query':>10}")
+    for mode in MODES:
+        for count in args.workers:
+            reports = run_workers(mode, directory, count, args.queries)
+            row = {
+                "uss_growth_mb": round(sum(r["uss_growth_kb"] for r in reports) / count / 1024, 1),
+                "pss_mb": round(sum(r["pss_kb"] for r in reports) / count / 1024, 1),
+                "query_ms": round(sum(r["query_ms"] for r in reports) / count, 3),
+            }
+            report["modes"].setdefault(mode, {})[count] = row
+            print(f"{mode:<10}{count:>8}{row['uss_growth_mb']:>17.1f}MiB{row['pss_mb']:>11.1f}MiB{row['query_ms']:>8.2f}ms")
+
+    swapped = check_swap(directory)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    return 0 if swapped else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
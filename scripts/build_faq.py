@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+
+from backend.config import FAQ_FILE, QUERY_LOG_PATH
+
+
+def read_questions(path: str | Path) -> list[str]:
+    """One question per line (.txt), or JSON lines with a "question" field (.jsonl)."""
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            questions.append(json.loads(line)["question"] if str(path).endswith(".jsonl") else line)
+    return questions
+
+
+# -------------------------------------------------
+# MAIN
+# -------------------------------------------------
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Precompute FAQ answers (served by /ask without an LLM call)"
+    )
+    parser.add_argument("--questions", default=None, help="Curated questions (.txt, one per line, or .jsonl)")
+    parser.add_argument(
+        "--from-log",
+        type=int,
+        default=0,
+        metavar="N",
+        help="Also take the N most frequent answered queries from the query log",
+    )
+    parser.add_argument("--query-log", default=QUERY_LOG_PATH)
+    parser.add_argument("--faq-file", default=FAQ_FILE)
+    args = parser.parse_args(argv)
+
+    questions = read_questions(args.questions) if args.questions else []
+    if args.from_log:
+        from backend.utils.query_log import hot_queries
+
+        questions += hot_queries(args.query_log, args.from_log)
+    if not questions:
+        print("No questions: pass --questions and/or --from-log", file=sys.stderr)
+        return 1
+    if not args.faq_file:
+        print("No FAQ file: pass --faq-file or set FAQ_FILE", file=sys.stderr)
+        return 1
+
+    from backend.cache.faq import build_faq
+
+    outcomes = build_faq(dict.fromkeys(questions), args.faq_file)
+    for question, outcome in outcomes.items():
+        if outcome != "ok":
+            print(f"skipped ({outcome}): {question}")
+    summary = ", ".join(f"{o}={n}" for o, n in Counter(outcomes.values()).items())
+    print(f"FAQ written to {args.faq_file} ({summary})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
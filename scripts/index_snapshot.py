@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+
+from backend.config import INDEX_SNAPSHOT_DIR
+
+
+# -------------------------------------------------
+# COMMANDS
+# -------------------------------------------------
+def export_cmd(args: argparse.Namespace) -> int:
+    from backend.rag.pinecone_client import get_index
+    from backend.rag.snapshot import export_index
+
+    start = time.perf_counter()
+    manifest = export_index(
+        get_index(),
+        args.snapshot_dir,
+        namespaces=args.namespace or None,
+        dtype=args.dtype,
+        page_size=args.page_size,
+        max_workers=args.workers,
+    )
+    counts = ", ".join(f"{ns}={m['count']}" for ns, m in manifest["namespaces"].items())
+    print(f"Exported to {args.snapshot_dir} in {time.perf_counter() - start:.1f}s ({counts})")
+    return 0
+
+
+def import_cmd(args: argparse.Namespace) -> int:
+    from backend.rag.pinecone_client import get_index
+    from backend.rag.snapshot import import_snapshot, load_snapshot
+
+    snapshot = load_snapshot(args.snapshot_dir)
+    if snapshot is None:
+        print(f"No snapshot in {args.snapshot_dir}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    counts = import_snapshot(
+        snapshot,
+        get_index(),
+        namespaces=args.namespace or None,
+        batch_size=args.batch_size,
+        max_workers=args.workers,
+    )
+    summary = ", ".join(f"{ns}={n}" for ns, n in counts.items())
+    print(f"Imported {sum(counts.values())} vectors in {time.perf_counter() - start:.1f}s ({summary})")
+    return 0
+
+
+# -------------------------------------------------
+# MAIN
+# -------------------------------------------------
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Export the vector index to a local snapshot, or import a snapshot into it"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    export = sub.add_parser("export", help="Dump the index (vectors + metadata) to a snapshot")
+    export.add_argument("--dtype", choices=("float32", "float16"), default="float32")
+    export.add_argument("--page-size", type=int, default=100, help="IDs listed/fetched per request (max 100)")
+    export.set_defaults(func=export_cmd)
+
+    imp = sub.add_parser("import", help="Upsert a snapshot into the index, without re-embedding")
+    imp.add_argument("--batch-size", type=int, default=100)
+    imp.set_defaults(func=import_cmd)
+
+    for p in (export, imp):
+        p.add_argument("--snapshot-dir", default=INDEX_SNAPSHOT_DIR)
+        p.add_argument("--namespace", action="append", help="Only this namespace (repeatable; default: all)")
+        p.add_argument("--workers", type=int, default=8, help="Parallel requests")
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -3,20 +3,28 @@ from __future__ import annotations
 import argparse
 import sys
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 from backend.config import (
+    DOCSTORE_PATH,
+    FAQ_FILE,
+    INDEX_SNAPSHOT_DIR,
+    QUERY_VOCAB_FILE,
     NAMESPACE_LOCATORS,
     NAMESPACE_PR_REVIEW,
     NAMESPACE_SOP,
     NAMESPACE_VALIDATION,
     NAMESPACE_COMPANY,
+    NAMESPACE_RETIRE_GRACE_S,
+    SNAPSHOT_KEEP_GENERATIONS,
+    VECTOR_STORE,
 )
 
 # -------------------------------------------------
 # OPTIONAL PDF INGESTION (generic utility)
 # -------------------------------------------------
-def ingest_pdf(path: str | Path, *, namespace: str, batch_size: int = 64) -> int:
+def ingest_pdf(path: str | Path, *, namespace: str, batch_size: int = 64, index=None) -> int:
     from langchain.document_loaders import PyPDFLoader
 
     from backend.rag.chunking import chunk_documents
@@ -29,7 +37,7 @@ def ingest_pdf(path: str | Path, *, namespace: str, batch_size: int = 64) -> int
         return 0
 
     texts = [c.page_content for c in chunks]
-    index = get_index()
+    index = index if index is not None else get_index()
     upserted = 0
 
     for start in range(0, len(texts), batch_size):
@@ -54,57 +62,24 @@ def ingest_pdf(path: str | Path, *, namespace: str, batch_size: int = 64) -> int
 
 
 # -------------------------------------------------
-# MAIN INGESTION RUNNER
+# DOCUMENT SOURCES
 # -------------------------------------------------
-def main(argv: list[str]) -> int:
-    parser = argparse.ArgumentParser(
-        description="Ingest Internal Knowledge Assistant documents into Pinecone"
-    )
+# Flag -> namespace of each document source.
+_SOURCES = (
+    ("locators", NAMESPACE_LOCATORS),
+    ("validation", NAMESPACE_VALIDATION),
+    ("pr_review", NAMESPACE_PR_REVIEW),
+    ("sop", NAMESPACE_SOP),
+    ("company", NAMESPACE_COMPANY),
+)
 
-    parser.add_argument("--batch-size", type=int, default=64)
 
-    parser.add_argument("--all", action="store_true", help="Ingest all document sources")
-    parser.add_argument("--locators", action="store_true")
-    parser.add_argument("--validation", action="store_true")
-    parser.add_argument("--pr-review", action="store_true")
-    parser.add_argument("--sop", action="store_true")
-    parser.add_argument("--company", action="store_true", help="Ingest company profile")
-    parser.add_argument("--pdf", default=None, help="Optional PDF path to ingest")
+def _namespaces_to_ingest(args: argparse.Namespace) -> list[str]:
+    namespaces = [ns for flag, ns in _SOURCES if args.all or getattr(args, flag)]
+    return namespaces + (["pdf"] if args.pdf else [])
 
-    parser.add_argument(
-        "--locators-path",
-        default=str(Path("data/common_keywords_locators/SAF_Common_Keywords_Locators_v1.0.xlsx")),
-    )
-    parser.add_argument(
-        "--validation-path",
-        default=str(Path("data/validation_checklist/Report Verification Checklist.xlsx")),
-    )
-    parser.add_argument(
-        "--pr-review-path",
-        default=str(Path("data/pr_review/PR Review Checklist.docx")),
-    )
-    parser.add_argument(
-        "--sop-path",
-        default=str(Path("data/guidelines/Standard Operating procedure.docx")),
-    )
-    parser.add_argument(
-        "--company-path",
-        default=str(Path("data/company/spotline_profile.docx")),
-    )
-
-    args = parser.parse_args(argv)
-
-    if not any([
-        args.all,
-        args.locators,
-        args.validation,
-        args.pr_review,
-        args.sop,
-        args.company,
-        args.pdf,
-    ]):
-        args.all = True
 
+def ingest_sources(args: argparse.Namespace, index) -> int:
     total = 0
 
     if args.all or args.locators:
@@ -114,6 +89,7 @@ def main(argv: list[str]) -> int:
             args.locators_path,
             namespace=NAMESPACE_LOCATORS,
             batch_size=args.batch_size,
+            index=index,
         )
         print(f"Locators upserted: {n}")
         total += n
@@ -125,6 +101,7 @@ def main(argv: list[str]) -> int:
             args.validation_path,
             namespace=NAMESPACE_VALIDATION,
             batch_size=args.batch_size,
+            index=index,
         )
         print(f"Validation rules upserted: {n}")
         total += n
@@ -136,6 +113,7 @@ def main(argv: list[str]) -> int:
             args.pr_review_path,
             namespace=NAMESPACE_PR_REVIEW,
             batch_size=args.batch_size,
+            index=index,
         )
         print(f"PR review items upserted: {n}")
         total += n
@@ -147,6 +125,7 @@ def main(argv: list[str]) -> int:
             args.sop_path,
             namespace=NAMESPACE_SOP,
             batch_size=args.batch_size,
+            index=index,
         )
         print(f"SOP steps upserted: {n}")
         total += n
@@ -158,18 +137,209 @@ def main(argv: list[str]) -> int:
             args.company_path,
             namespace=NAMESPACE_COMPANY,
             batch_size=args.batch_size,
+            index=index,
         )
         print(f"Company profile upserted: {n}")
         total += n
 
     if args.pdf:
-        n = ingest_pdf(args.pdf, namespace="pdf", batch_size=args.batch_size)
+        n = ingest_pdf(args.pdf, namespace="pdf", batch_size=args.batch_size, index=index)
         print(f"PDF chunks upserted: {n}")
         total += n
 
+    return total
+
+
+# -------------------------------------------------
+# MAIN INGESTION RUNNER
+# -------------------------------------------------
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Ingest Internal Knowledge Assistant documents into Pinecone"
+    )
+
+    parser.add_argument("--batch-size", type=int, default=64)
+
+    parser.add_argument("--all", action="store_true", help="Ingest all document sources")
+    parser.add_argument("--locators", action="store_true")
+    parser.add_argument("--validation", action="store_true")
+    parser.add_argument("--pr-review", action="store_true")
+    parser.add_argument("--sop", action="store_true")
+    parser.add_argument("--company", action="store_true", help="Ingest company profile")
+    parser.add_argument("--pdf", default=None, help="Optional PDF path to ingest")
+    parser.add_argument(
+        "--in-place",
+        action="store_true",
+        help="Upsert into the active version of each namespace instead of a new one "
+        "(queries see a half-updated namespace meanwhile)",
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        default=INDEX_SNAPSHOT_DIR,
+        help="Also write the ingested namespaces to this local index snapshot ('' to skip)",
+    )
+    parser.add_argument(
+        "--docstore",
+        default=DOCSTORE_PATH,
+        help="Keep chunk texts in this local docstore and only their hash in the vector metadata "
+        "('' to store the texts in the metadata)",
+    )
+    parser.add_argument(
+        "--vocab-file",
+        default=QUERY_VOCAB_FILE,
+        help="Write the sheet/module/locator/keyword names used for query filters here ('' to skip)",
+    )
+    parser.add_argument(
+        "--faq-file",
+        default=FAQ_FILE,
+        help="Regenerate the FAQ answers in this file whose chunks changed ('' to skip)",
+    )
+
+    parser.add_argument(
+        "--locators-path",
+        default=str(Path("data/common_keywords_locators/SAF_Common_Keywords_Locators_v1.0.xlsx")),
+    )
+    parser.add_argument(
+        "--validation-path",
+        default=str(Path("data/validation_checklist/Report Verification Checklist.xlsx")),
+    )
+    parser.add_argument(
+        "--pr-review-path",
+        default=str(Path("data/pr_review/PR Review Checklist.docx")),
+    )
+    parser.add_argument(
+        "--sop-path",
+        default=str(Path("data/guidelines/Standard Operating procedure.docx")),
+    )
+    parser.add_argument(
+        "--company-path",
+        default=str(Path("data/company/spotline_profile.docx")),
+    )
+
+    args = parser.parse_args(argv)
+
+    if not any([
+        args.all,
+        args.locators,
+        args.validation,
+        args.pr_review,
+        args.sop,
+        args.company,
+        args.pdf,
+    ]):
+        args.all = True
+
+    if VECTOR_STORE == "snapshot":
+        if not args.snapshot_dir:
+            parser.error("VECTOR_STORE=snapshot: the snapshot is the index, --snapshot-dir can't be empty")
+        # The snapshot written at the end is what gets served; collect the
+        # vectors in memory until then.
+        from backend.rag.local_index import InMemoryIndex
+
+        index = InMemoryIndex()
+    else:
+        from backend.rag.pinecone_client import get_index
+
+        index = get_index()
+
+    # Blue/green: each namespace of the run is written to a new version that
+    # queries don't see until all of them are switched to, at the end.
+    from backend.rag.namespace_registry import VersionedIndex, delete_versions, get_namespace_registry
+
+    registry = get_namespace_registry()
+    versions: dict[str, str] = {}
+    expired: list[str] = []
+    cleanup = None
+    if registry is not None:
+        registry.refresh()
+        targets = _namespaces_to_ingest(args)
+        if args.in_place:
+            versions = {ns: registry.resolve(ns) for ns in targets}
+        else:
+            versions = registry.stage(targets)
+            print("Ingesting into " + ", ".join(versions.values()))
+        # Versions retired long enough ago are deleted while this run ingests
+        # (in snapshot mode they are only left out of the new snapshot).
+        expired = registry.expired(NAMESPACE_RETIRE_GRACE_S)
+        if expired and VECTOR_STORE == "pinecone":
+            pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="namespace-cleanup")
+            cleanup = pool.submit(delete_versions, index, expired)
+            pool.shutdown(wait=False)
+
+    # Record every upsert so the same vectors can be written to the local
+    # snapshot that /ask falls back to when Pinecone is down.
+    writer = None
+    if args.snapshot_dir:
+        from backend.rag.snapshot import RecordingIndex, SnapshotWriter
+
+        writer = SnapshotWriter()
+        index = RecordingIndex(index, writer)
+    versioned_index = None
+    if versions:
+        # Above the snapshot recorder (it keeps the versioned names), below the
+        # vocabulary and FAQ recorders (they keep the logical ones).
+        index = versioned_index = VersionedIndex(index, versions)
+    vocab = None
+    if args.vocab_file:
+        from backend.rag.query_analyzer import VocabularyWriter
+        from backend.rag.snapshot import RecordingIndex
+
+        vocab = VocabularyWriter()
+        index = RecordingIndex(index, vocab)
+    chunk_hashes = None
+    if args.faq_file and Path(args.faq_file).exists():
+        from backend.cache.faq import ChunkHashRecorder
+        from backend.rag.snapshot import RecordingIndex
+
+        chunk_hashes = ChunkHashRecorder()
+        index = RecordingIndex(index, chunk_hashes)
+    if args.docstore:
+        # Outermost, so Pinecone and the snapshot both get the slim metadata.
+        from backend.rag.docstore import DocStore, SlimIndex
+
+        index = SlimIndex(index, DocStore(args.docstore))
+
+    staged = registry is not None and not args.in_place
+    try:
+        total = ingest_sources(args, index)
+    except BaseException:
+        if staged:
+            # Never switched to: delete it with the retired versions.
+            registry.retire(versions.values())
+        raise
+
     print(f"\nTotal vectors upserted: {total}")
+
+    if writer is not None:
+        manifest = writer.write(args.snapshot_dir, keep_generations=SNAPSHOT_KEEP_GENERATIONS, drop=expired)
+        counts = ", ".join(f"{ns}={m['count']}" for ns, m in manifest["namespaces"].items())
+        print(f"Snapshot {manifest['generation']} written to {args.snapshot_dir} ({counts})")
+    if staged:
+        # A source that produced nothing keeps serving its current version.
+        empty = [ns for ns in versions if not versioned_index.upserted.get(ns)]
+        if empty:
+            registry.retire(versions.pop(ns) for ns in empty)
+            print(f"Nothing ingested into {', '.join(empty)}: not switched")
+        if versions:
+            # After the snapshot, so the Pinecone fallback already has the new versions.
+            replaced = registry.activate(versions)
+            print(f"Switched to {', '.join(versions.values())} (retired {', '.join(replaced.values()) or '-'})")
+    if expired:
+        gone = cleanup.result() if cleanup is not None else expired
+        registry.forget(gone)
+        print(f"Deleted retired namespaces: {', '.join(gone) or '-'}")
+    if vocab is not None:
+        vocabulary = vocab.write(args.vocab_file)
+        counts = ", ".join(f"{ns}={sum(map(len, fields.values()))}" for ns, fields in vocabulary.items())
+        print(f"Query filter vocabulary written to {args.vocab_file} ({counts})")
+    if chunk_hashes is not None:
+        # Last: the answers are generated again from the new index.
+        from backend.cache.faq import refresh_faq
+
+        counts = refresh_faq(args.faq_file, chunk_hashes.hashes)
+        print(f"FAQ refreshed in {args.faq_file} ({', '.join(f'{k}={n}' for k, n in counts.items())})")
     return 0
 
 
 if __name__ == "__main__":
-    raise SystemExit(main(sys.argv[1:]))
\ No newline at end of file
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+
+from backend.config import INDEX_SNAPSHOT_DIR, NAMESPACE_RETIRE_GRACE_S, SNAPSHOT_KEEP_GENERATIONS, VECTOR_STORE
+from backend.rag.namespace_registry import (
+    REGISTRY_NAMESPACE,
+    NamespaceRegistry,
+    get_namespace_registry,
+    is_versioned,
+    logical_namespace,
+)
+
+
+def _registry() -> NamespaceRegistry:
+    registry = get_namespace_registry()
+    if registry is None:
+        raise SystemExit("NAMESPACE_REGISTRY is empty: namespaces are not versioned")
+    registry.refresh()
+    return registry
+
+
+# -------------------------------------------------
+# COMMANDS
+# -------------------------------------------------
+def list_cmd(args: argparse.Namespace) -> int:
+    registry = _registry()
+    counts = {}
+    if args.index:
+        from backend.rag.pinecone_client import get_index
+
+        stats = get_index().describe_index_stats()["namespaces"]
+        counts = {ns: s.get("vector_count", 0) for ns, s in stats.items() if ns != REGISTRY_NAMESPACE}
+
+    def count(ns: str) -> str:
+        return f" ({counts[ns]} vectors)" if ns in counts else ""
+
+    print(f"Revision {registry.revision}")
+    for ns, version in sorted(registry.active().items()):
+        print(f"  {ns:<16} -> {version}{count(version)}")
+    now = time.time()
+    for version, retired_at in sorted(registry.retired().items()):
+        print(f"  retired {version}, {(now - retired_at) / 60:.0f} min ago{count(version)}")
+    known = set(registry.active().values()) | set(registry.retired())
+    for ns in sorted(counts):
+        if ns in known:
+            continue
+        if is_versioned(ns):
+            # Left by an ingestion that is still running, or was killed.
+            print(f"  unregistered {ns}{count(ns)}")
+        elif ns in registry.active():
+            # Ingested in place before the first switch: never retired automatically.
+            print(f"  legacy {ns}, retire manually{count(ns)}")
+    return 0
+
+
+def activate_cmd(args: argparse.Namespace) -> int:
+    registry = _registry()
+    if args.version not in registry.retired() and args.version not in registry.active().values():
+        print(f"{args.version} is neither active nor retired (deleted, or never ingested)", file=sys.stderr)
+        return 1
+    replaced = registry.activate({logical_namespace(args.version): args.version})
+    print(f"Switched to {args.version} (retired {', '.join(replaced.values()) or '-'})")
+    return 0
+
+
+def retire_cmd(args: argparse.Namespace) -> int:
+    registry = _registry()
+    if args.namespace in registry.active().values():
+        print(f"{args.namespace} is active: switch to another version first", file=sys.stderr)
+        return 1
+    registry.retire([args.namespace])
+    print(f"Retired {args.namespace}; cleanup deletes it after {NAMESPACE_RETIRE_GRACE_S:.0f}s")
+    return 0
+
+
+def cleanup_cmd(args: argparse.Namespace) -> int:
+    registry = _registry()
+    expired = registry.expired(args.grace_s)
+    if not expired:
+        print("Nothing to delete")
+        return 0
+
+    gone = expired
+    if VECTOR_STORE == "pinecone":
+        from backend.rag.namespace_registry import delete_versions
+        from backend.rag.pinecone_client import get_index
+
+        gone = delete_versions(get_index(), expired)
+    if args.snapshot_dir:
+        from backend.rag.snapshot import SnapshotWriter, current_generation
+
+        if current_generation(args.snapshot_dir) is not None:
+            # A generation with everything but the deleted versions.
+            SnapshotWriter().write(args.snapshot_dir, keep_generations=SNAPSHOT_KEEP_GENERATIONS, drop=gone)
+    registry.forget(gone)
+    print(f"Deleted {', '.join(gone) or '-'}")
+    return 0 if len(gone) == len(expired) else 1
+
+
+# -------------------------------------------------
+# MAIN
+# -------------------------------------------------
+def main(argv: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Inspect the versioned namespaces, switch back to a retired version, or delete retired ones"
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    ls = sub.add_parser("list", help="Active and retired versions of each namespace")
+    ls.add_argument("--index", action="store_true", help="Also show vector counts and unregistered versions")
+    ls.set_defaults(func=list_cmd)
+
+    act = sub.add_parser("activate", help="Switch a namespace to one of its versions (e.g. sop@v41)")
+    act.add_argument("version")
+    act.set_defaults(func=activate_cmd)
+
+    ret = sub.add_parser("retire", help="Retire a namespace, e.g. one ingested in place before versioning")
+    ret.add_argument("namespace")
+    ret.set_defaults(func=retire_cmd)
+
+    clean = sub.add_parser("cleanup", help="Delete versions retired for longer than the grace period")
+    clean.add_argument("--grace-s", type=float, default=NAMESPACE_RETIRE_GRACE_S)
+    clean.add_argument("--snapshot-dir", default=INDEX_SNAPSHOT_DIR)
+    clean.set_defaults(func=cleanup_cmd)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
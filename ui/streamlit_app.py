@@ -1,11 +1,24 @@
+import json
+import re
+from collections import OrderedDict
+
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectionError, Timeout
+from urllib3.util.retry import Retry
 
-# Backend endpoint (same /ask contract).
+# Backend endpoint (same /ask contract). Answers are streamed from `<API_URL>/stream`.
 # If you want to run locally, change this to: "http://127.0.0.1:8000/ask"
 API_URL = "https://internal-knowledge-assistant-9v2j.onrender.com/ask"
 
+# (connect, read) timeouts in seconds. With streaming, the read timeout is
+# the longest wait between two pieces of the answer.
+REQUEST_TIMEOUT = (5, 30)
+
+# Answers kept per browser session, so asking the same question again is instant.
+CLIENT_CACHE_SIZE = 50
+
 # -------------------------------
 # PAGE CONFIG
 # -------------------------------
@@ -181,6 +194,107 @@ def _display_source(src: str) -> tuple[str, str]:
     return (s, s)
 
 
+@st.cache_resource
+def _get_session() -> requests.Session:
+    """One keep-alive session shared by every rerun and browser session.
+
+    Connection errors and a proxy's 502 are retried with backoff. The
+    backend's own 429/503 (busy) and 504 (timed out) are shown to the user
+    instead: retrying them only adds to the load that caused them.
+    """
+
+    retry = Retry(
+        total=2,
+        connect=2,
+        backoff_factor=0.5,
+        status_forcelist=(502,),
+        allowed_methods=frozenset({"POST"}),
+        raise_on_status=False,
+    )
+    session = requests.Session()
+    session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry))
+    return session
+
+
+def _cache_key(query: str) -> str:
+    # Same normalization as the backend's response cache.
+    return re.sub(r"\s+", " ", query.strip().lower()).rstrip(" ?!.")
+
+
+def _cached_answer(query: str) -> dict | None:
+    cache = st.session_state.setdefault("answer_cache", OrderedDict())
+    key = _cache_key(query)
+    if key not in cache:
+        return None
+    cache.move_to_end(key)
+    return cache[key]
+
+
+def _remember_answer(query: str, data: dict) -> None:
+    # Only grounded answers: errors and fallbacks should be retried.
+    if data.get("_error") or not data.get("sources"):
+        return
+    cache = st.session_state.setdefault("answer_cache", OrderedDict())
+    cache[_cache_key(query)] = data
+    while len(cache) > CLIENT_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def _error(answer: str) -> dict:
+    return {"answer": answer, "sources": [], "_error": True}
+
+
+def _status_error(res: requests.Response) -> dict:
+    if res.status_code in (429, 503):
+        retry_after = res.headers.get("Retry-After", "")
+        wait = f" in {retry_after}s" if retry_after.isdigit() else " shortly"
+        return _error(f"⏳ The assistant is busy. Please try again{wait}.")
+    if res.status_code == 504:
+        return _error("⏳ The request timed out. Please try again.")
+    return _error(f"Backend error (status {res.status_code}). Please try again.")
+
+
+def _stream_backend(api_url: str, query: str, on_text) -> dict:
+    """Call `<api_url>/stream` and pass answer text to `on_text` as it arrives.
+
+    The backend sends NDJSON: {"type": "token", "text"} lines, then one
+    {"type": "done", "answer", "sources", ...} line whose answer is final.
+    Falls back to the plain /ask call when the backend has no stream endpoint.
+    """
+
+    try:
+        with _get_session().post(
+            api_url.rstrip("/") + "/stream",
+            json={"query": query},
+            timeout=REQUEST_TIMEOUT,
+            stream=True,
+        ) as res:
+            if res.status_code == 404:
+                return _call_backend(api_url, query)
+            if res.status_code != 200:
+                return _status_error(res)
+
+            for line in res.iter_lines(decode_unicode=True):
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("type") == "token":
+                    on_text(event.get("text", ""))
+                elif event.get("type") == "done":
+                    return {
+                        "answer": event.get("answer", "No answer returned."),
+                        "sources": event.get("sources", []) or [],
+                    }
+                elif event.get("type") == "error":
+                    return _error(f"Backend error (status {event.get('status')}). Please try again.")
+        return _error("The answer was cut off. Please try again.")
+    except Timeout:
+        return _error("⏳ The request timed out. Please try again.")
+    except ConnectionError:
+        return _error("🚫 Backend is not reachable. Please try again.")
+
+
 def _call_backend(api_url: str, query: str) -> dict:
     """Call the backend /ask endpoint.
 
@@ -190,13 +304,9 @@ def _call_backend(api_url: str, query: str) -> dict:
     payload = {"query": query}
 
     try:
-        res = requests.post(api_url, json=payload, timeout=30)
+        res = _get_session().post(api_url, json=payload, timeout=REQUEST_TIMEOUT)
         if res.status_code != 200:
-            return {
-                "answer": f"Backend error (status {res.status_code}). Please try again.",
-                "sources": [],
-                "_error": True,
-            }
+            return _status_error(res)
         data = res.json() if res.content else {}
         return {
             "answer": data.get("answer", "No answer returned."),
@@ -272,12 +382,28 @@ if prompt:
         st.warning("Please enter a question.")
     else:
         st.session_state.messages.append({"role": "user", "content": user_query})
-
-        with st.spinner("🔍 Searching internal knowledge..."):
-            try:
-                data = _call_backend(api_url, user_query)
-            except Exception as exc:
-                data = {"answer": f"Unexpected error: {exc}", "sources": [], "_error": True}
+        with st.chat_message("user"):
+            st.write(user_query)
+
+        data = _cached_answer(user_query)
+        if data is None:
+            with st.chat_message("assistant"):
+                placeholder = st.empty()
+                placeholder.markdown("🔍 Searching internal knowledge...")
+                streamed: list[str] = []
+
+                def _show(text: str) -> None:
+                    streamed.append(text)
+                    placeholder.markdown("".join(streamed) + " ▌")
+
+                try:
+                    data = _stream_backend(api_url, user_query, _show)
+                except Exception as exc:
+                    data = _error(f"Unexpected error: {exc}")
+                # The final answer replaces the streamed text (it may differ,
+                # e.g. when the backend falls back to a safe answer).
+                placeholder.markdown(data.get("answer", "No answer returned."))
+            _remember_answer(user_query, data)
 
         st.session_state.messages.append(
             {